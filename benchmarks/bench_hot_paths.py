@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Offline microbenchmarks for the CPU-side hot paths of the SDK.
+
+No GLPI server is needed: HTTP calls are answered by a canned response, so
+only the SDK's own work is measured.
+
+Usage:
+    $ python benchmarks/bench_hot_paths.py --quick
+    $ python benchmarks/bench_hot_paths.py --save-baseline
+    $ python benchmarks/bench_hot_paths.py --compare
+
+Results are stored as JSON (see --baseline) and a compared run exits with
+status 1 when any case is slower than the baseline by more than --threshold.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import argparse
+import platform
+import contextlib
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import requests  # noqa: E402
+from glpi import GLPI, GlpiItem, Ticket  # noqa: E402
+from glpi.glpi import GlpiService  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+DEFAULT_ITEMS = [10, 100, 1000, 10000, 100000]
+DEFAULT_FIELDS = [5, 50, 500]
+QUICK_ITEMS = [10, 100, 1000]
+QUICK_FIELDS = [5, 50]
+
+SEARCH_FIELDS = ["name", "id", "location", "type", "serialnumber", "body",
+                 "processor", "lastupdate", "manufacturer", "status",
+                 "model", "tags", "operatingsystem"]
+
+
+def make_row(index, n_fields):
+    """ Build a GLPI-like row with n_fields keys mixing str, int and null. """
+    row = {"id": index, "name": "Item %d" % index}
+    for f in range(n_fields - 2):
+        key = "field_%d" % f
+        kind = f % 3
+        if kind == 0:
+            row[key] = "value %d-%d\nwith \"quotes\"" % (index, f)
+        elif kind == 1:
+            row[key] = f * index
+        else:
+            row[key] = None
+    return row
+
+
+def make_rows(n_items, n_fields):
+    return [make_row(i, n_fields) for i in range(n_items)]
+
+
+def make_service():
+    service = GlpiService('http://bench.local/apirest.php', 'bench-app-token',
+                          uri='/Ticket', token_auth='bench-user-token')
+    service.session = 'bench-session'
+    return service
+
+
+def make_response(body):
+    response = requests.models.Response()
+    response.status_code = 200
+    response.encoding = 'utf-8'
+    response._content = body
+    return response
+
+
+@contextlib.contextmanager
+def canned_http(response):
+    """ Answer every HTTP call made by the SDK with response. """
+    original = requests.request
+    requests.request = lambda *args, **kwargs: response
+    try:
+        yield
+    finally:
+        requests.request = original
+
+
+"""
+Benchmark cases. Each case receives (n_items, n_fields), does its setup and
+returns the callable that is timed.
+"""
+
+
+def case_get_payload(n_items, n_fields):
+    service = make_service()
+    rows = make_rows(n_items, n_fields)
+
+    def run():
+        for row in rows:
+            service.get_payload(row)
+    return run
+
+
+def case_get_stream(n_items, n_fields):
+    items = [GlpiItem(row) for row in make_rows(n_items, n_fields)]
+
+    def run():
+        for item in items:
+            item.get_stream()
+    return run
+
+
+def case_ticket_init(n_items, n_fields):
+    attributes = make_row(0, n_fields)
+
+    def run():
+        for i in range(n_items):
+            Ticket(name="Ticket %d" % i, content="Content %d" % i,
+                   attributes=attributes)
+    return run
+
+
+def case_search_criteria(n_items, n_fields):
+    glpi = GLPI('http://bench.local/apirest.php', 'bench-app-token',
+                'bench-user-token')
+    rows = make_rows(n_items, n_fields)
+    criteria = [{"field": "name", "value": "ITEM 1"},
+                {"field": "field_0", "value": "quotes"}]
+
+    def run():
+        glpi.search_criteria(rows, criteria)
+    return run
+
+
+def case_search_query(n_items, n_fields):
+    glpi = GLPI('http://bench.local/apirest.php', 'bench-app-token',
+                'bench-user-token')
+    criteria = {"criteria": [
+        {"field": SEARCH_FIELDS[c % len(SEARCH_FIELDS)],
+         "value": "value %d" % c if c % 4 else None,
+         "searchtype": "contains", "link": "AND"}
+        for c in range(n_fields)]}
+
+    def run():
+        for i in range(n_items):
+            glpi.search_query('Ticket', criteria)
+    return run
+
+
+def case_request(n_items, n_fields):
+    service = make_service()
+    response = make_response(b'{}')
+    params = {}
+    headers = {"X-Bench": "1", "X-Empty": None}
+    for f in range(n_fields):
+        kind = f % 3
+        if kind == 0:
+            params["param_%d" % f] = "value %d" % f
+        elif kind == 1:
+            params["param_%d" % f] = bool(f % 2)
+        else:
+            params["param_%d" % f] = None
+
+    def run():
+        with canned_http(response):
+            for i in range(n_items):
+                service.request('GET', '/Ticket', accept_json=True,
+                                headers=headers, params=params)
+    return run
+
+
+def case_response_decode(n_items, n_fields):
+    body = json.dumps(make_rows(n_items, n_fields)).encode('utf-8')
+
+    def run():
+        make_response(body).json()
+    return run
+
+
+CASES = [
+    ("get_payload", case_get_payload),
+    ("get_stream", case_get_stream),
+    ("ticket_init", case_ticket_init),
+    ("search_criteria", case_search_criteria),
+    ("search_query", case_search_query),
+    ("request", case_request),
+    ("response_decode", case_response_decode),
+]
+
+
+def time_case(run, repeat):
+    """ Return the best wall time of repeat runs, in seconds. """
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        run()
+        elapsed = default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run_benchmarks(items, fields, cases=None, repeat=3, max_cells=5000000,
+                   out=None):
+    """
+    Run every case for each (items, fields) combination and return a dict
+    of "case/items/fields" -> seconds. Combinations with more than
+    max_cells (items * fields) are skipped.
+    """
+    results = {}
+    for name, case in CASES:
+        if cases and name not in cases:
+            continue
+        for n_items in items:
+            for n_fields in fields:
+                if max_cells and n_items * n_fields > max_cells:
+                    continue
+                run = case(n_items, n_fields)
+                key = "%s/%d/%d" % (name, n_items, n_fields)
+                results[key] = time_case(run, repeat)
+                if out is not None:
+                    print("%-32s %12.6f s" % (key, results[key]), file=out)
+    return results
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    baseline = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, threshold=0.25, min_time=0.001):
+    """
+    Compare results with a baseline. Returns a list of
+    (key, baseline_seconds, seconds, ratio) for regressed cases.
+    Cases faster than min_time in the baseline are too noisy and ignored.
+    """
+    regressions = []
+    previous = baseline.get("results", {})
+    for key in sorted(results):
+        if key not in previous or previous[key] < min_time:
+            continue
+        ratio = results[key] / previous[key]
+        if ratio > 1 + threshold:
+            regressions.append((key, previous[key], results[key], ratio))
+    return regressions
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline microbenchmarks of glpi-sdk-python hot paths.")
+    parser.add_argument('--items', type=_int_list,
+                        help="Comma separated item counts (default: %s)" %
+                        ','.join(str(i) for i in DEFAULT_ITEMS))
+    parser.add_argument('--fields', type=_int_list,
+                        help="Comma separated field counts (default: %s)" %
+                        ','.join(str(f) for f in DEFAULT_FIELDS))
+    parser.add_argument('--case', action='append', dest='cases',
+                        choices=[name for name, _ in CASES],
+                        help="Run only this case (repeatable)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per case, the best one is kept")
+    parser.add_argument('--max-cells', type=int, default=5000000,
+                        help="Skip combinations with more items*fields "
+                        "(0 disables the limit)")
+    parser.add_argument('--quick', action='store_true',
+                        help="Small sizes and a single run, for smoke tests")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="Baseline file (default: %(default)s)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Store results as the new baseline")
+    parser.add_argument('--compare', action='store_true',
+                        help="Compare results with the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed slowdown ratio before flagging a "
+                        "regression (default: %(default)s)")
+    parser.add_argument('--min-time', type=float, default=0.001,
+                        help="Ignore cases faster than this in the baseline, "
+                        "in seconds (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    items = args.items or (QUICK_ITEMS if args.quick else DEFAULT_ITEMS)
+    fields = args.fields or (QUICK_FIELDS if args.quick else DEFAULT_FIELDS)
+    repeat = 1 if args.quick else args.repeat
+
+    results = run_benchmarks(items, fields, cases=args.cases, repeat=repeat,
+                             max_cells=args.max_cells, out=sys.stdout)
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print("No baseline found at %s" % args.baseline, file=sys.stderr)
+            return 2
+        regressions = compare(results, load_baseline(args.baseline),
+                              args.threshold, args.min_time)
+        for key, before, after, ratio in regressions:
+            print("REGRESSION %-32s %12.6f s -> %12.6f s (x%.2f)" %
+                  (key, before, after, ratio))
+        if regressions:
+            status = 1
+        else:
+            print("No regressions above %d%%" % (args.threshold * 100))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print("Baseline saved to %s" % args.baseline)
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
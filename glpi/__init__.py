@@ -12,12 +12,41 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
+from importlib import import_module
+
 from .version import __version__  # noqa
-from .glpi import GLPI  # noqa
-from .glpi_item import GlpiItem  # noqa
-from .item_profile import GlpiProfile  # noqa
-from .item_knowbase import GlpiKnowBase  # noqa
-from .item_knowbase import KnowBase  # noqa
-from .item_ticket import GlpiTicket  # noqa
-from .item_ticket import Ticket  # noqa
-from .glpi_auth import GLpiAuth
+
+# Public names and their module, imported on first use: "import glpi" does
+# not load requests nor the item modules.
+_LAZY = {
+    "GLPI": ".glpi",
+    "GlpiItem": ".glpi_item",
+    "GlpiProfile": ".item_profile",
+    "GlpiKnowBase": ".item_knowbase",
+    "KnowBase": ".item_knowbase",
+    "GlpiTicket": ".item_ticket",
+    "Ticket": ".item_ticket",
+    "GLpiAuth": ".glpi_auth",
+}
+
+__all__ = ['__version__'] + sorted(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module %r has no attribute %r" %
+                             (__name__, name))
+    value = getattr(import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+if sys.version_info < (3, 7):
+    # No module __getattr__ (PEP 562): import everything now.
+    for _name in _LAZY:
+        __getattr__(_name)
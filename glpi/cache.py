@@ -0,0 +1,189 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Item cache backends for GLPI(cache=...): items are stored as JSON with a
+# TTL, bounded by entry count and bytes. MemoryCache lives in the process,
+# SQLiteCache is shared by the processes using the same file.
+
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class MemoryCache(object):
+    """
+    In-process LRU cache of JSON values, at most max_entries entries and
+    max_bytes bytes of JSON, each one expiring ttl seconds after it is set.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 << 20, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires, json)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+    def get(self, key):
+        """ Return a new copy of the value of key, None when missing. """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.pop(key)
+            self.entries[key] = entry
+            self.hits += 1
+        return json.loads(entry[1])
+
+    def set(self, key, value):
+        data = json.dumps(value)
+        with self.lock:
+            self._drop(key)
+            if len(data) > self.max_bytes:
+                return
+            self.entries[key] = (time.time() + self.ttl, data)
+            self.bytes += len(data)
+            while len(self.entries) > self.max_entries or \
+                    self.bytes > self.max_bytes:
+                _, (_, old) = self.entries.popitem(last=False)
+                self.bytes -= len(old)
+
+    def delete(self, key):
+        with self.lock:
+            self._drop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+
+class SQLiteCache(object):
+    """
+    Cache of JSON values in the SQLite database path, shared by every
+    process opening it. Bounded by max_entries and max_bytes, the entries
+    expiring first being evicted first, and entries expire ttl seconds
+    after they are set.
+    """
+
+    def __init__(self, path, max_entries=100000, max_bytes=256 << 20,
+                 ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30,
+                                          isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS items (key TEXT PRIMARY KEY, '
+            'value TEXT NOT NULL, size INTEGER NOT NULL, '
+            'expires REAL NOT NULL)')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS items_expires ON items (expires)')
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value, expires FROM items WHERE key = ?',
+                (key,)).fetchone()
+            if row is not None and row[1] < time.time():
+                self.connection.execute('DELETE FROM items WHERE key = ?',
+                                        (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        data = json.dumps(value)
+        now = time.time()
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                if len(data) > self.max_bytes:
+                    self.connection.execute(
+                        'DELETE FROM items WHERE key = ?', (key,))
+                else:
+                    self.connection.execute(
+                        'INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)',
+                        (key, data, len(data), now + self.ttl))
+                self._evict(now)
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+
+    def _evict(self, now):
+        self.connection.execute('DELETE FROM items WHERE expires < ?',
+                                (now,))
+        count, size = self.connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM items').fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                'DELETE FROM items WHERE key IN (SELECT key FROM items '
+                'ORDER BY expires LIMIT ?)', (count - self.max_entries,))
+            size = self.connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM items').fetchone()[0]
+        if size > self.max_bytes:
+            freed = 0
+            keys = []
+            for key, entry_size in self.connection.execute(
+                    'SELECT key, size FROM items ORDER BY expires'):
+                keys.append((key,))
+                freed += entry_size
+                if size - freed <= self.max_bytes:
+                    break
+            self.connection.executemany('DELETE FROM items WHERE key = ?',
+                                        keys)
+
+    def delete(self, key):
+        with self.lock:
+            self.connection.execute('DELETE FROM items WHERE key = ?',
+                                    (key,))
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM items')
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,550 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Columnar result sets: rows from get_all/search are stored as one typed
+# array per field (strings are dictionary encoded), so large result sets
+# fit in memory and can be filtered, counted and aggregated quickly.
+# NumPy is used when installed, pure Python otherwise.
+
+import sys
+import math
+import operator
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if sys.version_info[0] > 2:
+    _INT = 'q'
+    _INT_TYPES = (int,)
+    _STR_TYPES = (str,)
+else:
+    _INT = 'l'
+    _INT_TYPES = (int, long)  # noqa: F821
+    _STR_TYPES = (basestring,)  # noqa: F821
+
+# Stored in place of None in integer columns.
+NULL_INT = -(2 ** 63) if _INT == 'q' else -(2 ** 31)
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max')
+
+
+def _numpy_view(data):
+    """ Zero-copy NumPy view of an array.array, do not keep it around. """
+    kind = 'f' if data.typecode == 'd' else 'i'
+    return numpy.frombuffer(data, dtype='%s%d' % (kind, data.itemsize))
+
+
+def _extend(data, values, null):
+    """ Extend an array.array with values (None is null) or raise. """
+    size = len(data)
+    try:
+        data.extend(values)
+    except (TypeError, OverflowError):
+        del data[size:]
+        try:
+            data.extend([null if v is None else v for v in values])
+        except (TypeError, OverflowError):
+            del data[size:]
+            raise TypeError('Values do not fit a %r array' % data.typecode)
+
+
+def _take(data, indexes):
+    """ New array.array with the data items at indexes. """
+    if numpy is not None:
+        taken = array(data.typecode)
+        taken.frombytes(_numpy_view(data)[indexes].tobytes())
+        return taken
+    return array(data.typecode, [data[i] for i in indexes])
+
+
+class _IntColumn(object):
+    kind = 'int'
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else array(_INT)
+
+    def extend(self, values):
+        _extend(self.data, values, NULL_INT)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        value = self.data[i]
+        return None if value == NULL_INT else value
+
+    def take(self, indexes):
+        return _IntColumn(_take(self.data, indexes))
+
+    def values(self):
+        """ Values for vectorized operations and the null mask. """
+        if numpy is not None:
+            values = _numpy_view(self.data)
+            return values, values == NULL_INT
+        return self.data, [v == NULL_INT for v in self.data]
+
+
+class _FloatColumn(object):
+    kind = 'float'
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else array('d')
+
+    def extend(self, values):
+        _extend(self.data, values, float('nan'))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        value = self.data[i]
+        return None if math.isnan(value) else value
+
+    def take(self, indexes):
+        return _FloatColumn(_take(self.data, indexes))
+
+    def values(self):
+        if numpy is not None:
+            values = _numpy_view(self.data)
+            return values, numpy.isnan(values)
+        return self.data, [math.isnan(v) for v in self.data]
+
+
+class _StrColumn(object):
+    """ Dictionary encoded strings: codes index categories, -1 is None. """
+    kind = 'str'
+
+    def __init__(self, codes=None, categories=None):
+        self.codes = codes if codes is not None else array(_INT)
+        self.categories = categories if categories is not None else []
+        self.index = dict((v, i) for i, v in enumerate(self.categories))
+        self.index[None] = -1
+
+    def extend(self, values):
+        index = self.index
+        new = set(values).difference(index)
+        if new:
+            for value in new:
+                if not isinstance(value, _STR_TYPES):
+                    raise TypeError('%r is not a string' % (value,))
+            for value in values:
+                if value not in index:
+                    index[value] = len(self.categories)
+                    self.categories.append(value)
+        self.codes.extend([index[v] for v in values])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return None if code < 0 else self.categories[code]
+
+    def take(self, indexes):
+        return _StrColumn(_take(self.codes, indexes), list(self.categories))
+
+    def values(self):
+        if numpy is not None:
+            codes = _numpy_view(self.codes)
+            return numpy.array(self.categories + [None],
+                               dtype=object)[codes], codes < 0
+        return [self[i] for i in range(len(self))], \
+            [c < 0 for c in self.codes]
+
+
+class _ObjectColumn(object):
+    kind = 'object'
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else []
+
+    def extend(self, values):
+        self.data.extend(values)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        return self.data[i]
+
+    def take(self, indexes):
+        return _ObjectColumn([self.data[i] for i in indexes])
+
+    def values(self):
+        nulls = [v is None for v in self.data]
+        if numpy is not None:
+            return numpy.array(self.data, dtype=object), numpy.array(nulls)
+        return self.data, nulls
+
+
+def _new_column(value):
+    """ Column type for the first non null value of a field. """
+    if isinstance(value, _INT_TYPES):
+        return _IntColumn()
+    if isinstance(value, float):
+        return _FloatColumn()
+    if isinstance(value, _STR_TYPES):
+        return _StrColumn()
+    return _ObjectColumn()
+
+
+def _promote(column, values):
+    """ Return a column holding the column values followed by values. """
+    numbers = _INT_TYPES + (float, type(None))
+    if column.kind == 'int' and all(isinstance(v, numbers) for v in values):
+        new = _FloatColumn()
+    else:
+        new = _ObjectColumn()
+    new.extend([column[i] for i in range(len(column))])
+    new.extend(values)
+    return new
+
+
+class ColumnarResult(object):
+    """
+    Result set stored as one typed column per field.
+
+    Fill it with extend() (rows) or add_pages() (pages from
+    GLPI.get_pages()), then use filter(), group_count() and aggregate().
+    Integer and float columns are array.array, strings are dictionary
+    encoded; column() returns NumPy arrays when NumPy is installed.
+    """
+
+    def __init__(self, fields=None):
+        """ fields restricts the stored columns, all fields by default. """
+        self.fields = list(fields) if fields is not None else []
+        self.only_fields = fields is not None
+        self.columns = {}
+        self.length = 0
+
+    @classmethod
+    def from_rows(cls, rows, fields=None):
+        result = cls(fields)
+        result.extend(rows)
+        return result
+
+    @classmethod
+    def from_pages(cls, pages, fields=None):
+        result = cls(fields)
+        result.add_pages(pages)
+        return result
+
+    def __len__(self):
+        return self.length
+
+    def append(self, row):
+        """ Append a row (dict). """
+        self.extend([row])
+
+    def extend(self, rows):
+        """ Append rows, filling the columns one field at a time. """
+        rows = rows if isinstance(rows, list) else list(rows)
+        if not rows:
+            return
+        fields = self.fields
+        if not self.only_fields:
+            known = set()
+            for row in rows:
+                known.update(row)
+            fields = fields + sorted(known.difference(fields), key=str)
+
+        for field in fields:
+            values = [row.get(field) for row in rows]
+            column = self.columns.get(field)
+            if column is None:
+                first = next((v for v in values if v is not None), None)
+                if first is None:
+                    continue
+                column = _new_column(first)
+                column.extend([None] * self.length)
+                self.columns[field] = column
+                if field not in self.fields:
+                    self.fields.append(field)
+            try:
+                column.extend(values)
+            except TypeError:
+                self.columns[field] = _promote(column, values)
+
+        self.length += len(rows)
+        for column in self.columns.values():
+            if len(column) < self.length:
+                column.extend([None] * (self.length - len(column)))
+
+    def add_pages(self, pages):
+        """ Append pages, lists of rows or (offset, rows) tuples. """
+        for page in pages:
+            if isinstance(page, tuple):
+                page = page[1]
+            self.extend(page)
+
+    def column(self, field):
+        """
+        Values of field with None for nulls, a NumPy array when available
+        (of objects when a numeric column has nulls), else a list.
+        """
+        column = self.columns.get(field)
+        if numpy is None:
+            if column is None:
+                return [None] * self.length
+            return [column[i] for i in range(len(column))]
+        if column is None:
+            return numpy.full(self.length, None, dtype=object)
+        values, nulls = column.values()
+        if column.kind in ('int', 'float') and nulls.any():
+            values = values.astype(object)
+            values[nulls] = None
+        return numpy.array(values)
+
+    def row(self, i):
+        return dict((f, self.columns[f][i] if f in self.columns else None)
+                    for f in self.fields)
+
+    def iter_rows(self):
+        for i in range(self.length):
+            yield self.row(i)
+
+    def to_rows(self):
+        return list(self.iter_rows())
+
+    # Vectorized operations
+    def mask(self, field, op, value):
+        """
+        Return the rows matching 'field op value' as a boolean mask, op
+        being ==, !=, <, <=, >, >= or 'in' (value is then a collection).
+        Null values never match.
+        """
+        column = self.columns.get(field)
+        if column is None:
+            return self._full_mask(False)
+
+        if column.kind == 'str' and op in ('==', '!=', 'in'):
+            wanted = value if op == 'in' else [value]
+            codes = set(column.index[v] for v in wanted
+                        if v in column.index)
+            if numpy is not None:
+                data = _numpy_view(column.codes)
+                found = numpy.isin(data, list(codes))
+                return ~found & (data >= 0) if op == '!=' else found
+            return [(c in codes) != (op == '!=') and c >= 0
+                    for c in column.codes]
+
+        values, nulls = column.values()
+        if numpy is not None:
+            # Nulls are left out before comparing: None has no order.
+            valid = ~numpy.asarray(nulls, dtype=bool)
+            found = numpy.zeros(len(valid), dtype=bool)
+            if op == 'in':
+                found[valid] = numpy.isin(values[valid], list(value))
+            else:
+                found[valid] = OPERATORS[op](values[valid], value)
+            return found
+        if op == 'in':
+            value = set(value)
+            return [not n and v in value for v, n in zip(values, nulls)]
+        compare = OPERATORS[op]
+        return [not n and compare(v, value) for v, n in zip(values, nulls)]
+
+    def _full_mask(self, fill):
+        if numpy is not None:
+            return numpy.full(self.length, fill, dtype=bool)
+        return [fill] * self.length
+
+    def filter(self, *conditions):
+        """
+        Return a new ColumnarResult with the rows matching every condition,
+        (field, op, value) tuples (see mask()) or boolean masks.
+        """
+        selected = self._full_mask(True)
+        for condition in conditions:
+            if isinstance(condition, tuple):
+                condition = self.mask(*condition)
+            if numpy is not None:
+                selected = selected & numpy.asarray(condition, dtype=bool)
+            else:
+                selected = [a and b for a, b in zip(selected, condition)]
+
+        if numpy is not None:
+            indexes = numpy.flatnonzero(selected).tolist()
+        else:
+            indexes = [i for i, s in enumerate(selected) if s]
+
+        result = ColumnarResult(self.fields)
+        result.only_fields = self.only_fields
+        result.columns = dict((f, c.take(indexes))
+                              for f, c in self.columns.items())
+        result.length = len(indexes)
+        return result
+
+    def group_count(self, field):
+        """ Return {value: count of rows} for field, None counts nulls. """
+        column = self.columns.get(field)
+        if column is None:
+            return {None: self.length} if self.length else {}
+
+        if column.kind == 'str':
+            if numpy is not None:
+                codes = _numpy_view(column.codes)
+                counts = numpy.bincount(codes[codes >= 0],
+                                        minlength=len(column.categories))
+                result = dict((column.categories[i], int(c))
+                              for i, c in enumerate(counts) if c)
+                nulls = int((codes < 0).sum())
+            else:
+                counts = [0] * len(column.categories)
+                nulls = 0
+                for c in column.codes:
+                    if c < 0:
+                        nulls += 1
+                    else:
+                        counts[c] += 1
+                result = dict((column.categories[i], c)
+                              for i, c in enumerate(counts) if c)
+            if nulls:
+                result[None] = nulls
+            return result
+
+        if numpy is not None and column.kind in ('int', 'float'):
+            values, nulls = column.values()
+            keys, counts = numpy.unique(values[~nulls], return_counts=True)
+            result = dict((k.item(), int(c)) for k, c in zip(keys, counts))
+            if nulls.any():
+                result[None] = int(nulls.sum())
+            return result
+
+        result = {}
+        for i in range(len(column)):
+            value = column[i]
+            result[value] = result.get(value, 0) + 1
+        return result
+
+    def aggregate(self, field, func='sum', by=None):
+        """
+        Aggregate numeric field with func (count, sum, mean, min or max),
+        ignoring nulls. With by, return {group value: aggregate}.
+        """
+        if func not in AGGREGATES:
+            raise ValueError('Unknown aggregate: %s' % func)
+        column = self.columns.get(field)
+        if by is None:
+            return self._aggregate(column, func, range(self.length))
+
+        by_column = self.columns.get(by)
+        if by_column is None:
+            return {None: self._aggregate(column, func, range(self.length))} \
+                if self.length else {}
+        if numpy is not None and column is not None and \
+                column.kind in ('int', 'float') and \
+                by_column.kind in ('int', 'str'):
+            return self._numpy_group_aggregate(column, by_column, func)
+
+        groups = {}
+        for i in range(self.length):
+            groups.setdefault(by_column[i], []).append(i)
+        return dict((key, self._aggregate(column, func, indexes))
+                    for key, indexes in groups.items())
+
+    @staticmethod
+    def _scalar(column, func, value):
+        if func == 'count':
+            return int(value)
+        if column.kind == 'int' and func != 'mean':
+            return int(value)
+        return float(value)
+
+    def _aggregate(self, column, func, indexes):
+        if column is None:
+            return 0 if func == 'count' else None
+        if numpy is not None and column.kind in ('int', 'float'):
+            values, nulls = column.values()
+            values = values[numpy.asarray(indexes, dtype=int)]
+            values = values[~nulls[numpy.asarray(indexes, dtype=int)]]
+            if func == 'count':
+                return len(values)
+            if not len(values):
+                return None
+            return self._scalar(column, func, getattr(numpy, func)(values))
+
+        values = [column[i] for i in indexes]
+        values = [v for v in values if v is not None]
+        if func == 'count':
+            return len(values)
+        if not values:
+            return None
+        if func == 'sum':
+            return sum(values)
+        if func == 'mean':
+            return float(sum(values)) / len(values)
+        return min(values) if func == 'min' else max(values)
+
+    def _numpy_group_aggregate(self, column, by_column, func):
+        """ Grouped aggregate without Python loops over the rows. """
+        if by_column.kind == 'str':
+            keys = _numpy_view(by_column.codes)
+            null_key = -1
+
+            def label(key):
+                return by_column.categories[key]
+        else:
+            keys = _numpy_view(by_column.data)
+            null_key = NULL_INT
+            label = int
+
+        uniques, inverse = numpy.unique(keys, return_inverse=True)
+        values, nulls = column.values()
+        valid = ~nulls
+        groups = inverse[valid]
+        # Integers stay int64 so that sums, minimums and maximums are exact.
+        exact = column.kind == 'int' and func != 'mean'
+        values = values[valid].astype(numpy.int64 if exact else float)
+        counts = numpy.bincount(groups, minlength=len(uniques))
+        if func == 'mean':
+            totals = numpy.bincount(groups, weights=values,
+                                    minlength=len(uniques))
+            totals = totals / numpy.maximum(counts, 1)
+        elif func == 'sum':
+            totals = numpy.zeros(len(uniques), dtype=values.dtype)
+            numpy.add.at(totals, groups, values)
+        elif func in ('min', 'max'):
+            if exact:
+                limits = numpy.iinfo(numpy.int64)
+                totals = numpy.full(len(uniques), limits.max if
+                                    func == 'min' else limits.min)
+                reduce = numpy.minimum if func == 'min' else numpy.maximum
+            else:
+                totals = numpy.full(len(uniques), numpy.nan)
+                reduce = numpy.fmin if func == 'min' else numpy.fmax
+            reduce.at(totals, groups, values)
+        else:
+            totals = counts
+
+        result = {}
+        for i, key in enumerate(uniques.tolist()):
+            key = None if key == null_key else label(key)
+            if func != 'count' and not counts[i]:
+                result[key] = None
+            else:
+                result[key] = self._scalar(column, func, totals[i])
+        return result
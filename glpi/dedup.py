@@ -0,0 +1,243 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Alert deduplication: a local index of the fingerprints of recent open
+# tickets, so an alert matching an open ticket becomes a followup on it
+# instead of a duplicate ticket.
+
+import time
+import threading
+from collections import OrderedDict
+
+from .glpi import _written
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Ticket statuses: new, processing (assigned), processing (planned), pending
+OPEN_STATUSES = (1, 2, 3, 4)
+
+
+def normalize(value):
+    """ Default fingerprint normalization: lower case, single spaces. """
+    return ' '.join(('%s' % value).lower().split())
+
+
+class FingerprintIndex(object):
+    """
+    Index of fingerprints (the normalized key fields) of the open items
+    of item_name modified in the last ttl seconds, at most max_size
+    fingerprints, the least recently matched ones being evicted first.
+
+    refresh() loads the items modified since the previous refresh and the
+    writes of the glpi client are applied as they happen, so the index
+    follows tickets created, updated or closed through the SDK.
+    """
+
+    def __init__(self, glpi, key=('name',), item_name='Ticket', ttl=3600,
+                 max_size=10000, open_statuses=OPEN_STATUSES,
+                 normalize=normalize, page_size=500):
+        self.glpi = glpi
+        self.key = tuple(key)
+        self.item_name = item_name
+        self.itemtype = glpi.get_itemtype(item_name)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.open_statuses = set(open_statuses)
+        self.normalize = normalize
+        self.page_size = page_size
+
+        self.entries = OrderedDict()  # fingerprint -> [item id, expires]
+        self.key_values = {}  # item id -> {key field: value}
+        self.watermark = None
+        self.lock = threading.RLock()
+        self.creating = {}  # fingerprint -> Event
+        glpi.add_write_listener(self._on_write)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        """ Stop following the writes of the client. """
+        self.glpi.remove_write_listener(self._on_write)
+
+    def fingerprint(self, data):
+        """ Fingerprint of data, None when a key field is missing. """
+        values = []
+        for field in self.key:
+            value = data.get(field)
+            if value is None:
+                return None
+            values.append(self.normalize(value))
+        return tuple(values)
+
+    # Index maintenance
+    def _forget(self, item_id):
+        values = self.key_values.pop(item_id, None)
+        if values is None:
+            return
+        fingerprint = self.fingerprint(values)
+        entry = self.entries.get(fingerprint)
+        if entry is not None and entry[0] == item_id:
+            del self.entries[fingerprint]
+
+    def add(self, item):
+        """
+        Index or update item (a dict with its 'id'), or drop it when its
+        'status' is not open.
+        """
+        item_id = int(item['id'])
+        with self.lock:
+            if 'status' in item and \
+                    int(item['status']) not in self.open_statuses:
+                self._forget(item_id)
+                return
+            values = dict(self.key_values.get(item_id, {}))
+            values.update((f, item[f]) for f in self.key if f in item)
+            fingerprint = self.fingerprint(values)
+            if fingerprint is None:
+                return
+            self._forget(item_id)
+            self.key_values[item_id] = values
+            self.entries.pop(fingerprint, None)
+            self.entries[fingerprint] = [item_id, time.time() + self.ttl]
+            while len(self.entries) > self.max_size:
+                _, (old_id, _) = self.entries.popitem(last=False)
+                self.key_values.pop(old_id, None)
+
+    def remove(self, item_id):
+        with self.lock:
+            self._forget(int(item_id))
+
+    def _on_write(self, itemtype, action, items):
+        if itemtype != self.itemtype:
+            return
+        for item in items:
+            if action == 'delete':
+                self.remove(item['id'])
+            elif action not in ('create', 'update'):
+                continue  # massive action, seen by the next refresh()
+            elif action == 'create' or int(item['id']) in self.key_values:
+                self.add(item)
+            elif 'status' not in item or \
+                    int(item['status']) in self.open_statuses:
+                # An update of an unknown item: index it when it has the
+                # whole key, a refresh() will catch the rest.
+                if all(f in item for f in self.key):
+                    self.add(item)
+
+    def refresh(self):
+        """
+        Index the items modified since the last refresh (the last ttl
+        seconds the first time) with one search and getMultipleItems per
+        page. Returns the number of items read.
+        """
+        schema = self.glpi.get_field_schema(self.item_name)
+        date_field = schema.get('date_mod', {}).get('id', 19)
+        if self.watermark is None:
+            since = time.time() - self.ttl
+        else:
+            # One second back: GLPI dates have no sub-second precision.
+            since = time.mktime(time.strptime(self.watermark,
+                                              DATE_FORMAT)) - 1
+        criteria = {"criteria": [{
+            "field": date_field, "searchtype": "morethan",
+            "value": time.strftime(DATE_FORMAT, time.localtime(since)),
+            "link": "AND"}], "forcedisplay": [2]}
+
+        count = 0
+        watermark = self.watermark
+        for _, rows in self.glpi.get_pages(self.item_name, criteria,
+                                           self.page_size):
+            ids = [int(row['2']) for row in rows]
+            for item in self.glpi.get_multiple(self.item_name, ids):
+                self.add(item)
+                count += 1
+                if item.get('date_mod') and (watermark is None or
+                                             item['date_mod'] > watermark):
+                    watermark = item['date_mod']
+        self.watermark = watermark
+        return count
+
+    # Lookups
+    def match(self, data):
+        """ Return the id of the open item matching data, or None. """
+        fingerprint = self.fingerprint(data)
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                self._forget(entry[0])
+                return None
+            entry[1] = time.time() + self.ttl
+            self.entries.pop(fingerprint)
+            self.entries[fingerprint] = entry
+            return entry[0]
+
+    def create_or_followup(self, data, followup=None):
+        """
+        Create a ticket from data (an alert) unless an open ticket has the
+        same fingerprint, then add followup (default: data 'content') to it
+        as an ITILFollowup. Concurrent calls for the same fingerprint
+        create one ticket.
+
+        Returns {"action": 'created' or 'followup', "id": ticket id,
+        "result": {"id": .., "ok": .., "message": ..}}.
+        """
+        fingerprint = self.fingerprint(data)
+        if fingerprint is None:
+            result = self._create(self.item_name, data)
+            return {"action": 'created', "id": result['id'],
+                    "result": result}
+        while True:
+            with self.lock:
+                ticket_id = self.match(data)
+                creating = self.creating.get(fingerprint)
+                if ticket_id is None and creating is None:
+                    creating = self.creating[fingerprint] = \
+                        threading.Event()
+                    break
+            if ticket_id is not None:
+                content = followup if followup is not None \
+                    else data.get('content', '')
+                result = self._create('ITILFollowup', {
+                    "itemtype": self.itemtype, "items_id": ticket_id,
+                    "content": content})
+                return {"action": 'followup', "id": ticket_id,
+                        "result": result}
+            creating.wait()
+
+        try:
+            result = self._create(self.item_name, data)
+        finally:
+            with self.lock:
+                del self.creating[fingerprint]
+            creating.set()
+        return {"action": 'created', "id": result['id'], "result": result}
+
+    def _create(self, item_name, data):
+        """
+        Create data as item_name and return its _item_results() dict.
+        GLPI.create() goes through the shared api_rest.uri, which
+        concurrent calls for other itemtypes would change under it.
+        """
+        if not self.glpi.api_has_session():
+            self.glpi.init_api()
+        itemtype = self.glpi.get_itemtype(item_name)
+        result = self.glpi.api_rest.create_many([data], itemtype)[0]
+        if not result['ok']:
+            result['id'] = None
+        self.glpi.notify_write(itemtype, 'create',
+                               _written([data], [result], 'create'))
+        return result
@@ -0,0 +1,267 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Streaming export of GLPI items or search results to NDJSON or CSV files,
+# optionally gzip compressed, with resumable checkpoints.
+#   $ glpi-export Ticket tickets.ndjson.gz --workers 4 --checkpoint t.ckpt
+
+from __future__ import print_function
+import io
+import os
+import sys
+import csv
+import gzip
+import json
+import argparse
+
+from .glpi import GLPI, GlpiException
+
+FORMATS = ('ndjson', 'csv')
+
+
+def guess_format(path):
+    """ Return (format, compress) from a file name like 'x.csv.gz'. """
+    name = path.lower()
+    compress = None
+    if name.endswith('.gz'):
+        compress = 'gzip'
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv', compress
+    return 'ndjson', compress
+
+
+class ExportWriter(object):
+    """
+    Append-only output file that can be checkpointed and truncated back
+    to the last checkpoint on resume. Gzip output is written as one gzip
+    member per checkpoint, so every checkpoint is a valid gzip boundary.
+    """
+
+    def __init__(self, path, compress=None, resume_at=None):
+        self.path = path
+        self.compress = compress
+        if resume_at is None:
+            self.raw = open(path, 'wb')
+        else:
+            self.raw = open(path, 'r+b')
+            self.raw.truncate(resume_at)
+            self.raw.seek(resume_at)
+        self.stream = self._open_member()
+
+    def _open_member(self):
+        if self.compress == 'gzip':
+            return gzip.GzipFile(fileobj=self.raw, mode='wb')
+        return self.raw
+
+    def write(self, data):
+        self.stream.write(data)
+
+    def checkpoint(self):
+        """ Make written data durable and return the file size. """
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        size = self.raw.tell()
+        self.stream = self._open_member()
+        return size
+
+    def close(self):
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if value is None:
+        return ''
+    return value
+
+
+def encode_rows(rows, fmt, columns=None):
+    """ Encode rows as NDJSON or CSV (without header) bytes. """
+    if fmt == 'csv':
+        buf = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        for row in rows:
+            writer.writerow([_csv_value(row.get(c)) for c in columns])
+        data = buf.getvalue()
+    else:
+        if columns:
+            rows = [dict((c, row.get(c)) for c in columns) for row in rows]
+        data = ''.join(json.dumps(row) + '\n' for row in rows)
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return data
+
+
+def _csv_header(columns):
+    buf = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+    csv.writer(buf, lineterminator='\n').writerow(columns)
+    data = buf.getvalue()
+    return data if isinstance(data, bytes) else data.encode('utf-8')
+
+
+def load_checkpoint(path):
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    """ Atomically replace the checkpoint file with state. """
+    tmp = '%s.tmp' % path
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    getattr(os, 'replace', os.rename)(tmp, path)
+
+
+def export(glpi, item_name, out, fmt=None, criteria=None, compress=None,
+           page_size=1000, workers=4, checkpoint=None, checkpoint_every=10,
+           fields=None, expand_dropdowns=False):
+    """
+    Stream every item_name item (or a search when criteria is set) to out,
+    a file path or a binary writer, as NDJSON or CSV, gzip compressed with
+    compress='gzip'.
+
+    Pages are fetched by workers threads and written in order, so memory
+    stays constant. With a checkpoint path, progress is saved every
+    checkpoint_every pages and an interrupted export started again with
+    the same arguments resumes after the last checkpoint. Offsets are used
+    to resume, items deleted meanwhile may shift a few rows.
+    CSV columns are fields, or without fields every key of the rows of
+    the first page: keys first seen in later pages are not exported, pass
+    fields when rows differ.
+    Returns a dict with the number of 'rows' written and the 'offset' the
+    export was resumed from.
+    """
+    is_path = not hasattr(out, 'write')
+    if fmt is None or (compress is None and is_path):
+        guessed_fmt, guessed_compress = guess_format(
+            out if is_path else '')
+        fmt = fmt or guessed_fmt
+        compress = compress or guessed_compress
+    if fmt not in FORMATS:
+        raise GlpiException("Unknown export format: %s" % fmt)
+
+    query = {"item_name": item_name, "criteria": criteria, "format": fmt,
+             "compress": compress, "page_size": page_size, "fields": fields}
+    state = load_checkpoint(checkpoint) if is_path else None
+    if state is not None and (state.get("query") != query or
+                              not os.path.exists(out)):
+        state = None
+
+    if state is None:
+        state = {"query": query, "offset": 0, "rows": 0, "bytes": None,
+                 "columns": fields}
+        resumed_from = 0
+    else:
+        resumed_from = state["offset"]
+
+    if is_path:
+        writer = ExportWriter(out, compress, state["bytes"])
+    elif compress == 'gzip':
+        writer = gzip.GzipFile(fileobj=out, mode='wb')
+    else:
+        writer = out
+
+    columns = state["columns"]
+    pages = 0
+    try:
+        for offset, rows in glpi.get_pages(item_name, criteria, page_size,
+                                           workers, state["offset"],
+                                           expand_dropdowns):
+            if not rows:
+                continue
+            if columns is None:
+                columns = sorted(set(k for row in rows for k in row))
+                state["columns"] = columns
+            if fmt == 'csv' and offset == 0:
+                writer.write(_csv_header(columns))
+            writer.write(encode_rows(rows, fmt, columns if fmt == 'csv' or
+                                     fields else None))
+            state["offset"] = offset + len(rows)
+            state["rows"] += len(rows)
+            pages += 1
+            if checkpoint and is_path and pages % checkpoint_every == 0:
+                state["bytes"] = writer.checkpoint()
+                save_checkpoint(checkpoint, state)
+    finally:
+        if writer is not out:
+            # Closes the gzip stream only, not a writer given as out.
+            writer.close()
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return {"rows": state["rows"], "offset": resumed_from}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stream GLPI items or a search to NDJSON or CSV.")
+    parser.add_argument('item', help="Itemtype, I.E: Ticket")
+    parser.add_argument('out', help="Output file (.ndjson, .csv, .gz)")
+    parser.add_argument('--url', default=os.getenv('GLPI_API_URL'))
+    parser.add_argument('--app-token', default=os.getenv('GLPI_APP_TOKEN'))
+    parser.add_argument('--user-token', default=os.getenv('GLPI_USER_TOKEN'))
+    parser.add_argument('--username', default=os.getenv('GLPI_USERNAME'))
+    parser.add_argument('--password', default=os.getenv('GLPI_PASSWORD'))
+    parser.add_argument('--format', choices=FORMATS)
+    parser.add_argument('--gzip', action='store_true',
+                        help="Gzip the output (default for .gz files)")
+    parser.add_argument('--criteria',
+                        help="Search criteria in JSON, see "
+                        "GLPI.search_query()")
+    parser.add_argument('--fields', help="Comma separated columns")
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--checkpoint',
+                        help="Checkpoint file, to resume an interrupted "
+                        "export")
+    parser.add_argument('--checkpoint-every', type=int, default=10,
+                        help="Pages between checkpoints")
+    parser.add_argument('--expand-dropdowns', action='store_true')
+    parser.add_argument('--no-verify', action='store_true',
+                        help="Do not verify SSL certificates")
+    args = parser.parse_args(argv)
+
+    if args.user_token:
+        auth = args.user_token
+    else:
+        auth = (args.username, args.password)
+    glpi = GLPI(args.url, args.app_token, auth,
+                sslverify=not args.no_verify)
+
+    result = export(glpi, args.item, args.out, fmt=args.format,
+                    criteria=json.loads(args.criteria)
+                    if args.criteria else None,
+                    compress='gzip' if args.gzip else None,
+                    page_size=args.page_size, workers=args.workers,
+                    checkpoint=args.checkpoint,
+                    checkpoint_every=args.checkpoint_every,
+                    fields=args.fields.split(',') if args.fields else None,
+                    expand_dropdowns=args.expand_dropdowns)
+    print("Exported %d rows of %s to %s" %
+          (result["rows"], args.item, args.out), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Federated queries: the same call sent concurrently to several GLPI
+# instances, rows tagged with their instance and merged.
+
+import heapq
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from .glpi import GLPI, GlpiException, _is_glpi_error, _iter_merged
+from .transport import RequestsTransport
+
+
+def _key_function(key):
+    if key is None or callable(key):
+        return key
+    return lambda row: row.get(key)
+
+
+class _Ordered(object):
+    """ Heap entry of a k-way merge, ordered by key then source. """
+    __slots__ = ('key', 'index', 'row', 'reverse')
+
+    def __init__(self, key, index, row, reverse):
+        self.key = key
+        self.index = index
+        self.row = row
+        self.reverse = reverse
+
+    def __lt__(self, other):
+        if self.key != other.key:
+            return other.key < self.key if self.reverse \
+                else self.key < other.key
+        return self.index < other.index
+
+
+def _prefetch(iterable):
+    """ Consume iterable in a thread, a few items ahead. """
+    for item in _iter_merged([iterable], 1):
+        yield item
+
+
+def _merge_sorted(iterables, key, reverse=False):
+    """ Merge iterables each sorted by key into one sorted stream. """
+    iterators = [iter(iterable) for iterable in iterables]
+    heap = []
+    for index, iterator in enumerate(iterators):
+        for row in iterator:
+            heap.append(_Ordered(key(row), index, row, reverse))
+            break
+    heapq.heapify(heap)
+    while heap:
+        entry = heap[0]
+        yield entry.row
+        for row in iterators[entry.index]:
+            heapq.heapreplace(heap, _Ordered(key(row), entry.index, row,
+                                             reverse))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+class FederatedGLPI(object):
+    """
+    Client of several GLPI instances, instances being a dict (or a list of
+    pairs) of name -> GLPI object, each with its own session and
+    connections. Calls are sent to every instance at the same time, so
+    they take as long as the slowest instance, and rows (dicts) are
+    tagged with the name of their instance in source_field.
+
+    An error of an instance, connection errors included, raises a
+    GlpiException naming it.
+    """
+
+    def __init__(self, instances, source_field='_source'):
+        self.instances = OrderedDict(instances.items()
+                                     if isinstance(instances, dict)
+                                     else instances)
+        self.source_field = source_field
+
+    @classmethod
+    def connect(cls, configs, **options):
+        """
+        Return a FederatedGLPI of configs, name -> (url, app_token,
+        auth_token), each GLPI object using its own requests.Session
+        (connection pool). options are passed to GLPI.
+        """
+        import requests
+
+        instances = OrderedDict()
+        for name, (url, app_token, auth_token) in configs.items():
+            transport = RequestsTransport(requests.Session())
+            instances[name] = GLPI(url, app_token, auth_token,
+                                   transport=transport, **options)
+        return cls(instances)
+
+    def _fan_out(self, call):
+        """ Return name -> call(glpi) run on every instance at once. """
+        names = list(self.instances)
+        if not names:
+            return OrderedDict()
+
+        def run(name):
+            try:
+                return call(self.instances[name])
+            except Exception as e:
+                raise GlpiException('%s: %s' % (name, e))
+
+        pool = ThreadPool(len(names))
+        try:
+            results = pool.map(run, names)
+        finally:
+            pool.terminate()
+        return OrderedDict(zip(names, results))
+
+    def _tag(self, name, rows):
+        for row in rows:
+            if isinstance(row, dict):
+                row[self.source_field] = name
+        return rows
+
+    @staticmethod
+    def _check(name, result):
+        # GLPI methods return errors as a set of messages or an error list.
+        if isinstance(result, set) or _is_glpi_error(result):
+            raise GlpiException('%s: %s' % (name, list(result)))
+        return result
+
+    def init_api(self):
+        """ Open the sessions of every instance at once. """
+        return self._fan_out(lambda glpi: glpi.init_api())
+
+    def get_all(self, item_name, expand_dropdowns=False, searchText=None,
+                key=None, reverse=False):
+        """
+        Return the items of item_name of every instance (see
+        GLPI.get_all()), sorted by key (a field or a function) when set.
+        """
+        results = self._fan_out(lambda glpi: glpi.get_all(
+            item_name, expand_dropdowns, searchText))
+        rows = []
+        for name, result in results.items():
+            rows.extend(self._tag(name, self._check(name, result)))
+        if key is not None:
+            rows.sort(key=_key_function(key), reverse=reverse)
+        return rows
+
+    def search_engine(self, item_name, criteria, key=None, reverse=False):
+        """
+        Search every instance (see GLPI.search_engine()). Returns
+        {"totalcount": .., "count": .., "data": tagged rows sorted by key
+        when set, "sources": {name: totalcount}}.
+        """
+        results = self._fan_out(lambda glpi: glpi.search_engine(
+            item_name, criteria))
+        merged = {"totalcount": 0, "count": 0, "data": [],
+                  "sources": OrderedDict()}
+        for name, result in results.items():
+            if not isinstance(result, dict):
+                self._check(name, result)
+                raise GlpiException('%s: %s' % (name, result))
+            rows = self._tag(name, result.get('data') or [])
+            merged['data'].extend(rows)
+            merged['count'] += len(rows)
+            merged['totalcount'] += int(result.get('totalcount', 0))
+            merged['sources'][name] = int(result.get('totalcount', 0))
+        if key is not None:
+            merged['data'].sort(key=_key_function(key), reverse=reverse)
+        return merged
+
+    def count(self, item_name, criteria=None):
+        """ Return name -> count of item_name (see GLPI.count()). """
+        return self._fan_out(lambda glpi: glpi.count(item_name, criteria))
+
+    def iter_all(self, item_name, criteria=None, page_size=1000, key=None,
+                 reverse=False):
+        """
+        Generator of the rows of item_name (or a search when criteria is
+        set) of every instance, read page by page (see GLPI.iter_all()).
+        Rows come as they arrive, or merged by key when set; then every
+        instance must return its rows sorted by key, I.E: with a 'sort'
+        in criteria.
+        """
+        def stream(name):
+            glpi = self.instances[name]
+            try:
+                for row in glpi.iter_all(item_name, criteria, page_size):
+                    if isinstance(row, dict):
+                        row[self.source_field] = name
+                    yield row
+            except Exception as e:
+                raise GlpiException('%s: %s' % (name, e))
+
+        names = list(self.instances)
+        if key is None:
+            for row in _iter_merged([stream(name) for name in names],
+                                    len(names)):
+                yield row
+            return
+        streams = [_prefetch(stream(name)) for name in names]
+        for row in _merge_sorted(streams, _key_function(key), reverse):
+            yield row
+
+    def close(self):
+        for glpi in self.instances.values():
+            transport = getattr(glpi, 'transport', None)
+            if transport is not None:
+                transport.close()
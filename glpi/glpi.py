@@ -20,16 +20,22 @@ import os
 import sys
 import json as json_import
 import logging
-import requests
-from requests.structures import CaseInsensitiveDict
+import threading
+from collections import deque
 from .version import __version__
-from _cffi_backend import string
-from glpi_auth import GLpiAuth
+from .glpi_item import GlpiItem
+from .transport import RequestsTransport
+
+# Slow to import and seldom used modules (requests, numpy through columnar,
+# multiprocessing, html.parser...) are imported where they are needed, so
+# short-lived scripts only pay for what they use.
 
 if sys.version_info[0] > 2:
-    from html.parser import HTMLParser
+    from urllib.parse import quote
+    from queue import Queue, Full
 else:
-    from HTMLParser import HTMLParser
+    from urllib import quote
+    from Queue import Queue, Full
 
 
 logger = logging.getLogger(__name__)
@@ -51,6 +57,83 @@ def _remove_null_values(dictionary):
     return dictionary
 
 
+def _merge_headers(headers, other):
+    """
+    Return headers updated with other, header names being case
+    insensitive (I.E: 'Accept' replaces 'accept').
+    """
+    merged = dict(headers)
+    for name, value in other.items():
+        for old in [n for n in merged if n.lower() == name.lower()]:
+            del merged[old]
+        merged[name] = value
+    return merged
+
+
+def _read_params(expand_dropdowns, fields, options, listing=False):
+    """
+    Query parameters of a read: options plus expand_dropdowns. With fields,
+    HATEOAS links are not asked for (unless in fields) and a listing of
+    ids only is asked with only_id.
+    """
+    params = dict(options)
+    if expand_dropdowns:
+        params['expand_dropdowns'] = True
+    if fields:
+        if 'links' not in fields:
+            params.setdefault('get_hateoas', False)
+        if listing and set(fields) <= set(['id']):
+            params.setdefault('only_id', True)
+    return params
+
+
+def _project(body, fields):
+    """ Keep only fields (and id) of an item or of a list of items. """
+    if not fields or _is_glpi_error(body):
+        return body
+    if isinstance(body, list):
+        return [_project(item, fields) for item in body]
+    if isinstance(body, dict):
+        return dict((k, v) for k, v in body.items()
+                    if k in fields or k == 'id')
+    return body
+
+
+def _response_sizes(response):
+    """
+    Return (wire bytes, bytes) of a read response: the size of its body
+    as received (compressed or not) and decoded.
+    """
+    size = len(response.content)
+    length = response.headers.get('Content-Length')
+    if length is not None and length.isdigit():
+        return int(length), size
+    raw = getattr(response, 'raw', None)
+    if hasattr(raw, 'tell'):
+        try:
+            return raw.tell(), size
+        except Exception:
+            pass
+    return getattr(response, 'num_bytes_downloaded', size), size
+
+
+def _decode_once(response):
+    """
+    Make response.json() decode the body once and return that same
+    result to every call, for a response shared by coalesced callers.
+    """
+    decode, lock, body = response.json, threading.Lock(), []
+
+    def json(**kwargs):
+        with lock:
+            if not body:
+                body.append(decode(**kwargs))
+        return body[0]
+
+    response.json = json
+    return response
+
+
 def _cleanup_param_value(value):
     if isinstance(value, bool):
         return 'true' if value else 'false'
@@ -64,12 +147,314 @@ def _cleanup_param_values(dictionary):
     return dictionary
 
 
+# Sub-types returned inside the parent item by a getItem with_* flag,
+# in the '_<flag name without with_>' key.
+WITH_FLAGS = {
+    "Document": "with_documents",
+    "Contract": "with_contracts",
+    "Infocom": "with_infocoms",
+    "Notepad": "with_notes",
+    "Log": "with_logs",
+    "NetworkPort": "with_networkports",
+    "Ticket": "with_tickets",
+    "Problem": "with_problems",
+    "Change": "with_changes",
+    "Item_Disk": "with_disks",
+    "Item_SoftwareVersion": "with_softwares",
+    "Computer_Item": "with_connections",
+    "Item_Devices": "with_devices",
+}
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent identical calls: while a call for a key is in
+    flight, other callers of the same key wait for it and get its result
+    (or its error) instead of making their own call.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.shared = 0
+
+    def do(self, key, func):
+        """ Return func() or the result of the call of key in flight. """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.shared += 1
+            else:
+                call = self.calls[key] = {"done": threading.Event()}
+                call["leader"] = True
+        if not call.pop("leader", False):
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = func()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
+
+
+def _is_glpi_error(body):
+    """ GLPI answers errors as a list: ["ERROR_CODE", "message"] """
+    return isinstance(body, list) and len(body) > 0 and \
+        isinstance(body[0], str) and body[0].startswith('ERROR')
+
+
+def _thread_pool(workers):
+    """ Return a multiprocessing ThreadPool of workers threads. """
+    from multiprocessing.pool import ThreadPool
+    return ThreadPool(workers)
+
+
+def _content_range_total(response, default=None):
+    """ Return total from the Content-Range header (I.E: 0-49/1200). """
+    content_range = response.headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        try:
+            return int(content_range.rsplit('/', 1)[1])
+        except ValueError:
+            pass
+    return default
+
+
+class _Done(object):
+    """ Already computed result, with the AsyncResult interface. """
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def _iter_pages(fetch, page_size, workers=1, start=0):
+    """
+    Yield (offset, rows) pages in order. fetch(start, end) returns a
+    (rows, total) tuple. After the first page, up to workers pages are
+    fetched concurrently, so at most workers pages are held in memory.
+    """
+    rows, total = fetch(start, start + page_size - 1)
+    yield start, rows
+    if not rows:
+        return
+    next_start = start + page_size
+    pool = _thread_pool(workers) if workers > 1 else None
+    pending = deque()
+    try:
+        while next_start < total or pending:
+            while next_start < total and len(pending) < max(workers, 1):
+                args = (next_start, next_start + page_size - 1)
+                if pool is not None:
+                    pending.append((next_start,
+                                    pool.apply_async(fetch, args)))
+                else:
+                    pending.append((next_start, _Done(fetch(*args))))
+                next_start += page_size
+            offset, result = pending.popleft()
+            rows, page_total = result.get()
+            if not rows:
+                continue
+            total = page_total
+            yield offset, rows
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def _bounded_imap(func, iterable, workers=1):
+    """
+    Like ThreadPool.imap() but never runs ahead of the consumer by more
+    than workers tasks, so large inputs are streamed in constant memory.
+    When iterable fails, the tasks already started are yielded before the
+    error is raised.
+    """
+    if workers <= 1:
+        for args in iterable:
+            yield func(args)
+        return
+    pool = _thread_pool(workers)
+    pending = deque()
+    iterator = iter(iterable)
+    error = None
+    try:
+        while True:
+            try:
+                args = next(iterator)
+            except StopIteration:
+                break
+            except Exception as e:
+                error = e
+                break
+            pending.append(pool.apply_async(func, (args,)))
+            if len(pending) >= workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+    if error is not None:
+        raise error
+
+
+def _iter_merged(iterables, workers):
+    """
+    Yield the items of iterables as they are produced, each iterable being
+    consumed by one of up to workers threads. Producers wait while
+    2 * workers items are not yet consumed. The first error is raised.
+    """
+    todo = deque(iterables)
+    workers = max(1, min(workers, len(todo)))
+    results = Queue(2 * workers)
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                results.put(entry, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def run():
+        try:
+            while not stop.is_set():
+                with lock:
+                    if not todo:
+                        break
+                    iterable = todo.popleft()
+                for item in iterable:
+                    if not put((True, item)):
+                        return
+        except Exception as e:
+            put((False, e))
+        put(None)
+
+    threads = [threading.Thread(target=run) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        running = workers
+        while running:
+            entry = results.get()
+            if entry is None:
+                running -= 1
+            elif entry[0]:
+                yield entry[1]
+            else:
+                raise entry[1]
+    finally:
+        stop.set()
+
+
+def _update_input(data):
+    """
+    Return the update input of data: dicts are sent as is, GlpiItem only
+    with their changed attributes and 'id'. None when there is no change.
+    """
+    if not isinstance(data, GlpiItem):
+        return data
+    changes = data.get_changes()
+    if not changes:
+        return None
+    changes['id'] = data.get_attribute('id')
+    return changes
+
+
+def _written(items, results, action):
+    """
+    Items of a successful write with their 'id', for write listeners.
+    items are dicts or GlpiItem, results the _item_results() of the write.
+    """
+    written = []
+    for item, result in zip(items, results):
+        if not result['ok']:
+            continue
+        if isinstance(item, GlpiItem):
+            item = item.to_dict()
+        item = dict(item)
+        if action == 'create' or not item.get('id'):
+            item['id'] = result['id']
+        written.append(item)
+    return written
+
+
+def _chunks(iterable, size):
+    """ Yield lists of up to size items from iterable. """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _key_criterion(option, value, link='AND'):
+    """
+    Search criterion matching value exactly on a search option (see
+    GLPI.get_field_schema()): 'equals' for ids and numbers, an anchored
+    'contains' otherwise.
+    """
+    if option['datatype'] in ('number', 'integer', 'count', 'dropdown'):
+        return {"field": option['id'], "searchtype": 'equals',
+                "value": value, "link": link}
+    return {"field": option['id'], "searchtype": 'contains',
+            "value": '^%s$' % value, "link": link}
+
+
+def _item_results(body, count):
+    """
+    Normalize GLPI answers of array inputs into one
+    {"id": .., "ok": .., "message": ..} dict per item.
+    Create answers {"id": 8, "message": ""} and update/delete answer
+    {"8": true, "message": ""}.
+    """
+    if _is_glpi_error(body):
+        message = ' '.join('%s' % b for b in body)
+        return [{"id": None, "ok": False, "message": message}
+                for _ in range(count)]
+    if isinstance(body, dict):
+        body = [body]
+    results = []
+    for r in body:
+        message = r.get('message', '')
+        if 'id' in r:
+            results.append({"id": r['id'], "ok": bool(r['id']),
+                            "message": message})
+            continue
+        item_id, ok = None, False
+        for k, v in r.items():
+            if k != 'message':
+                item_id, ok = int(k) if k.isdigit() else k, bool(v)
+        results.append({"id": item_id, "ok": ok, "message": message})
+    return results
+
+
 def _glpi_html_parser(content):
     """
     Try to retrieve data tokens from HTML content.
     It's useful to debug GLPI rest when it's not returning JSON responses. I.E:
     when MYSQL server is down, API Rest answer html errors.
     """
+    if sys.version_info[0] > 2:
+        from html.parser import HTMLParser
+    else:
+        from HTMLParser import HTMLParser
+
     class GlpiHTMLParser(HTMLParser):
         def __init__(self, content):
             HTMLParser.__init__(self)
@@ -103,6 +488,34 @@ def _glpi_html_parser(content):
     return html_parser.get_data_clear()
 
 
+class Traffic(object):
+    """
+    Byte counts of the responses read: responses, wire_bytes (as received,
+    compressed or not) and bytes (decoded).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def add(self, wire_bytes, size):
+        with self.lock:
+            self.responses += 1
+            self.wire_bytes += wire_bytes
+            self.bytes += size
+
+    def reset(self):
+        with self.lock:
+            self.responses = 0
+            self.wire_bytes = 0
+            self.bytes = 0
+
+    def as_dict(self):
+        with self.lock:
+            return {"responses": self.responses,
+                    "wire_bytes": self.wire_bytes, "bytes": self.bytes}
+
+
 class GlpiException(Exception):
     pass
 
@@ -118,7 +531,9 @@ class GlpiService(object):
     def __init__(self, url_apirest, token_app, uri=None,
                  username=None, password=None, token_auth=None,
                  use_vcap_services=False, vcap_services_name=None,
-                 sslverify=False, writable=False):
+                 sslverify=False, writable=False, coalesce_reads=False,
+                 transport=None, traffic=None,
+                 accept_encoding='gzip, deflate'):
         """
         [TODO] Loads credentials from the VCAP_SERVICES environment variable if
         available, preferring credentials explicitly set in the request.
@@ -128,6 +543,19 @@ class GlpiService(object):
         You can choose in setup initial authentication using username and
         password, or setup with Authorization HTTP token. If token_auth is set,
         username and password credentials must be ignored.
+
+        With coalesce_reads, concurrent identical GET requests share one
+        HTTP request and its response, see SingleFlight. The body of a
+        shared response is decoded once: its callers get the same result,
+        which they should not modify.
+
+        transport sends the requests (see glpi.transport), requests by
+        default.
+
+        Responses are asked compressed with accept_encoding (None to not
+        ask). The size of each response read (not streamed) is set in its
+        wire_bytes and body_bytes attributes and added to traffic, a
+        Traffic.
         """
         self.__version__ = __version__
         self.url = url_apirest
@@ -139,6 +567,11 @@ class GlpiService(object):
         self.token_auth = token_auth
         self.sslverify = sslverify
         self.writable = writable
+        self.coalescer = SingleFlight() if coalesce_reads else None
+        self.transport = transport if transport is not None \
+            else RequestsTransport()
+        self.traffic = traffic if traffic is not None else Traffic()
+        self.accept_encoding = accept_encoding
 
         self.session = None
 
@@ -214,25 +647,26 @@ class GlpiService(object):
 
         if self.token_auth is not None:
             if isinstance(self.token_auth, str):
-                auth = GLpiAuth(self.token_auth)
+                # What GLpiAuth does, without importing requests for it.
+                headers['Authorization'] = 'user_token %s' % self.token_auth
             else:
                 auth = self.token_auth
         else:
             auth = (self.username, self.password)
 
-        r = requests.request('GET', full_url,
-                             auth=auth, headers=headers, verify=self.sslverify)
+        r = self.transport.request('GET', full_url, auth=auth,
+                                   headers=headers, verify=self.sslverify)
 
         try:
             if r.status_code == 200:
                 self.session = r.json()['session_token']
                 return True
             else:
-                err = _glpi_html_parser(r.content)
+                err = _glpi_html_parser(r.text)
                 raise GlpiException("Init session to GLPI server fails: %s" %
                                     err)
         except Exception:
-            err = _glpi_html_parser(r.content)
+            err = _glpi_html_parser(r.text)
             raise GlpiException("ERROR when try to init session in GLPI\
                                 server:%s" % err)
 
@@ -261,6 +695,80 @@ class GlpiService(object):
 
         return self.session
 
+    def kill_session(self):
+        """ Close the session on the server. """
+        if self.session is not None:
+            self.request('GET', 'killSession')
+            self.session = None
+
+    def get_my_entities(self, is_recursive=False):
+        """ Return the entities of the user: [{"id": .., "name": ..}] """
+        params = {'is_recursive': 'true'} if is_recursive else None
+        response = self.request('GET', 'getMyEntities', accept_json=True,
+                                params=params)
+        body = response.json()
+        if _is_glpi_error(body) or not isinstance(body, dict):
+            raise GlpiException("Unable to get my entities: %s" % body)
+        return body.get('myentities', [])
+
+    def change_active_entities(self, entities_id='all', is_recursive=False):
+        """
+        Restrict the session to entities_id (and its sub-entities when
+        is_recursive), or 'all'.
+        """
+        response = self.request('POST', 'changeActiveEntities',
+                                json={"entities_id": entities_id,
+                                      "is_recursive": is_recursive},
+                                accept_json=True)
+        if response.status_code >= 400:
+            raise GlpiException("Unable to change active entities to %s: "
+                                "%s" % (entities_id, response.text))
+
+    def get_massive_actions(self, itemtype, item_id=None, is_deleted=False):
+        """
+        Return the massive actions available on itemtype (or on the item
+        item_id): [{"key": .., "label": ..}]
+        """
+        path = 'getMassiveActions/%s' % itemtype
+        if item_id is not None:
+            path = '%s/%s' % (path, item_id)
+        params = {'is_deleted': 1} if is_deleted else None
+        response = self.request('GET', path, accept_json=True, params=params)
+        body = response.json()
+        if _is_glpi_error(body) or not isinstance(body, list):
+            raise GlpiException("Unable to get massive actions of %s: %s" %
+                                (itemtype, body))
+        return body
+
+    def get_massive_action_parameters(self, itemtype, action_key,
+                                      is_deleted=False):
+        """ Return the input fields of action_key on itemtype. """
+        params = {'is_deleted': 1} if is_deleted else None
+        response = self.request('GET', 'getMassiveActionParameters/%s/%s' %
+                                (itemtype, action_key), accept_json=True,
+                                params=params)
+        body = response.json()
+        if _is_glpi_error(body):
+            raise GlpiException("Unable to get parameters of %s: %s" %
+                                (action_key, body))
+        return body
+
+    def apply_massive_action(self, itemtype, action_key, ids, input=None):
+        """
+        Apply action_key to the items ids of itemtype with input.
+        Return {"ok": .., "ko": .., "noright": .., "messages": [..]}.
+        """
+        response = self.request('POST', 'applyMassiveAction/%s/%s' %
+                                (itemtype, action_key), accept_json=True,
+                                json={"ids": list(ids),
+                                      "input": input or {}})
+        body = response.json()
+        # 207 and 422 (some or all items failed) still carry the counts.
+        if _is_glpi_error(body) or not isinstance(body, dict):
+            raise GlpiException("Unable to apply %s to %s: %s" %
+                                (action_key, itemtype, body))
+        return body
+
     """ Request """
     def request(self, method, url, accept_json=False, headers={},
                 params=None, json=None, data=None, files=None, **kwargs):
@@ -273,24 +781,25 @@ class GlpiService(object):
         full_url = '%s/%s' % (self.url, url.strip('/'))
         input_headers = _remove_null_values(headers) if headers else {}
 
-        headers = CaseInsensitiveDict(
-             {'user-agent': 'glpi-sdk-python-' + __version__})
+        headers = {'user-agent': 'glpi-sdk-python-' + __version__}
 
         if accept_json:
             headers['accept'] = 'application/json'
+        if self.accept_encoding:
+            headers['accept-encoding'] = self.accept_encoding
 
         try:
             if self.session is None:
                 self.set_session_token()
-            headers.update({'Session-Token': self.session})
+            headers['Session-Token'] = self.session
         except GlpiException as e:
             raise GlpiException("Unable to get Session token. \
                                 ERROR: {}".format(e))
 
         if self.app_token is not None:
-            headers.update({'App-Token': self.app_token})
+            headers['App-Token'] = self.app_token
 
-        headers.update(input_headers)
+        headers = _merge_headers(headers, input_headers)
 
         # Remove keys with None values
         params = _remove_null_values(params)
@@ -299,11 +808,29 @@ class GlpiService(object):
         data = _remove_null_values(data)
         files = _remove_null_values(files)
 
+        def send():
+            response = self.transport.request(
+                method, full_url, headers=headers, params=params, data=data,
+                json=json, files=files, verify=self.sslverify, **kwargs)
+            if not kwargs.get('stream') and \
+                    getattr(response, 'content', None) is not None:
+                response.wire_bytes, response.body_bytes = \
+                    _response_sizes(response)
+                self.traffic.add(response.wire_bytes, response.body_bytes)
+            return response
+
         try:
-            response = requests.request(method=method, url=full_url,
-                                        headers=headers, params=params,
-                                        data=data, verify=self.sslverify,
-                                        **kwargs)
+            if self.coalescer is not None and method.upper() == 'GET' and \
+                    data is None and json is None and files is None and \
+                    not kwargs.get('stream'):
+                key = (full_url, json_import.dumps(params, sort_keys=True,
+                                                   default=str),
+                       tuple(sorted((name.lower(), value)
+                                    for name, value in headers.items())))
+                response = self.coalescer.do(
+                    key, lambda: _decode_once(send()))
+            else:
+                response = send()
         except Exception:
             logger.error("ERROR requesting uri(%s) payload(%s)" % (url, data))
             raise
@@ -316,7 +843,7 @@ class GlpiService(object):
         data_str = ""
         null_str = None
         for k in data_json:
-            if data_str is not "":
+            if data_str != "":
                 data_str = "%s," % data_str
 
             if data_json[k] == null_str:
@@ -337,42 +864,94 @@ class GlpiService(object):
         if (data_json is None):
             return "{ 'error_message' : 'Object not found.'}"
 
+        item = None
+        if isinstance(data_json, GlpiItem):
+            item = data_json
+            data_json = dict((k, None if v == item.null_str else v)
+                             for k, v in item.get_data().items())
+
         payload = '{"input": { %s }}' % (self.get_payload(data_json))
-        print(payload)
+        logger.debug(payload)
 
         response = self.request('POST', self.uri, data=payload,
                                 accept_json=True)
 
-        return response.json()
+        result = response.json()
+        if item is not None and isinstance(result, dict) and 'id' in result:
+            item.set_attribute('id', result['id'])
+            item.mark_clean()
+        return result
 
     # [R]EAD - Retrieve Item data
-    def get_all(self, expand_dropdowns=False, uri_query=""):
-        """ Return all content of Item in JSON format. """
-        if expand_dropdowns:
-            payload = {'expand_dropdowns': str(expand_dropdowns).lower()}
-        else:
-            payload = {}
+    def get_all(self, expand_dropdowns=False, uri_query="", fields=None,
+                **options):
+        """
+        Return all content of Item in JSON format. options are getItems
+        parameters (I.E: only_id=True, get_hateoas=False) and fields the
+        fields kept in the items (see _read_params()).
+        """
+        payload = _read_params(expand_dropdowns, fields, options, True)
         res = self.request('GET', self.uri + uri_query, params=payload)
-        return res.json()
+        return _project(res.json(), fields)
 
-    def get(self, item_id, expand_dropdowns=False):
-        """ Return the JSON item with ID item_id. """
+    def get(self, item_id, expand_dropdowns=False, fields=None, **options):
+        """
+        Return the JSON item with ID item_id. options are getItem
+        parameters (I.E: get_hateoas=False, with_logs=True) and fields the
+        fields kept in the item.
+        """
 
         if isinstance(item_id, int):
-            if expand_dropdowns:
-                payload = {'expand_dropdowns': str(expand_dropdowns).lower()}
-            else:
-                payload = {}
+            payload = _read_params(expand_dropdowns, fields, options)
             uri = '%s/%d' % (self.uri, item_id)
             response = self.request('GET', uri, params=payload)
-            return response.json()
+            return _project(response.json(), fields)
         else:
             return {'error_message': 'Unale to get %s ID [%s]' % (self.uri,
                                                                   item_id)}
 
-    def get_path(self, path=''):
+    def get_range(self, uri, start, end, params=None):
+        """
+        Return a (rows, total) tuple with rows start to end of uri, a list
+        of items or a search. Total is read from Content-Range.
+        """
+        params = dict(params or {})
+        params['range'] = '%d-%d' % (start, end)
+        response = self.request('GET', uri, params=params, accept_json=True)
+        body = response.json()
+
+        if _is_glpi_error(body):
+            if body[0] == 'ERROR_RANGE_EXCEED_TOTAL':
+                return [], start
+            raise GlpiException("Unable to get range %d-%d of %s: %s" %
+                                (start, end, uri, body))
+        if isinstance(body, dict):
+            return body.get('data', []), int(body.get('totalcount', 0))
+
+        total = start + len(body)
+        if len(body) > end - start:
+            total = total + 1
+        return body, _content_range_total(response, total)
+
+    def get_multiple(self, items, fields=None, **options):
+        """
+        Return several items in one request, items being a list of
+        (itemtype, item_id) tuples. options and fields as in get().
+        """
+        params = _read_params(False, fields, options)
+        for i, (itemtype, item_id) in enumerate(items):
+            params['items[%d][itemtype]' % i] = itemtype
+            params['items[%d][items_id]' % i] = item_id
+        response = self.request('GET', 'getMultipleItems', params=params,
+                                accept_json=True)
+        body = response.json()
+        if _is_glpi_error(body):
+            raise GlpiException("Unable to get multiple items: %s" % body)
+        return _project(body, fields)
+
+    def get_path(self, path='', params=None):
         """ Return the JSON from path """
-        response = self.request('GET', path)
+        response = self.request('GET', path, params=params)
         return response.json()
 
     def search_options(self, item_name):
@@ -399,14 +978,119 @@ class GlpiService(object):
 
     # [U]PDATE an Item
     def update(self, data):
-        """ Update an object Item. """
+        """
+        Update an object Item. data is a dict with the 'id' or a GlpiItem,
+        then only its changes are sent and no request is made without
+        changes.
+        """
+
+        update_input = _update_input(data)
+        if update_input is None:
+            return [{"%s" % data.get_attribute('id'): True,
+                     "message": "No changes to update"}]
 
-        payload = '{"input": { %s }}' % (self.get_payload(data))
-        new_url = "%s/%d" % (self.uri, data['id'])
+        payload = '{"input": { %s }}' % (self.get_payload(update_input))
+        new_url = "%s/%d" % (self.uri, update_input['id'])
         logging.debug(payload)
         response = self.request('PUT', new_url, data=payload, accept_json=True)
 
-        return response.json()
+        result = response.json()
+        if isinstance(data, GlpiItem) and isinstance(result, list) and \
+                not _is_glpi_error(result) and \
+                _item_results(result, 1)[0]['ok']:
+            data.mark_clean()
+        return result
+
+    def create_many(self, items, uri=None):
+        """
+        Create several items in one request (array input). Returns one
+        result dict per item, see _item_results().
+        """
+        items = list(items)
+        response = self.request('POST', uri or self.uri,
+                                json={"input": items}, accept_json=True)
+        return _item_results(response.json(), len(items))
+
+    def update_many(self, items, uri=None):
+        """
+        Update several items, each one with its 'id', in one request.
+        Returns one result dict per item, see _item_results().
+        """
+        items = list(items)
+        response = self.request('PUT', uri or self.uri,
+                                json={"input": items}, accept_json=True)
+        return _item_results(response.json(), len(items))
+
+    def upload_document(self, fileobj, filename, input=None,
+                        content_type=None):
+        """
+        Create a Document from fileobj (a binary file object) with GLPI's
+        uploadManifest multipart format. The file is streamed while it is
+        sent. input adds fields to the Document. Returns the GLPI answer.
+        """
+        import mimetypes
+        from .multipart import MultipartStream
+        manifest = dict(input or {})
+        manifest.setdefault('name', filename)
+        manifest['_filename'] = [filename]
+        body = MultipartStream(
+            fields=[('uploadManifest', json_import.dumps({"input": manifest}),
+                     'application/json')],
+            files=[('filename[0]', filename, fileobj,
+                    content_type or mimetypes.guess_type(filename)[0] or
+                    'application/octet-stream')])
+        response = self.request('POST', 'Document', accept_json=True,
+                                headers={'Content-Type': body.content_type},
+                                data=body)
+        result = response.json()
+        if _is_glpi_error(result) or not isinstance(result, dict) or \
+                not result.get('id'):
+            raise GlpiException("Unable to upload %s: %s" %
+                                (filename, result))
+        return result
+
+    def download_document(self, document_id, out, chunk_size=65536,
+                          hash_name=None):
+        """
+        Stream the file of Document document_id to out (a binary writer)
+        chunk_size bytes at a time. With hash_name (I.E: 'sha256') a hash
+        is computed along the way. Returns {"bytes": .., "hash": ..}.
+        """
+        response = self.request('GET', 'Document/%d' % document_id,
+                                headers={'Accept': 'application/octet-stream'},
+                                stream=True)
+        if hash_name:
+            import hashlib
+            digest = hashlib.new(hash_name)
+        else:
+            digest = None
+        size = 0
+        try:
+            if response.status_code >= 400:
+                raise GlpiException("Unable to download document %d: %s" %
+                                    (document_id, response.text))
+            for chunk in response.iter_content(chunk_size):
+                out.write(chunk)
+                size += len(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+        finally:
+            response.close()
+        return {"bytes": size,
+                "hash": digest.hexdigest() if digest is not None else None}
+
+    def delete_many(self, item_ids, uri=None, force_purge=False):
+        """
+        Delete several items in one request. Returns one result dict per
+        item, see _item_results().
+        """
+        item_ids = list(item_ids)
+        payload = {"input": [{"id": i} for i in item_ids]}
+        if force_purge:
+            payload["force_purge"] = True
+        response = self.request('DELETE', uri or self.uri, json=payload,
+                                accept_json=True)
+        return _item_results(response.json(), len(item_ids))
 
     # [D]ELETE an Item
     def delete(self, item_id, force_purge=False):
@@ -435,14 +1119,27 @@ class GLPI(object):
     __version__ = __version__
 
     def __init__(self, url, app_token, auth_token,
-                 item_map=None, sslverify=True, writable=False):
-        """ Construct generic object """
+                 item_map=None, sslverify=True, writable=False,
+                 coalesce_reads=False, cache=None, transport=None):
+        """
+        Construct generic object. With coalesce_reads, concurrent identical
+        reads share one request, transport sends the requests (see
+        GlpiService).
+
+        cache is an item cache (glpi.cache.MemoryCache or SQLiteCache) used
+        by get(), get_item() and get_multiple(), updated by the writes of
+        this client: updates are merged in the cached items, deleted items
+        are dropped. Writes of other clients are seen once entries expire.
+        """
 
         self.url = url
         self.app_token = app_token
         self.auth_token = auth_token
         self.sslverify = sslverify
         self.writable = writable
+        self.coalesce_reads = coalesce_reads
+        self.transport = transport
+        self.traffic = Traffic()
 
         self.item_uri = None
         self.item_map = {
@@ -458,6 +1155,11 @@ class GLPI(object):
         }
         self.api_rest = None
         self.api_session = None
+        self.schema_cache = {}
+        self.write_listeners = []
+        self.cache = cache
+        if cache is not None:
+            self.add_write_listener(self._cache_write)
 
         if item_map is not None:
             self.set_item_map(item_map)
@@ -498,13 +1200,24 @@ class GLPI(object):
         self.set_item(item_name)
         self.set_api_uri()
 
+    def get_itemtype(self, item_name):
+        """ Return the GLPI itemtype of item_name (I.E: ticket -> Ticket) """
+        return self.item_map.get(item_name, item_name).strip('/')
+
+    def _new_service(self):
+        """ A GlpiService of this client, without session yet. """
+        return GlpiService(self.url, self.app_token,
+                           token_auth=self.auth_token,
+                           sslverify=self.sslverify,
+                           writable=self.writable,
+                           coalesce_reads=self.coalesce_reads,
+                           transport=self.transport,
+                           traffic=self.traffic)
+
     def init_api(self):
         """ Initialize the API Rest connection """
 
-        self.api_rest = GlpiService(self.url, self.app_token,
-                                    token_auth=self.auth_token,
-                                    sslverify=self.sslverify,
-                                    writable=self.writable)
+        self.api_rest = self._new_service()
 
         try:
             self.api_session = self.api_rest.get_session_token()
@@ -526,6 +1239,48 @@ class GLPI(object):
         return True
 
     # [C]REATE - Create an Item
+    def add_write_listener(self, listener):
+        """
+        Call listener(itemtype, action, items) after the successful writes
+        of this client, action being 'create', 'update' or 'delete' and
+        items the written dicts with their 'id' (only the sent fields for
+        updates). Massive actions whose changes are unknown are notified
+        as 'massive' with the ids only.
+        """
+        self.write_listeners.append(listener)
+
+    def remove_write_listener(self, listener):
+        self.write_listeners.remove(listener)
+
+    def notify_write(self, item_name, action, items):
+        """ Call the write listeners, see add_write_listener(). """
+        if not items:
+            return
+        itemtype = self.get_itemtype(item_name)
+        for listener in list(self.write_listeners):
+            try:
+                listener(itemtype, action, items)
+            except Exception:
+                logger.exception("Write listener failed")
+
+    # Item cache
+    def _cache_key(self, item_name, item_id):
+        return '%s/%s' % (self.get_itemtype(item_name).lower(), item_id)
+
+    def _cache_set(self, item_name, item):
+        if isinstance(item, dict) and item.get('id'):
+            self.cache.set(self._cache_key(item_name, item['id']), item)
+
+    def _cache_write(self, itemtype, action, items):
+        for item in items:
+            key = self._cache_key(itemtype, item['id'])
+            cached = self.cache.get(key) if action == 'update' else None
+            if cached is None:
+                self.cache.delete(key)
+            else:
+                cached.update(item)
+                self.cache.set(key, cached)
+
     def create(self, item_name, item_data):
         """ Create an Resource Item """
         try:
@@ -533,14 +1288,20 @@ class GLPI(object):
                 self.init_api()
 
             self.update_uri(item_name)
-            return self.api_rest.create(item_data)
+            result = self.api_rest.create(item_data)
+            if isinstance(result, dict) and result.get('id'):
+                self.notify_write(item_name, 'create', _written(
+                    [item_data], [{"id": result['id'], "ok": True}],
+                    'create'))
+            return result
 
         except GlpiException as e:
             return {'{}'.format(e)}
 
     # [R]EAD - Retrieve Item data
-    def get_all(self, item_name, expand_dropdowns=False, searchText=None):
-        """ Get all resources from item_name
+    def get_all(self, item_name, expand_dropdowns=False, searchText=None,
+                fields=None, **options):
+        """ Get all resources from item_name, see GlpiService.get_all()
         criteria: [
             {
                 "field": "name",
@@ -567,13 +1328,252 @@ class GLPI(object):
                 self.init_api()
 
             self.update_uri(item_name)
-            return self.api_rest.get_all(expand_dropdowns, uri_query)
+            return self.api_rest.get_all(expand_dropdowns, uri_query, fields,
+                                         **options)
 
         except GlpiException as e:
             return {'{}'.format(e)}
 
-    def get(self, item_name, item_id=None, expand_dropdowns=False):
-        """ Get item_name and/with resource by ID """
+    def get_pages(self, item_name, criteria=None, page_size=1000,
+                  workers=1, start=0, expand_dropdowns=False, fields=None,
+                  **options):
+        """
+        Generator of (offset, rows) pages of item_name, from all items or
+        from a search when criteria is set (see search_query()). Pages are
+        yielded in order and fetched by up to workers threads, so memory
+        use does not depend on the number of items.
+        fields keeps only these keys of the rows, options are getItems
+        parameters (see GlpiService.get_all()).
+        """
+        if not self.api_has_session():
+            self.init_api()
+
+        self.update_uri(item_name)
+        uri = self.item_uri
+        params = None
+        if criteria is not None:
+            uri = 'search/%s' % self.search_query(item_name, criteria,
+                                                  start=None)
+        else:
+            params = _read_params(expand_dropdowns, fields, options, True)
+
+        def fetch(page_start, page_end):
+            rows, total = self.api_rest.get_range(uri, page_start, page_end,
+                                                  params)
+            return _project(rows, fields), total
+
+        for page in _iter_pages(fetch, page_size, workers, start):
+            yield page
+
+    def iter_all(self, item_name, criteria=None, page_size=1000, workers=1,
+                 expand_dropdowns=False, fields=None, **options):
+        """ Generator of every item of item_name, see get_pages(). """
+        for _, rows in self.get_pages(item_name, criteria, page_size,
+                                      workers,
+                                      expand_dropdowns=expand_dropdowns,
+                                      fields=fields, **options):
+            for row in rows:
+                yield row
+
+    def get_columnar(self, item_name, criteria=None, fields=None,
+                     page_size=1000, workers=4, expand_dropdowns=False):
+        """
+        Return every item of item_name (or a search when criteria is set)
+        as a ColumnarResult, filled page by page as pages are streamed.
+        fields restricts the stored columns.
+        """
+        from .columnar import ColumnarResult
+        result = ColumnarResult(fields)
+        result.add_pages(self.get_pages(item_name, criteria, page_size,
+                                        workers,
+                                        expand_dropdowns=expand_dropdowns,
+                                        fields=fields))
+        return result
+
+    def _keyset_uri(self, item_name, criteria, after, before=None):
+        """ Search URI of item_name for criteria and after < id < before. """
+        query = dict(criteria or {})
+        keyset = [{"field": 2, "searchtype": "morethan", "value": after,
+                   "link": "AND"}]
+        if before is not None:
+            keyset.append({"field": 2, "searchtype": "lessthan",
+                           "value": before, "link": "AND"})
+        if query.get('criteria'):
+            # Grouped, so an OR of the caller cannot escape the bounds.
+            keyset.append({"link": "AND", "criteria": query['criteria']})
+        query['criteria'] = keyset
+        query['forcedisplay'] = [f for f in query.get('forcedisplay', [])
+                                 if f != 2] + [2]
+        query['sort'] = 2
+        query['order'] = 'ASC'
+        return 'search/%s' % self.search_query(item_name, query, start=None)
+
+    def id_bounds(self, item_name, criteria=None):
+        """
+        Return the (lowest, highest) id of item_name (matching criteria),
+        None when there is no item.
+        """
+        if not self.api_has_session():
+            self.init_api()
+
+        bounds = []
+        for order in ('ASC', 'DESC'):
+            query = dict(criteria or {})
+            query['forcedisplay'] = [2]
+            query['sort'] = 2
+            query['order'] = order
+            rows, _ = self.api_rest.get_range(
+                'search/%s' % self.search_query(item_name, query,
+                                                start=None), 0, 0)
+            if not rows:
+                return None
+            bounds.append(int(rows[0]['2']))
+        return tuple(bounds)
+
+    def keyset_shards(self, item_name, shards, criteria=None):
+        """
+        Split the ids of item_name (matching criteria) into up to shards
+        (first id, last id) ranges of the same width, to be crawled by
+        get_keyset_pages(id_range=...) in threads or other processes.
+        """
+        bounds = self.id_bounds(item_name, criteria)
+        if bounds is None:
+            return []
+        low, high = bounds
+        width = max(1, -(-(high - low + 1) // max(shards, 1)))
+        return [(first, min(first + width - 1, high))
+                for first in range(low, high + 1, width)]
+
+    def get_keyset_pages(self, item_name, criteria=None, page_size=1000,
+                         shards=1, workers=None, id_range=None):
+        """
+        Generator of pages (lists of search rows) of item_name matching
+        criteria, read by id: every page is a search for the ids above the
+        last one read, sorted by id, so a page costs the same at any depth
+        unlike range offsets. The keyset criteria are added before criteria
+        with AND. id_range limits the crawl to (first id, last id).
+
+        With shards > 1, the ids are split with keyset_shards() and the
+        shards crawled by workers (default: shards) threads; pages are then
+        yielded as they arrive, not in id order.
+        """
+        if not self.api_has_session():
+            self.init_api()
+
+        def crawl(first, last):
+            after = first - 1 if first is not None else 0
+            before = last + 1 if last is not None else None
+            while True:
+                uri = self._keyset_uri(item_name, criteria, after, before)
+                rows, total = self.api_rest.get_range(uri, 0, page_size - 1)
+                if not rows:
+                    return
+                yield rows
+                if total <= len(rows):
+                    return
+                after = max(int(row['2']) for row in rows)
+
+        if shards <= 1:
+            for page in crawl(*(id_range or (None, None))):
+                yield page
+            return
+
+        ranges = self.keyset_shards(item_name, shards, criteria)
+        if id_range is not None:
+            ranges = [(max(first, id_range[0]), min(last, id_range[1]))
+                      for first, last in ranges]
+            ranges = [r for r in ranges if r[0] <= r[1]]
+        if not ranges:
+            return
+        for page in _iter_merged([crawl(first, last)
+                                  for first, last in ranges],
+                                 workers or shards):
+            yield page
+
+    def iter_keyset(self, item_name, criteria=None, page_size=1000,
+                    shards=1, workers=None, id_range=None):
+        """ Generator of search rows, see get_keyset_pages(). """
+        for rows in self.get_keyset_pages(item_name, criteria, page_size,
+                                          shards, workers, id_range):
+            for row in rows:
+                yield row
+
+    def get_my_entities(self, is_recursive=False):
+        """ Return the entities of the user, see getMyEntities. """
+        if not self.api_has_session():
+            self.init_api()
+        return self.api_rest.get_my_entities(is_recursive)
+
+    def iter_entities(self, item_name, criteria=None, entities=None,
+                      page_size=1000, workers=4, is_recursive=False):
+        """
+        Generator of the rows of item_name (or a search when criteria is
+        set) read entity by entity: every worker thread opens its own
+        session, restricts it to one entity at a time with
+        changeActiveEntities and reads that entity, so the server filters
+        rights on one entity per query. Rows are tagged with their entity
+        id in '_entity' and come as they arrive.
+
+        entities defaults to every entity of the user (getMyEntities).
+        With is_recursive, rows of sub-entities given too are read twice.
+        """
+        if not self.api_has_session():
+            self.init_api()
+
+        if entities is None:
+            entities = [e['id'] for e in self.get_my_entities()]
+        self.update_uri(item_name)
+        uri = self.item_uri
+        if criteria is not None:
+            uri = 'search/%s' % self.search_query(item_name, criteria,
+                                                  start=None)
+
+        local = threading.local()
+        services = []
+        lock = threading.Lock()
+
+        def read(entity):
+            service = getattr(local, 'service', None)
+            if service is None:
+                service = local.service = self._new_service()
+                with lock:
+                    services.append(service)
+            service.change_active_entities(entity, is_recursive)
+
+            def fetch(page_start, page_end):
+                return service.get_range(uri, page_start, page_end)
+
+            for _, rows in _iter_pages(fetch, page_size):
+                for row in rows:
+                    if isinstance(row, dict):
+                        row['_entity'] = entity
+                    yield row
+
+        try:
+            for row in _iter_merged([read(e) for e in entities], workers):
+                yield row
+        finally:
+            for service in services:
+                try:
+                    service.kill_session()
+                except Exception:
+                    logger.warning("Unable to kill an entity session")
+
+    def watch(self, item_name, criteria=None, fields=None, **options):
+        """
+        Return a Watcher of the changes of fields of the items of
+        item_name matching criteria: iterate it for events, or call its
+        run(callback). options are passed to Watcher.
+        """
+        from .watcher import Watcher
+        return Watcher(self, item_name, criteria, fields, **options)
+
+    def get(self, item_name, item_id=None, expand_dropdowns=False,
+            fields=None, **options):
+        """
+        Get item_name and/with resource by ID. fields and options as in
+        GlpiService.get().
+        """
         try:
             if not self.api_has_session():
                 self.init_api()
@@ -583,7 +1583,15 @@ class GLPI(object):
             if item_id is None:
                 return self.api_rest.get_path(item_name)
 
-            return self.api_rest.get(item_id, expand_dropdowns)
+            if self.cache is None or expand_dropdowns or options:
+                return self.api_rest.get(item_id, expand_dropdowns, fields,
+                                         **options)
+
+            item = self.cache.get(self._cache_key(item_name, item_id))
+            if item is None:
+                item = self.api_rest.get(item_id)
+                self._cache_set(item_name, item)
+            return _project(item, fields)
 
         except GlpiException as e:
             return {'{}'.format(e)}
@@ -600,6 +1608,83 @@ class GLPI(object):
         except GlpiException as e:
             return {'{}'.format(e)}
 
+    def get_multiple(self, item_name, item_ids, chunk_size=100,
+                     fresh=False, fields=None, **options):
+        """
+        Return items of item_name with item_ids, chunk_size items per
+        request (getMultipleItems). With fresh, items are read from the
+        server even when they are cached. fields and options as in
+        GlpiService.get(), partial items are not cached.
+        """
+        if not self.api_has_session():
+            self.init_api()
+
+        itemtype = self.get_itemtype(item_name)
+        cached = {}
+        if self.cache is not None and not fresh and not options:
+            for item_id in item_ids:
+                item = self.cache.get(self._cache_key(itemtype, item_id))
+                if item is not None:
+                    cached[item_id] = _project(item, fields)
+        result = []
+        missing = [item_id for item_id in item_ids if item_id not in cached]
+        for chunk in _chunks(missing, chunk_size):
+            items = self.api_rest.get_multiple(
+                [(itemtype, item_id) for item_id in chunk], fields,
+                **options)
+            if self.cache is not None and not fields and not options:
+                for item in items:
+                    self._cache_set(itemtype, item)
+            result.extend(items)
+        if not cached:
+            return result
+        fetched = dict((item.get('id'), item) for item in result
+                       if isinstance(item, dict))
+        return [cached[item_id] if item_id in cached else
+                fetched.get(int(item_id)) for item_id in item_ids
+                if item_id in cached or int(item_id) in fetched]
+
+    def get_field_schema(self, item_name):
+        """
+        Return the fields accepted by item_name as a dict
+        field -> {"id": search option ID, "datatype": ..., "name": ...},
+        built from listSearchOptions and cached per GLPI object.
+        Fields of linked tables are exposed as foreign keys
+        (I.E: glpi_locations -> locations_id).
+        """
+        itemtype = self.get_itemtype(item_name)
+        if itemtype in self.schema_cache:
+            return self.schema_cache[itemtype]
+
+        options = self.search_options(itemtype)
+        if not isinstance(options, dict):
+            raise GlpiException("Unable to get search options of %s: %s" %
+                                (itemtype, options))
+        options = dict((k, v) for k, v in options.items()
+                       if isinstance(v, dict) and 'field' in v)
+
+        table = 'glpi_%ss' % itemtype.lower()
+        for option in options.values():
+            if option['field'] == 'id':
+                table = option.get('table', table)
+                break
+
+        schema = {"id": {"id": 2, "datatype": "number", "name": "ID"}}
+        for option_id, option in options.items():
+            if option.get('table', table) == table:
+                field = option['field']
+                datatype = option.get('datatype', 'string')
+            else:
+                field = '%s_id' % option['table'][len('glpi_'):]
+                datatype = 'dropdown'
+            if field not in schema:
+                schema[field] = {"id": int(option_id),
+                                 "datatype": datatype,
+                                 "name": option.get('name')}
+
+        self.schema_cache[itemtype] = schema
+        return schema
+
     def search_criteria(self, data, criteria):
         """ #TODO Search in data some criteria """
         result = []
@@ -634,6 +1719,65 @@ class GLPI(object):
         else:
             return {"message_error": "Unable to find a valid criteria."}
 
+    def search_query(self, item_name, criteria, start=0, end=5000):
+        """
+        Build the URI query used by search_engine() from criteria in
+        JSON format. Fields can be names from the map below or search
+        option IDs. A criterion can also be a group {"link": ...,
+        "criteria": [...]}, matched as a whole. Optional keys
+        'forcedisplay' (list of search option IDs), 'sort' (search option
+        ID) and 'order' are also sent. The range is left out when start is
+        None.
+        """
+        field_map = {
+            "name": 1,
+            "id": 2,
+            "location": 3,
+            "type": 4,
+            "serialnumber": 5,
+            "body": 6,
+            "processor": 17,
+            "lastupdate": 19,
+            "manufacturer": 23,
+            "status": 31,
+            "model": 40,
+            "tags": 10500,
+            "operatingsystem": 45
+        }
+
+        def encode(prefix, group):
+            parts = []
+            for i, c in enumerate(group):
+                key = "%s[%d]" % (prefix, i)
+                if 'criteria' in c:
+                    parts.append("%s[link]=%s" % (key, c.get('link', 'AND')))
+                    parts.extend(encode("%s[criteria]" % key, c['criteria']))
+                    continue
+                field = c['field']
+                if not isinstance(field, int):
+                    field = field_map[field]
+                parts.append("%s[field]=%d" % (key, field))
+                value = '' if c['value'] is None else \
+                    quote('%s' % c['value'], safe='')
+                parts.append("%s[value]=%s" % (key, value))
+                parts.append("%s[searchtype]=%s" % (key, c['searchtype']))
+                parts.append("%s[link]=%s" % (key, c['link']))
+            return parts
+
+        uri_query = "%s?" % item_name + "&".join(
+            encode("criteria", criteria.get('criteria', [])))
+
+        for i, field in enumerate(criteria.get('forcedisplay', [])):
+            uri_query = uri_query + "&forcedisplay[%d]=%d" % (i, field)
+        if 'sort' in criteria:
+            uri_query = uri_query + "&sort=%d" % criteria['sort']
+        if 'order' in criteria:
+            uri_query = uri_query + "&order=%s" % criteria['order']
+
+        if start is not None:
+            uri_query = uri_query + "&range=%d-%d" % (start, end)
+        return uri_query
+
     def search_engine(self, item_name, criteria):
         """ Call GLPI's search engine syntax.
         Ex. cURL - usage to query in 'name' and return ID:
@@ -660,43 +1804,7 @@ class GLPI(object):
         RETURNS:
         GLPIs APIREST JSON formated with result of search in key 'data'.
         """
-        field_map = {
-            "name": 1,
-            "id": 2,
-            "location": 3,
-            "type": 4,
-            "serialnumber": 5,
-            "body": 6,
-            "processor": 17,
-            "lastupdate": 19,
-            "manufacturer": 23,
-            "status": 31,
-            "model": 40,
-            "tags": 10500,
-            "operatingsystem": 45
-        }
-        s_index = 0
-        uri_query = "%s?" % item_name
-
-        for c in criteria['criteria']:
-            if s_index == 0:
-                uri = ""
-            else:
-                uri = "&"
-
-            uri = uri + "criteria[%d][field]=%d&" % (s_index,
-                                                     field_map[c['field']])
-            if c['value'] is None:
-                uri = uri + "criteria[%d][value]=&" % (s_index)
-            else:
-                uri = uri + "criteria[%d][value]=%s&" % (s_index, c['value'])
-            uri = uri + "criteria[%d][searchtype]=%s&" % (s_index,
-                                                          c['searchtype'])
-            uri = uri + "criteria[%d][link]=%s" % (s_index, c['link'])
-            uri_query = uri_query + uri
-            s_index += 1
-
-        uri_query = uri_query + "&range=0-5000"
+        uri_query = self.search_query(item_name, criteria)
         try:
             if not self.api_has_session():
                 self.init_api()
@@ -707,19 +1815,499 @@ class GLPI(object):
         except GlpiException as e:
             return {'{}'.format(e)}
 
+    def _count_uri(self, item_name, criteria=None):
+        """ Return (uri, params) of a query counting item_name items. """
+        if not self.api_has_session():
+            self.init_api()
+        self.update_uri(item_name)
+        if criteria is None:
+            return self.item_uri, {'only_id': 'true'}
+        return 'search/%s' % self.search_query(item_name, criteria,
+                                               start=None), None
+
+    def count(self, item_name, criteria=None):
+        """
+        Return the number of item_name items, or of search results when
+        criteria is set (see search_query()). Only the first row is
+        transferred, the total is read from the server answer.
+        """
+        uri, params = self._count_uri(item_name, criteria)
+        return self.api_rest.get_range(uri, 0, 0, params)[1]
+
+    def count_by(self, item_name, field, values, criteria=None, workers=4):
+        """
+        Return {value: count} of item_name items whose field (a name from
+        get_field_schema() or a search option ID) equals each of values,
+        combined with AND to criteria when set. The counts are queried
+        concurrently by up to workers threads.
+        """
+        schema = self.get_field_schema(item_name)
+        if isinstance(field, int):
+            option = [o for o in schema.values() if o['id'] == field]
+            option = option[0] if option else {"id": field,
+                                               "datatype": "number"}
+        elif field in schema:
+            option = schema[field]
+        else:
+            raise GlpiInvalidArgument('Unknown field %s of %s' %
+                                      (field, item_name))
+
+        values = list(values)
+        base = list((criteria or {}).get('criteria', []))
+        uris = [self._count_uri(item_name, {"criteria": base + [
+            _key_criterion(option, value)]})[0] for value in values]
+
+        def count(uri):
+            return self.api_rest.get_range(uri, 0, 0)[1]
+
+        return dict(zip(values, _bounded_imap(count, uris, workers)))
+
+    def get_related(self, parent_type, ids, sub_types=(), workers=8,
+                    page_size=500, use_flags=True):
+        """
+        Return {id: {"item": parent, sub_type: [rows], ...}} for every id
+        of parent_type, I.E: get_related('Ticket', ids, ['ITILFollowup',
+        'TicketTask', 'Ticket_User', 'Document']).
+
+        Sub-types with a getItem with_* flag (see WITH_FLAGS) come with the
+        parent item in one request, the others are read from
+        /parent_type/id/sub_type. Up to workers requests run concurrently.
+        Failed requests leave {"item" or sub_type: message} in an 'errors'
+        key of the id instead of failing the whole call.
+        """
+        if not self.api_has_session():
+            self.init_api()
+        self.update_uri(parent_type)
+        uri = self.item_uri
+
+        flags = dict((t, WITH_FLAGS[t]) for t in sub_types
+                     if use_flags and t in WITH_FLAGS)
+        params = dict((flag, 'true') for flag in flags.values())
+        paths = [t for t in sub_types if t not in flags]
+
+        def fetch_item(item_id):
+            item = self.api_rest.get_path('%s/%d' % (uri, item_id), params)
+            if _is_glpi_error(item):
+                raise GlpiException(' '.join('%s' % e for e in item))
+            return item
+
+        def fetch_rows(item_id, sub_type):
+            path = '%s/%d/%s' % (uri, item_id, sub_type)
+            rows = []
+            for _, page in _iter_pages(
+                    lambda start, end: self.api_rest.get_range(path, start,
+                                                               end),
+                    page_size):
+                rows.extend(page)
+            return rows
+
+        def fetch(task):
+            item_id, sub_type = task
+            try:
+                if sub_type is None:
+                    return task, fetch_item(item_id), None
+                return task, fetch_rows(item_id, sub_type), None
+            except Exception as e:
+                return task, None, '%s' % e
+
+        ids = list(ids)
+        tasks = ((item_id, sub_type) for item_id in ids
+                 for sub_type in [None] + paths)
+
+        result = dict((item_id, {}) for item_id in ids)
+        for (item_id, sub_type), value, error in _bounded_imap(
+                fetch, tasks, workers):
+            related = result[item_id]
+            if error is not None:
+                related.setdefault('errors', {})[sub_type or 'item'] = error
+                continue
+            if sub_type is not None:
+                related[sub_type] = value
+                continue
+            for flag_type, flag in flags.items():
+                related[flag_type] = value.pop('_%s' % flag[5:], [])
+            related['item'] = value
+        return result
+
+    def upload_document(self, source, name=None, item=None, filename=None,
+                        content_type=None, input=None):
+        """
+        Upload source (a path or a binary file object) as a new Document,
+        streamed from disk. item, an (itemtype, id) tuple, attaches the
+        Document to that item in the same request. Returns the Document id.
+        """
+        if not self.api_has_session():
+            self.init_api()
+        if hasattr(source, 'read'):
+            filename = filename or os.path.basename(
+                getattr(source, 'name', None) or 'document')
+            fileobj = source
+        else:
+            filename = filename or os.path.basename(source)
+            fileobj = open(source, 'rb')
+        data = dict(input or {})
+        if name is not None:
+            data['name'] = name
+        if item is not None:
+            data['itemtype'], data['items_id'] = item
+        try:
+            result = self.api_rest.upload_document(fileobj, filename, data,
+                                                   content_type)
+        finally:
+            if fileobj is not source:
+                fileobj.close()
+
+        return int(result['id'])
+
+    def open_ticket(self, ticket, actors=(), groups=(), followups=(),
+                    tasks=(), items=(), documents=(), rollback=False,
+                    workers=4):
+        """
+        Create a Ticket (a dict or Ticket item) and its sub-items in two
+        round trips: the ticket first, then every sub-item type at once,
+        each type as one array input.
+
+        actors: Ticket_User dicts, I.E: {"users_id": 5, "type": 2}
+        groups: Group_Ticket dicts, I.E: {"groups_id": 3, "type": 2}
+        followups, tasks: contents or ITILFollowup/TicketTask dicts
+        items: (itemtype, id) tuples linked with Item_Ticket
+        documents: Document ids to link, paths or file objects to upload
+
+        Returns {"id": .., "ok": .., "parts": {itemtype: [results]},
+        "rolled_back": ..}, one {"id", "ok", "message"} result per part.
+        With rollback, the ticket and the created parts are purged when a
+        part fails.
+        """
+        if not self.api_has_session():
+            self.init_api()
+        if isinstance(ticket, GlpiItem):
+            data = dict((k, None if v == ticket.null_str else v)
+                        for k, v in ticket.get_data().items())
+        else:
+            data = dict(ticket)
+
+        created = self.api_rest.create_many([data], 'Ticket')[0]
+        self.notify_write('Ticket', 'create',
+                          _written([data], [created], 'create'))
+        result = {"id": created['id'] if created['ok'] else None,
+                  "ok": created['ok'], "parts": {"Ticket": [created]},
+                  "rolled_back": False}
+        if not created['ok']:
+            return result
+        ticket_id = created['id']
+        if isinstance(ticket, GlpiItem):
+            ticket.set_attribute('id', ticket_id)
+            ticket.mark_clean()
+
+        def content(value):
+            return dict(value) if isinstance(value, dict) \
+                else {"content": value}
+
+        parts = [
+            ('Ticket_User', [dict(a, tickets_id=ticket_id) for a in actors]),
+            ('Group_Ticket', [dict(g, tickets_id=ticket_id) for g in groups]),
+            ('ITILFollowup', [dict(content(f), itemtype='Ticket',
+                                   items_id=ticket_id) for f in followups]),
+            ('TicketTask', [dict(content(t), tickets_id=ticket_id)
+                            for t in tasks]),
+            ('Item_Ticket', [{"itemtype": itemtype, "items_id": item_id,
+                              "tickets_id": ticket_id}
+                             for itemtype, item_id in items]),
+            ('Document_Item', [{"documents_id": d, "itemtype": 'Ticket',
+                                "items_id": ticket_id}
+                               for d in documents if isinstance(d, int)]),
+        ]
+        calls = [(name, inputs) for name, inputs in parts if inputs]
+        calls.extend(('Document', source) for source in documents
+                     if not isinstance(source, int))
+
+        def send(call):
+            name, payload = call
+            try:
+                if name == 'Document':
+                    document_id = self.upload_document(
+                        payload, item=('Ticket', ticket_id))
+                    return name, [{"id": document_id, "ok": True,
+                                   "message": ""}]
+                results = self.api_rest.create_many(payload, name)
+                self.notify_write(name, 'create',
+                                  _written(payload, results, 'create'))
+                return name, results
+            except Exception as e:
+                count = 1 if name == 'Document' else len(payload)
+                return name, [{"id": None, "ok": False, "message": '%s' % e}
+                              for _ in range(count)]
+
+        for name, results in _bounded_imap(send, calls, workers):
+            result['parts'].setdefault(name, []).extend(results)
+
+        result['ok'] = all(r['ok'] for results in result['parts'].values()
+                           for r in results)
+        if not result['ok'] and rollback:
+            result['rolled_back'] = self._purge_parts(ticket_id,
+                                                      result['parts'],
+                                                      workers)
+        return result
+
+    def _purge_parts(self, ticket_id, parts, workers):
+        """ Purge the created parts, then the ticket. True when all are. """
+        deletes = [(name, [r['id'] for r in results if r['ok']])
+                   for name, results in parts.items() if name != 'Ticket']
+        deletes = [(name, ids) for name, ids in deletes if ids]
+
+        def send(delete):
+            name, ids = delete
+            try:
+                results = self.api_rest.delete_many(ids, name,
+                                                    force_purge=True)
+                self.notify_write(name, 'delete', _written(
+                    [{"id": i} for i in ids], results, 'delete'))
+                return results
+            except Exception as e:
+                return [{"id": None, "ok": False, "message": '%s' % e}]
+
+        ok = all(r['ok'] for results in _bounded_imap(send, deletes, workers)
+                 for r in results)
+        return send(('Ticket', [ticket_id]))[0]['ok'] and ok
+
+    def download_document(self, document_id, out, chunk_size=65536,
+                          hash_name=None):
+        """
+        Stream the file of Document document_id to out, a path or a binary
+        writer, see GlpiService.download_document().
+        """
+        if not self.api_has_session():
+            self.init_api()
+        if hasattr(out, 'write'):
+            return self.api_rest.download_document(document_id, out,
+                                                   chunk_size, hash_name)
+        with open(out, 'wb') as f:
+            return self.api_rest.download_document(document_id, f,
+                                                   chunk_size, hash_name)
+
+    def get_item(self, item_name, item_id, item_class=GlpiItem):
+        """
+        Return item_name with ID item_id as an item_class object, loaded
+        without changes so update() sends only what is changed afterwards.
+        """
+        if not self.api_has_session():
+            self.init_api()
+
+        self.update_uri(item_name)
+        data = None
+        if self.cache is not None:
+            data = self.cache.get(self._cache_key(item_name, item_id))
+        if data is None:
+            data = self.api_rest.get(item_id)
+            if self.cache is not None:
+                self._cache_set(item_name, data)
+        if not isinstance(data, dict) or 'id' not in data:
+            raise GlpiException("Unable to get %s ID %s: %s" %
+                                (item_name, item_id, data))
+        return item_class.from_data(data)
+
     # [U]PDATE an Item
     def update(self, item_name, data):
-        """ Update an Resource Item. Should have all the Item payload """
+        """
+        Update an Resource Item. data is the Item payload with its 'id' or a
+        GlpiItem, then only changed attributes are sent, and nothing when
+        there are no changes.
+        """
         try:
             if not self.api_has_session():
                 self.init_api()
 
             self.update_uri(item_name)
-            return self.api_rest.update(data)
+            update_input = _update_input(data)
+            result = self.api_rest.update(data)
+            if update_input is not None and isinstance(result, list) and \
+                    not _is_glpi_error(result) and \
+                    _item_results(result, 1)[0]['ok']:
+                self.notify_write(item_name, 'update', [update_input])
+            return result
 
         except GlpiException as e:
             return {'{}'.format(e)}
 
+    def iter_write(self, item_name, batches, action='create', workers=4):
+        """
+        Send batches (lists of items) of item_name as array inputs, up to
+        workers requests at a time. action is 'create' or 'update'.
+        Generator of (batch, results) in batches order, one result dict
+        {"id": .., "ok": .., "message": ..} per item. A failed request
+        fails every item of its batch.
+        """
+        if action not in ('create', 'update'):
+            raise GlpiInvalidArgument('Unknown write action: %s' % action)
+        if not self.api_has_session():
+            self.init_api()
+
+        self.update_uri(item_name)
+        uri = self.item_uri
+        write = getattr(self.api_rest, '%s_many' % action)
+
+        def send(batch):
+            try:
+                return batch, write(batch, uri)
+            except Exception as e:
+                return batch, [{"id": None, "ok": False,
+                                "message": '%s' % e} for _ in batch]
+
+        for batch, results in _bounded_imap(send, batches, workers):
+            self.notify_write(item_name, action,
+                              _written(batch, results, action))
+            yield batch, results
+
+    def create_many(self, item_name, items, batch_size=100, workers=4):
+        """
+        Create items in batches of batch_size with concurrent requests.
+        Returns one result dict per item, in order.
+        """
+        results = []
+        for _, batch_results in self.iter_write(
+                item_name, _chunks(items, batch_size), 'create', workers):
+            results.extend(batch_results)
+        return results
+
+    def update_many(self, item_name, items, batch_size=100, workers=4):
+        """
+        Update items (dicts with their 'id' or GlpiItem) in batches of
+        batch_size with concurrent requests. GlpiItem send only their
+        changes and are skipped without changes.
+        Returns one result dict per item, in order.
+        """
+        items = list(items)
+        results = [None] * len(items)
+        indexes, inputs = [], []
+        for i, item in enumerate(items):
+            update_input = _update_input(item)
+            if update_input is None:
+                results[i] = {"id": item.get_attribute('id'), "ok": True,
+                              "message": "No changes to update"}
+            else:
+                indexes.append(i)
+                inputs.append(update_input)
+
+        sent = []
+        for _, batch_results in self.iter_write(
+                item_name, _chunks(inputs, batch_size), 'update', workers):
+            sent.extend(batch_results)
+        for i, result in zip(indexes, sent):
+            results[i] = result
+            if result['ok'] and isinstance(items[i], GlpiItem):
+                items[i].mark_clean()
+        return results
+
+    def find_by_key(self, item_name, key, values, chunk_size=50):
+        """
+        Return {key values tuple: [items]} for items of item_name whose key
+        fields (a tuple of field names) match one of values (a list of
+        tuples). Candidates are searched by the first key field, chunk_size
+        values per query, then matched on the whole key. Key values are
+        compared as strings.
+        """
+        option = self.get_field_schema(item_name)[key[0]]
+        wanted = set(tuple('%s' % v for v in value) for value in values)
+
+        found = {}
+        first_values = sorted(set(value[0] for value in wanted))
+        for chunk in _chunks(first_values, chunk_size):
+            criteria = [_key_criterion(option, v, 'OR') for v in chunk]
+            ids = [int(row['2']) for row in self.iter_all(
+                item_name, {"criteria": criteria, "forcedisplay": [2]})]
+            for item in self.get_multiple(item_name, ids):
+                item_key = tuple('%s' % item.get(k) for k in key)
+                if item_key in wanted:
+                    found.setdefault(item_key, []).append(item)
+        return found
+
+    def upsert_many(self, item_name, items, key=('serial',), batch_size=100,
+                    workers=4):
+        """
+        Create the items of item_name that do not exist yet and update the
+        others, matching existing items by the natural key fields.
+        Existing items are resolved per batch_size items with a few search
+        queries, items whose fields did not change are skipped and the rest
+        is sent with create_many()/update_many(). Items repeating a key of
+        a new item are merged into one creation.
+
+        Returns one result per item, in order:
+        {"action": "created", "updated", "unchanged" or "error", "id": ..,
+         "ok": .., "message": ..}
+        """
+        if not isinstance(key, (tuple, list)):
+            key = (key,)
+        schema = self.get_field_schema(item_name)
+        for k in key:
+            if k not in schema:
+                raise GlpiInvalidArgument('Unknown key field %s of %s' %
+                                          (k, item_name))
+
+        results = []
+        for chunk in _chunks(items, batch_size):
+            results.extend(self._upsert_chunk(item_name, chunk, tuple(key),
+                                              batch_size, workers))
+        return results
+
+    def _upsert_chunk(self, item_name, chunk, key, batch_size, workers):
+        results = [None] * len(chunk)
+        indexes_by_key = {}
+        for i, item in enumerate(chunk):
+            if any(item.get(k) in (None, '') for k in key):
+                results[i] = {"action": "error", "id": None, "ok": False,
+                              "message": "missing key field"}
+                continue
+            item_key = tuple('%s' % item[k] for k in key)
+            indexes_by_key.setdefault(item_key, []).append(i)
+
+        existing = {}
+        if indexes_by_key:
+            existing = self.find_by_key(item_name, key, list(indexes_by_key))
+
+        creates, create_indexes = [], []
+        updates, update_indexes = [], []
+        for item_key, indexes in indexes_by_key.items():
+            matches = existing.get(item_key, [])
+            if len(matches) > 1:
+                for i in indexes:
+                    results[i] = {"action": "error", "id": None, "ok": False,
+                                  "message": "%d items match key %s" %
+                                  (len(matches), item_key)}
+            elif not matches:
+                data = {}
+                for i in indexes:
+                    data.update(chunk[i])
+                data.pop('id', None)
+                creates.append(data)
+                create_indexes.append(indexes)
+            else:
+                current = matches[0]
+                for i in indexes:
+                    changes = dict(
+                        (f, v) for f, v in chunk[i].items()
+                        if f != 'id' and '%s' % current.get(f) != '%s' % v)
+                    if not changes:
+                        results[i] = {"action": "unchanged",
+                                      "id": current['id'], "ok": True,
+                                      "message": ""}
+                        continue
+                    changes['id'] = current['id']
+                    updates.append(changes)
+                    update_indexes.append(i)
+
+        if creates:
+            created = self.create_many(item_name, creates, batch_size,
+                                       workers)
+            for indexes, result in zip(create_indexes, created):
+                for i in indexes:
+                    results[i] = dict(result, action="created")
+        if updates:
+            updated = self.update_many(item_name, updates, batch_size,
+                                       workers)
+            for i, result in zip(update_indexes, updated):
+                results[i] = dict(result, action="updated")
+        return results
+
     # [D]ELETE an Item
     def delete(self, item_name, item_id, force_purge=False):
         """ Delete an Resource Item. Should have all the Item payload """
@@ -728,7 +2316,85 @@ class GLPI(object):
                 self.init_api()
 
             self.update_uri(item_name)
-            return self.api_rest.delete(item_id, force_purge=force_purge)
+            result = self.api_rest.delete(item_id, force_purge=force_purge)
+            if isinstance(result, list) and not _is_glpi_error(result) and \
+                    _item_results(result, 1)[0]['ok']:
+                self.notify_write(item_name, 'delete', [{"id": item_id}])
+            return result
 
         except GlpiException as e:
             return {'{}'.format(e)}
+
+    # Massive actions
+    def massive_actions(self, item_name, item_id=None, is_deleted=False):
+        """
+        Return the massive actions available on item_name (or on one of
+        its items): [{"key": "MassiveAction:update", "label": ..}]
+        """
+        if not self.api_has_session():
+            self.init_api()
+        return self.api_rest.get_massive_actions(
+            self.get_itemtype(item_name), item_id, is_deleted)
+
+    def massive_action_parameters(self, item_name, action_key,
+                                  is_deleted=False):
+        """ Return the input fields expected by action_key. """
+        if not self.api_has_session():
+            self.init_api()
+        return self.api_rest.get_massive_action_parameters(
+            self.get_itemtype(item_name), action_key, is_deleted)
+
+    def _massive_written(self, item_name, action_key, ids, input, result):
+        """ Tell the write listeners about the items of an applied chunk. """
+        if not result.get('ok'):
+            return
+        every = not result.get('ko') and not result.get('noright')
+        action = action_key.split(':')[-1]
+        if action in ('delete', 'purge') and every:
+            self.notify_write(item_name, 'delete',
+                              [{"id": item_id} for item_id in ids])
+        elif action == 'update' and every and input.get('field') in input:
+            field = input['field']
+            self.notify_write(item_name, 'update',
+                              [{"id": item_id, field: input[field]}
+                               for item_id in ids])
+        else:
+            # Unknown changes or unknown items: listeners drop them.
+            self.notify_write(item_name, 'massive',
+                              [{"id": item_id} for item_id in ids])
+
+    def apply_massive_action(self, item_name, action_key, ids, input=None,
+                             chunk_size=500, workers=1):
+        """
+        Apply the massive action action_key (see massive_actions()) to the
+        items ids of item_name, chunk_size ids per request and up to
+        workers requests at a time. I.E:
+            apply_massive_action('Ticket', 'MassiveAction:update', ids,
+                                 {"id_field": 12, "field": "status",
+                                  "status": 5})
+        Returns the aggregated {"ok": .., "ko": .., "noright": ..,
+        "messages": [..]}, a failed request counting its ids as ko.
+        """
+        if not self.api_has_session():
+            self.init_api()
+        itemtype = self.get_itemtype(item_name)
+        input = dict(input or {})
+
+        def send(chunk):
+            try:
+                return chunk, self.api_rest.apply_massive_action(
+                    itemtype, action_key, chunk, input)
+            except Exception as e:
+                return chunk, {"ok": 0, "ko": len(chunk), "noright": 0,
+                               "messages": ['%s' % e]}
+
+        total = {"ok": 0, "ko": 0, "noright": 0, "messages": []}
+        for chunk, result in _bounded_imap(send, _chunks(ids, chunk_size),
+                                           workers):
+            for counter in ('ok', 'ko', 'noright'):
+                total[counter] += int(result.get(counter) or 0)
+            messages = result.get('messages') or []
+            total['messages'].extend(messages if isinstance(messages, list)
+                                     else [messages])
+            self._massive_written(itemtype, action_key, chunk, input, result)
+        return total
@@ -14,11 +14,77 @@
 
 
 class GlpiItem(object):
-    """ Polymorphic class of GLPI Item object. """
+    """
+    Polymorphic class of GLPI Item object.
 
-    def __init__(self, data={}):
-        self.data = data
-        self.null_str = "<DEFAULT_NULL>"
+    Items are slotted and keep only the attributes that differ from the
+    class level 'defaults' (shared by every item of the class, read-only);
+    the complete dict is built on first get_data() access.
+    Attributes changed through set_attribute()/set_attributes() since the
+    item was loaded (or marked clean) are tracked, so updates can send only
+    the changes. New items have all their attributes changed.
+    """
+    __slots__ = ('_values', '_full', '_dirty')
+
+    null_str = "<DEFAULT_NULL>"
+    defaults = {}
+
+    def __init__(self, data=None):
+        self._values = data if data is not None else {}
+        self._full = False
+        self._dirty = None
+
+    @classmethod
+    def from_data(cls, data, copy=True):
+        """
+        Return an item of this class loaded with data, without changes.
+        Use copy=False to keep data itself, I.E: for large result sets.
+        """
+        item = cls.__new__(cls)
+        item._values = dict(data) if copy else data
+        item._full = True
+        item._dirty = set()
+        return item
+
+    def load(self, data):
+        """ Replace attributes with a copy of data and mark them clean. """
+        self._values = dict(data)
+        self._full = True
+        self.mark_clean()
+        return self
+
+    @property
+    def data(self):
+        """ Complete dict of attributes, defaults included. """
+        if not self._full:
+            values = dict(self.defaults)
+            values.update(self._values)
+            self._values = values
+            self._full = True
+        return self._values
+
+    @data.setter
+    def data(self, value):
+        self._values = value
+        self._full = True
+
+    def items(self):
+        """ Iterate (attribute, value) pairs without building a dict. """
+        values = self._values
+        if self._full:
+            for k, v in values.items():
+                yield k, v
+            return
+        defaults = self.defaults
+        for k, v in defaults.items():
+            yield k, values[k] if k in values else v
+        for k, v in values.items():
+            if k not in defaults:
+                yield k, v
+
+    def to_dict(self):
+        """ Returns a new dict with all attributes. """
+        return dict(self.items())
 
     def get_data(self):
         """ Returns entire attributes of Item data. """
@@ -30,12 +96,22 @@ class GlpiItem(object):
 
     def get_attribute(self, attr):
         """ Returns an specific attribute. """
-        if attr in self.data:
-            return self.data[attr]
+        if attr in self._values:
+            return self._values[attr]
+        if not self._full and attr in self.defaults:
+            return self.defaults[attr]
+
+    def has_attribute(self, attr):
+        return attr in self._values or \
+            (not self._full and attr in self.defaults)
 
     def set_attribute(self, attr, value):
         """ Define the 'value' to an key. """
-        self.data[attr] = value
+        if self.has_attribute(attr) and self.get_attribute(attr) == value:
+            return
+        self._values[attr] = value
+        if self._dirty is not None:
+            self._dirty.add(attr)
 
     def set_attributes(self, attributes={}):
         """ Define attributes to override defaults.  """
@@ -43,28 +119,59 @@ class GlpiItem(object):
             return self.data
 
         for k in attributes:
-            if k in self.data.keys():
-                self.data[k] = attributes[k]
-            else:
-                self.data.update({k: attributes[k]})
+            self.set_attribute(k, attributes[k])
 
     def unset_attributes(self):
         """ Clean all attributes. """
-        self.data = {}
-        return self.data
+        self._values = {}
+        self._full = True
+        if self._dirty is not None:
+            self._dirty = set()
+        return self._values
+
+    def get_changes(self):
+        """
+        Returns attributes changed since load, null values as None.
+        Changes made directly in get_data() dict are not tracked.
+        """
+        null_str = self.null_str
+        if self._dirty is None:
+            return dict((k, None if v == null_str else v)
+                        for k, v in self.items())
+        changes = {}
+        for k in self._dirty:
+            if self.has_attribute(k):
+                value = self.get_attribute(k)
+                changes[k] = None if value == null_str else value
+        return changes
+
+    def has_changes(self):
+        """ Returns True when some attribute changed since load. """
+        return self._dirty is None or len(self._dirty) > 0
+
+    def mark_clean(self):
+        """ Forget changes, I.E: after they were saved. """
+        self._dirty = set()
 
     def get_stream(self):
         """ Get stream of data with format acceptable in GLPI API.  """
-        input_data = ""
-        for k in self.data:
-            if input_data is not "":
-                input_data = "%s," % input_data
-
-            if self.data[k] == self.null_str:
-                input_data = '%s "%s": null' % (input_data, k)
-            elif isinstance(self.data[k], str):
-                input_data = '%s "%s": "%s"' % (input_data, k, self.data[k])
+        null_str = self.null_str
+        parts = []
+        for k, v in self.items():
+            if v == null_str:
+                parts.append(' "%s": null' % k)
+            elif isinstance(v, str):
+                parts.append(' "%s": "%s"' % (k, v))
             else:
-                input_data = '%s "%s": %s' % (input_data, k, str(self.data[k]))
+                parts.append(' "%s": %s' % (k, str(v)))
+
+        return ','.join(parts)
+
 
-        return input_data
+def make_item_class(itemtype, defaults=None, base=GlpiItem):
+    """
+    Return a slotted GlpiItem subclass named itemtype whose items share
+    defaults.
+    """
+    return type(itemtype, (base,), {"__slots__": (),
+                                    "defaults": dict(defaults or {})})
@@ -0,0 +1,321 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Bulk import of CSV or NDJSON files: rows are streamed, validated against
+# the item search options, sent as batched array inputs and rejected rows
+# are written with their reason to a reject file.
+#   $ glpi-import Computer computers.csv --rejects rejects.ndjson
+
+from __future__ import print_function
+import io
+import os
+import sys
+import csv
+import json
+import argparse
+from datetime import datetime
+
+from .glpi import GLPI, GlpiInvalidArgument, _bounded_imap, _written
+from .export import load_checkpoint, save_checkpoint
+
+NUMBER_TYPES = ('number', 'integer', 'count', 'dropdown')
+DATE_FORMATS = {
+    'datetime': ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'),
+    'date': ('%Y-%m-%d',),
+}
+
+
+class RowValidator(object):
+    """
+    Validate and convert rows with a field schema (see
+    GLPI.get_field_schema()). unknown_fields is 'reject', 'drop' or 'keep'.
+    """
+
+    def __init__(self, schema, unknown_fields='reject'):
+        if unknown_fields not in ('reject', 'drop', 'keep'):
+            raise GlpiInvalidArgument(
+                'unknown_fields must be reject, drop or keep')
+        self.schema = schema
+        self.unknown_fields = unknown_fields
+
+    def convert(self, field, value):
+        """ Return value converted to the field datatype or raise. """
+        datatype = self.schema[field]['datatype']
+        if datatype == 'bool':
+            if '%s' % value in ('1', 'true', 'True', 'yes'):
+                return 1
+            if '%s' % value in ('0', 'false', 'False', 'no'):
+                return 0
+            raise ValueError('expected a boolean')
+        if datatype in NUMBER_TYPES:
+            return int(value)
+        if datatype == 'decimal':
+            return float(value)
+        if datatype in DATE_FORMATS:
+            for fmt in DATE_FORMATS[datatype]:
+                try:
+                    datetime.strptime(value, fmt)
+                    return value
+                except (TypeError, ValueError):
+                    pass
+            raise ValueError('expected a %s like %s' %
+                             (datatype, DATE_FORMATS[datatype][0]))
+        return value
+
+    def validate(self, row):
+        """ Return (clean_row, errors). Empty CSV values are left out. """
+        clean = {}
+        errors = []
+        for field, value in row.items():
+            if field is None or value is None or value == '':
+                continue
+            if field not in self.schema:
+                if self.unknown_fields == 'reject':
+                    errors.append('unknown field %s' % field)
+                elif self.unknown_fields == 'keep':
+                    clean[field] = value
+                continue
+            try:
+                clean[field] = self.convert(field, value)
+            except (TypeError, ValueError) as e:
+                errors.append('invalid %s %r: %s' % (field, value, e))
+        return clean, errors
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_rows(source, fmt=None):
+    """
+    Stream rows from source, a path or a text file object, as
+    (line number, row) tuples. Invalid NDJSON lines give a None row.
+    """
+    if not hasattr(source, 'read'):
+        fmt = fmt or guess_format(source)
+        if sys.version_info[0] > 2:
+            f = io.open(source, 'r', encoding='utf-8', newline='')
+        else:
+            f = open(source, 'rb')
+        with f:
+            for line in read_rows(f, fmt):
+                yield line
+        return
+
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(source), 1):
+            yield number, row
+        return
+
+    for number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def import_items(glpi, item_name, source, fmt=None, action='create',
+                 batch_size=100, workers=4, rejects=None, checkpoint=None,
+                 unknown_fields='reject', validate=True):
+    """
+    Import rows from source (a CSV/NDJSON path or file object) as item_name
+    items.
+
+    action is 'create', 'update' (rows need an 'id') or 'auto' (update rows
+    with an 'id', create the others). Rows are validated against the item
+    search options, sent in batches of batch_size as array inputs with up
+    to workers concurrent requests. Invalid and failed rows are written to
+    rejects (NDJSON with the line, row and reason). With a checkpoint path
+    an interrupted import started again resumes after the last row whose
+    result was recorded (rows in flight when the process died may be sent
+    twice).
+
+    Returns a dict counting 'rows', 'created', 'updated' and 'rejected'
+    rows and the 'resumed_from' line.
+    """
+    if batch_size < 1:
+        raise GlpiInvalidArgument('batch_size must be at least 1')
+    if action not in ('create', 'update', 'auto'):
+        raise GlpiInvalidArgument('Unknown import action: %s' % action)
+
+    validator = None
+    if validate:
+        validator = RowValidator(glpi.get_field_schema(item_name),
+                                 unknown_fields)
+
+    query = {"item_name": item_name, "action": action,
+             "source": source if not hasattr(source, 'read') else None}
+    state = load_checkpoint(checkpoint)
+    if state is None or state.get("query") != query:
+        state = {"query": query, "line": 0, "rows": 0, "created": 0,
+                 "updated": 0, "rejected": 0, "rejects_bytes": 0}
+    resumed_from = state["line"]
+
+    reject_file = None
+    if rejects is not None:
+        reject_file = open(rejects, 'ab' if resumed_from else 'wb')
+        reject_file.truncate(state["rejects_bytes"] if resumed_from else 0)
+
+    def reject(number, row, reason):
+        state["rejected"] += 1
+        if reject_file is not None:
+            line = json.dumps({"line": number, "row": row, "reason": reason})
+            reject_file.write((line + '\n').encode('utf-8'))
+
+    def save(number):
+        state["line"] = number
+        if checkpoint is None:
+            return
+        if reject_file is not None:
+            reject_file.flush()
+            os.fsync(reject_file.fileno())
+            state["rejects_bytes"] = reject_file.tell()
+        save_checkpoint(checkpoint, state)
+
+    def check(row):
+        """ Return (clean_row, error, action) of an input row. """
+        if row is None:
+            return None, 'invalid JSON line', None
+        clean, errors = validator.validate(row) if validator \
+            else (dict(row), [])
+        row_action = action
+        if action == 'auto':
+            row_action = 'update' if clean.get('id') else 'create'
+        if row_action == 'update' and not clean.get('id'):
+            errors.append('update needs an id')
+        if row_action == 'create':
+            clean.pop('id', None)
+        return clean, '; '.join(errors) or None, row_action
+
+    def units():
+        """
+        Yield (action, entries) units in input order, entries being
+        (line, row, clean_row, error) tuples with up to batch_size valid
+        rows of the same action. Invalid rows travel with the next unit so
+        every result is recorded in input order.
+        """
+        entries, count, unit_action = [], 0, None
+        for number, row in read_rows(source, fmt):
+            if number <= resumed_from:
+                continue
+            clean, error, row_action = check(row)
+            if error is None:
+                if unit_action not in (None, row_action):
+                    yield unit_action, entries
+                    entries, count = [], 0
+                unit_action = row_action
+                count += 1
+            entries.append((number, row, clean, error))
+            if count >= batch_size:
+                yield unit_action, entries
+                entries, count, unit_action = [], 0, None
+        if entries:
+            yield unit_action, entries
+
+    if not glpi.api_has_session():
+        glpi.init_api()
+    glpi.update_uri(item_name)
+    uri = glpi.item_uri
+
+    def send(unit):
+        unit_action, entries = unit
+        items = [clean for _, _, clean, error in entries if error is None]
+        if not items:
+            return unit, []
+        write = getattr(glpi.api_rest, '%s_many' % unit_action)
+        try:
+            results = write(items, uri)
+            glpi.notify_write(item_name, unit_action,
+                              _written(items, results, unit_action))
+            return unit, results
+        except Exception as e:
+            return unit, [{"id": None, "ok": False, "message": '%s' % e}
+                          for _ in items]
+
+    try:
+        for (unit_action, entries), results in _bounded_imap(
+                send, units(), workers):
+            results = iter(results)
+            for number, row, _, error in entries:
+                state["rows"] += 1
+                if error is not None:
+                    reject(number, row, error)
+                    continue
+                result = next(results)
+                if result["ok"]:
+                    state["%sd" % unit_action] += 1
+                else:
+                    reject(number, row, result["message"] or
+                           '%s failed' % unit_action)
+            save(entries[-1][0])
+    finally:
+        if reject_file is not None:
+            reject_file.close()
+
+    if checkpoint is not None and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return {"rows": state["rows"], "created": state["created"],
+            "updated": state["updated"], "rejected": state["rejected"],
+            "resumed_from": resumed_from}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bulk import a CSV or NDJSON file as GLPI items.")
+    parser.add_argument('item', help="Itemtype, I.E: Computer")
+    parser.add_argument('source', help="Input file (.csv or .ndjson)")
+    parser.add_argument('--url', default=os.getenv('GLPI_API_URL'))
+    parser.add_argument('--app-token', default=os.getenv('GLPI_APP_TOKEN'))
+    parser.add_argument('--user-token', default=os.getenv('GLPI_USER_TOKEN'))
+    parser.add_argument('--username', default=os.getenv('GLPI_USERNAME'))
+    parser.add_argument('--password', default=os.getenv('GLPI_PASSWORD'))
+    parser.add_argument('--format', choices=('csv', 'ndjson'))
+    parser.add_argument('--action', choices=('create', 'update', 'auto'),
+                        default='create')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rejects', help="Reject file (NDJSON)")
+    parser.add_argument('--checkpoint',
+                        help="Checkpoint file, to resume an interrupted "
+                        "import")
+    parser.add_argument('--unknown-fields', default='reject',
+                        choices=('reject', 'drop', 'keep'))
+    parser.add_argument('--no-validate', action='store_true')
+    parser.add_argument('--no-verify', action='store_true',
+                        help="Do not verify SSL certificates")
+    args = parser.parse_args(argv)
+
+    if args.user_token:
+        auth = args.user_token
+    else:
+        auth = (args.username, args.password)
+    glpi = GLPI(args.url, args.app_token, auth,
+                sslverify=not args.no_verify)
+
+    result = import_items(glpi, args.item, args.source, fmt=args.format,
+                          action=args.action, batch_size=args.batch_size,
+                          workers=args.workers, rejects=args.rejects,
+                          checkpoint=args.checkpoint,
+                          unknown_fields=args.unknown_fields,
+                          validate=not args.no_validate)
+    print("%(rows)d rows: %(created)d created, %(updated)d updated, "
+          "%(rejected)d rejected" % result, file=sys.stderr)
+    return 1 if result["rejected"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
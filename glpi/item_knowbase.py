@@ -18,19 +18,19 @@ from .glpi_item import GlpiItem
 
 class KnowBase(GlpiItem):
     """ Object of KB """
+    __slots__ = ()
+
+    defaults = {
+        "knowbaseitemcategories_id": 0,
+        "users_id": 2,
+        "is_faq": 0,
+        "view": 1
+    }
 
     def __init__(self, attributes={}):
         """ Construct an KB Item. """
         GlpiItem.__init__(self, {})
-
-        defaults = {
-            "knowbaseitemcategories_id": 0,
-            "users_id": 2,
-            "is_faq": 0,
-            "view": 1
-        }
         self.set_attributes(attributes=attributes)
-        self.set_attributes(attributes=defaults)
 
 
 class GlpiKnowBase(GlpiService):
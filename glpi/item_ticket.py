@@ -18,56 +18,52 @@ from .glpi_item import GlpiItem
 
 class Ticket(GlpiItem):
     """ Object of Item Ticket """
+    __slots__ = ()
+
+    # Shared by every Ticket, only overridden attributes are stored per item.
+    # TODO: defaults could be loaded from an defaults file (JSON, CSV, ...)
+    defaults = {
+        "name": "<DEFAULT_VALUE>",
+        "content": "<DEFAULT_VALUE>",
+        "actiontime": 0,
+        "begin_waiting_date": GlpiItem.null_str,
+        "close_delay_stat": 0,
+        "closedate": GlpiItem.null_str,
+        "due_date": GlpiItem.null_str,
+        "entities_id": 0,
+        "global_validation": 1,
+        "impact": 3,
+        "itilcategories_id": 0,
+        "locations_id": 0,
+        "priority": 3,
+        "requesttypes_id": 1,
+        "sla_waiting_duration": 0,
+        "slts_tto_id": 0,
+        "slts_ttr_id": 0,
+        "solution": GlpiItem.null_str,
+        "solutiontypes_id": 0,
+        "solve_delay_stat": 0,
+        "solvedate": GlpiItem.null_str,
+        "status": 1,
+        "takeintoaccount_delay_stat": 0,
+        "time_to_own": GlpiItem.null_str,
+        "ttr_slalevels_id": 0,
+        "type": 1,
+        "urgency": 3,
+        "users_id_lastupdater": 2,
+        "users_id_recipient": 2,
+        "validation_percent": 0,
+        "waiting_duration": 0
+    }
 
     def __init__(self, name=None, content=None, attributes={}):
-        """
-        Construct an item Ticket.
-        TODO: data could be loaded from an defaults file (JSON, CSV, ...)
-        """
-        GlpiItem.__init__(self, {})
-
-        defaults = {
-            "name": "<DEFAULT_VALUE>",
-            "content": "<DEFAULT_VALUE>",
-            "actiontime": 0,
-            "begin_waiting_date": self.null_str,
-            "close_delay_stat": 0,
-            "closedate": self.null_str,
-            "due_date": self.null_str,
-            "entities_id": 0,
-            "global_validation": 1,
-            "impact": 3,
-            "itilcategories_id": 0,
-            "locations_id": 0,
-            "priority": 3,
-            "requesttypes_id": 1,
-            "sla_waiting_duration": 0,
-            "slts_tto_id": 0,
-            "slts_ttr_id": 0,
-            "solution": self.null_str,
-            "solutiontypes_id": 0,
-            "solve_delay_stat": 0,
-            "solvedate": self.null_str,
-            "status": 1,
-            "takeintoaccount_delay_stat": 0,
-            "time_to_own": self.null_str,
-            "ttr_slalevels_id": 0,
-            "type": 1,
-            "urgency": 3,
-            "users_id_lastupdater": 2,
-            "users_id_recipient": 2,
-            "validation_percent": 0,
-            "waiting_duration": 0
-        }
-        self.set_attributes(attributes=defaults)
-
+        """ Construct an item Ticket. """
         if name is None or content is None:
             raise GlpiInvalidArgument(
                 'Cannot open a ticket without Name and Content data')
-        else:
-            """ Define name and content, required to every new one ticket.  """
-            self.set_attribute('name', name)
-            self.set_attribute('content', content)
+
+        """ Define name and content, required to every new one ticket.  """
+        GlpiItem.__init__(self, {"name": name, "content": content})
 
         if attributes is not {}:
             self.set_attributes(attributes)
@@ -0,0 +1,273 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Local full-text index of Knowledge Base articles: an inverted index of
+# the words of name and answer ranked with BM25, synced incrementally from
+# GLPI and saved to disk.
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import heapq
+import threading
+import unicodedata
+
+from .dedup import DATE_FORMAT
+
+if sys.version_info[0] > 2:
+    from html import unescape
+else:
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
+_TAG = re.compile(r'<[^>]*>')
+_WORD = re.compile(r'\w+', re.UNICODE)
+_COMBINING = re.compile(u'[\u0300-\u036f]')
+
+FORMAT_VERSION = 2
+
+
+def tokenize(text):
+    """
+    Words of text, HTML (escaped or not) stripped, lower case and without
+    accents.
+    """
+    if not text:
+        return []
+    text = unescape(_TAG.sub(' ', unescape('%s' % text))).lower()
+    try:
+        text.encode('ascii')
+    except UnicodeError:
+        text = _COMBINING.sub('', unicodedata.normalize('NFKD', text))
+    return _WORD.findall(text)
+
+
+class KnowBaseIndex(object):
+    """
+    Full-text index of the KB articles (item_name) of glpi, searched
+    locally with BM25 ranking (k1, b). name words weigh name_weight times
+    the answer words.
+
+    sync() reads the articles modified since the previous sync, writes of
+    the glpi client are picked up by the next sync() (deletes at once).
+    With path, the index is loaded from it when it exists and saved after
+    each sync().
+    """
+
+    def __init__(self, glpi, path=None, item_name='KnowbaseItem', k1=1.2,
+                 b=0.75, name_weight=2, page_size=500):
+        self.glpi = glpi
+        self.path = path
+        self.item_name = item_name
+        self.itemtype = glpi.get_itemtype(item_name)
+        self.k1 = k1
+        self.b = b
+        self.name_weight = name_weight
+        self.page_size = page_size
+
+        self.postings = {}  # term -> {article id: term frequency}
+        # article id -> [name, date_mod, length, terms, time read]
+        self.docs = {}
+        self.first_seen = {}  # date_mod -> time first seen
+        self.total_length = 0
+        self.watermark = None
+        self.stale = set()
+        self.lock = threading.RLock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+        glpi.add_write_listener(self._on_write)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def close(self):
+        """ Stop following the writes of the client. """
+        self.glpi.remove_write_listener(self._on_write)
+
+    # Index maintenance
+    def _terms(self, item):
+        terms = {}
+        for term in tokenize(item.get('name')):
+            terms[term] = terms.get(term, 0) + self.name_weight
+        for term in tokenize(item.get('answer')):
+            terms[term] = terms.get(term, 0) + 1
+        return terms
+
+    def _remove(self, article_id):
+        doc = self.docs.pop(article_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc[2]
+        for term in doc[3]:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(article_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def add(self, item):
+        """ Index or index again item, a dict with id, name and answer. """
+        article_id = int(item['id'])
+        terms = self._terms(item)
+        length = sum(terms.values())
+        with self.lock:
+            self._remove(article_id)
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[article_id] = frequency
+            self.docs[article_id] = [item.get('name'), item.get('date_mod'),
+                                     length, terms, time.time()]
+            self.total_length += length
+            self.stale.discard(article_id)
+
+    def remove(self, article_id):
+        with self.lock:
+            self._remove(int(article_id))
+
+    def _on_write(self, itemtype, action, items):
+        if itemtype.lower() != self.itemtype.lower():
+            return
+        with self.lock:
+            for item in items:
+                if action == 'delete':
+                    self._remove(int(item['id']))
+                else:
+                    self.stale.add(int(item['id']))
+
+    def sync(self, full=False):
+        """
+        Index the articles modified since the last sync (every article the
+        first time) and the ones written by the client since. With full,
+        articles deleted on the server are removed too. Returns the number
+        of articles read.
+        """
+        schema = self.glpi.get_field_schema(self.item_name)
+        date_field = schema.get('date_mod', {}).get('id', 19)
+        criteria = {"criteria": [], "forcedisplay": [2, date_field]}
+        if self.watermark is not None and not full:
+            # One second back: GLPI dates have no sub-second precision.
+            since = time.mktime(time.strptime(self.watermark,
+                                              DATE_FORMAT)) - 1
+            criteria['criteria'] = [{
+                "field": date_field, "searchtype": "morethan",
+                "value": time.strftime(DATE_FORMAT, time.localtime(since)),
+                "link": "AND"}]
+
+        # Articles of the last second are read again until one read
+        # happened after their second was over.
+        now = time.time()
+        seen, changed = set(), set()
+        watermark = self.watermark
+        for _, rows in self.glpi.get_pages(self.item_name, criteria,
+                                           self.page_size):
+            for row in rows:
+                article_id = int(row['2'])
+                date = row.get('%d' % date_field)
+                seen.add(article_id)
+                doc = self.docs.get(article_id)
+                first_seen = self.first_seen.setdefault(date, now)
+                if doc is None or doc[1] != date or \
+                        doc[4] < first_seen + 1:
+                    changed.add(article_id)
+                if date and (watermark is None or date > watermark):
+                    watermark = date
+        with self.lock:
+            changed |= self.stale
+            if full:
+                for article_id in set(self.docs) - seen:
+                    self._remove(article_id)
+
+        count = 0
+        for item in self.glpi.get_multiple(
+                self.item_name, sorted(changed), fresh=True,
+                fields=['name', 'answer', 'date_mod']):
+            if isinstance(item, dict) and 'id' in item:
+                self.add(item)
+                count += 1
+        with self.lock:
+            for article_id in changed - set(self.docs):
+                self.stale.discard(article_id)
+            self.watermark = watermark
+            for date in [d for d in self.first_seen
+                         if not d or d < watermark]:
+                del self.first_seen[date]
+        if self.path is not None:
+            self.save(self.path)
+        return count
+
+    # Search
+    def search(self, query, limit=10):
+        """
+        Return the limit best articles for query, best first:
+        [{"id": .., "name": .., "score": ..}]
+        """
+        terms = set(tokenize(query))
+        with self.lock:
+            count = len(self.docs)
+            if not count or not terms:
+                return []
+            average = float(self.total_length) / count
+            scores = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) /
+                               (len(postings) + 0.5))
+                for article_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b *
+                                      self.docs[article_id][2] / average)
+                    scores[article_id] = scores.get(article_id, 0) + \
+                        idf * frequency * (self.k1 + 1) / (frequency + norm)
+            best = heapq.nlargest(limit, scores.items(),
+                                  key=lambda entry: (entry[1], -entry[0]))
+            return [{"id": article_id, "name": self.docs[article_id][0],
+                     "score": score} for article_id, score in best]
+
+    # Persistence
+    def save(self, path):
+        """ Write the index to path (atomically). """
+        with self.lock:
+            state = {"version": FORMAT_VERSION, "watermark": self.watermark,
+                     "itemtype": self.itemtype,
+                     "docs": [[article_id] + doc
+                              for article_id, doc in self.docs.items()],
+                     "stale": sorted(self.stale)}
+        temporary = '%s.tmp' % path
+        with open(temporary, 'w') as output:
+            json.dump(state, output, separators=(',', ':'))
+        if hasattr(os, 'replace'):
+            os.replace(temporary, path)
+        else:
+            os.rename(temporary, path)
+
+    def load(self, path):
+        """ Read an index written by save(), the postings are rebuilt. """
+        with open(path) as source:
+            state = json.load(source)
+        if state.get('version') != FORMAT_VERSION:
+            return
+        with self.lock:
+            self.postings, self.docs, self.total_length = {}, {}, 0
+            for article_id, name, date, length, terms, read in \
+                    state['docs']:
+                self.docs[article_id] = [name, date, length, terms, read]
+                self.total_length += length
+                for term, frequency in terms.items():
+                    self.postings.setdefault(term, {})[article_id] = \
+                        frequency
+            self.watermark = state.get('watermark')
+            self.stale = set(state.get('stale', []))
@@ -0,0 +1,271 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# End-to-end load generator: drives N concurrent SDK clients against a GLPI
+# server (by default a local stub_server) and reports throughput and
+# latency percentiles per operation.
+#   $ python -m glpi.loadgen --clients 8 --duration 10
+
+from __future__ import print_function
+import sys
+import random
+import argparse
+import threading
+from timeit import default_timer
+
+from .glpi import GLPI
+from .stub_server import StubGlpi, StubServer
+
+DEFAULT_MIX = {
+    "get": 50,
+    "search": 20,
+    "get_all": 5,
+    "create": 15,
+    "update": 10,
+}
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of sorted values. """
+    if not values:
+        return 0.0
+    rank = int(round(p / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+def _is_error(result):
+    """ GLPI answers errors as ['ERROR_CODE', 'message'] or SDK sets. """
+    if isinstance(result, set):
+        return True
+    if isinstance(result, list) and result and \
+            isinstance(result[0], str) and result[0].startswith('ERROR'):
+        return True
+    return False
+
+
+class LoadClient(object):
+    """ One SDK client running operations against item_name. """
+
+    def __init__(self, url, app_token, auth_token, item_name, id_range,
+                 sslverify=True, seed=None):
+        self.glpi = GLPI(url, app_token, auth_token, sslverify=sslverify)
+        self.item_name = item_name
+        self.id_range = id_range
+        self.random = random.Random(seed)
+        self.created = []
+
+    def _random_id(self):
+        if self.created and self.random.random() < 0.5:
+            return self.random.choice(self.created)
+        return self.random.randint(*self.id_range)
+
+    def op_get(self):
+        return self.glpi.get(self.item_name, self._random_id())
+
+    def op_get_all(self):
+        return self.glpi.get_all(self.item_name)
+
+    def op_search(self):
+        criteria = {"criteria": [{"field": "name",
+                                  "value": "%d" % self._random_id(),
+                                  "searchtype": "contains",
+                                  "link": "AND"}]}
+        return self.glpi.search_engine(self.item_name, criteria)
+
+    def op_create(self):
+        result = self.glpi.create(self.item_name, {
+            "name": "loadgen %d" % self.random.randint(0, 1 << 30),
+            "content": "Created by glpi.loadgen"})
+        if isinstance(result, dict) and 'id' in result:
+            self.created.append(result['id'])
+        return result
+
+    def op_update(self):
+        return self.glpi.update(self.item_name, {
+            "id": self._random_id(),
+            "name": "loadgen update %d" % self.random.randint(0, 1 << 30)})
+
+    def run(self, operation):
+        return getattr(self, 'op_%s' % operation)()
+
+
+class LoadReport(object):
+    """ Latencies (seconds) and errors collected per operation. """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, operation, latency, error):
+        with self.lock:
+            self.latencies.setdefault(operation, []).append(latency)
+            self.errors.setdefault(operation, 0)
+            if error:
+                self.errors[operation] += 1
+
+    def summary(self):
+        """ Return {operation: {count, errors, rps, p50, p95, p99}}. """
+        result = {}
+        total = 0
+        for operation, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            total += len(latencies)
+            result[operation] = {
+                "count": len(latencies),
+                "errors": self.errors.get(operation, 0),
+                "rps": len(latencies) / self.elapsed if self.elapsed else 0,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+            }
+        result["total"] = {
+            "count": total,
+            "errors": sum(self.errors.values()),
+            "rps": total / self.elapsed if self.elapsed else 0,
+        }
+        return result
+
+    def format(self):
+        lines = ["%-10s %8s %7s %10s %9s %9s %9s" % (
+            "operation", "count", "errors", "req/s", "p50 ms", "p95 ms",
+            "p99 ms")]
+        summary = self.summary()
+        for operation, s in sorted(summary.items()):
+            if operation == "total":
+                continue
+            lines.append("%-10s %8d %7d %10.1f %9.2f %9.2f %9.2f" % (
+                operation, s["count"], s["errors"], s["rps"],
+                s["p50"] * 1000, s["p95"] * 1000, s["p99"] * 1000))
+        s = summary["total"]
+        lines.append("%-10s %8d %7d %10.1f   (%.2f s)" % (
+            "total", s["count"], s["errors"], s["rps"], self.elapsed))
+        return "\n".join(lines)
+
+
+def run_load(url, app_token, auth_token, clients=4, duration=None,
+             requests_per_client=100, item_name='Ticket', id_range=(1, 100),
+             mix=None, sslverify=True, seed=None):
+    """
+    Run clients concurrent SDK clients, each one performing a random mix of
+    operations (weights by name, see DEFAULT_MIX) for duration seconds or
+    requests_per_client operations. Returns a LoadReport.
+    """
+    mix = mix or DEFAULT_MIX
+    operations = list(mix)
+    weights = [mix[o] for o in operations]
+    report = LoadReport()
+    rng = random.Random(seed)
+
+    workers = [LoadClient(url, app_token, auth_token, item_name, id_range,
+                          sslverify=sslverify, seed=rng.random())
+               for _ in range(clients)]
+
+    def worker(client):
+        done = 0
+        deadline = default_timer() + duration if duration else None
+        while True:
+            if deadline is not None:
+                if default_timer() >= deadline:
+                    break
+            elif done >= requests_per_client:
+                break
+            operation = _weighted_choice(client.random, operations, weights)
+            start = default_timer()
+            try:
+                error = _is_error(client.run(operation))
+            except Exception:
+                error = True
+            report.add(operation, default_timer() - start, error)
+            done += 1
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in workers]
+    start = default_timer()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    report.elapsed = default_timer() - start
+    return report
+
+
+def _weighted_choice(rng, operations, weights):
+    point = rng.uniform(0, sum(weights))
+    for operation, weight in zip(operations, weights):
+        point -= weight
+        if point <= 0:
+            return operation
+    return operations[-1]
+
+
+def _parse_mix(value):
+    """ Parse 'get=50,create=10' into a mix dict. """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Drive concurrent SDK clients against a GLPI server "
+        "and report throughput and latency percentiles.")
+    parser.add_argument('--url', help="GLPI apirest.php URL. A local stub "
+                        "server is started when omitted")
+    parser.add_argument('--app-token', default='loadgen-app-token')
+    parser.add_argument('--user-token', default='loadgen-user-token')
+    parser.add_argument('--item', default='Ticket')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--duration', type=float,
+                        help="Run for this many seconds")
+    parser.add_argument('--requests', type=int, default=100,
+                        help="Operations per client when no duration")
+    parser.add_argument('--mix', type=_parse_mix,
+                        help="Operation weights, I.E: get=50,create=10")
+    parser.add_argument('--items', type=int, default=100,
+                        help="Items populated in the stub / id range used")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="Stub server latency, in seconds")
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help="Stub server error rate")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        stub = StubGlpi(latency=args.latency, error_rate=args.error_rate,
+                        seed=args.seed)
+        stub.populate(args.item, args.items)
+        server = StubServer(stub).start()
+        url = server.url
+
+    try:
+        report = run_load(url, args.app_token, args.user_token,
+                          clients=args.clients, duration=args.duration,
+                          requests_per_client=args.requests,
+                          item_name=args.item, id_range=(1, args.items),
+                          mix=args.mix, seed=args.seed)
+    finally:
+        if server is not None:
+            server.stop()
+
+    print(report.format())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
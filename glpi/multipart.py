@@ -0,0 +1,123 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Streaming multipart/form-data body: files are read from disk while the
+# request is sent instead of being loaded in memory.
+
+import os
+import uuid
+
+
+def _file_size(fileobj):
+    """ Bytes left to read in fileobj. """
+    try:
+        return os.fstat(fileobj.fileno()).st_size - fileobj.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        position = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell() - position
+        fileobj.seek(position)
+        return size
+
+
+def _quote(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class MultipartStream(object):
+    """
+    File-like multipart/form-data body with a known length, so requests
+    sends it with a Content-Length and reads it chunk by chunk.
+
+    fields are (name, value, content_type) tuples, files are
+    (name, filename, fileobj, content_type) tuples.
+    """
+
+    def __init__(self, fields=(), files=(), boundary=None,
+                 chunk_size=65536):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.parts = []
+        for name, value, content_type in fields:
+            if not isinstance(value, bytes):
+                value = value.encode('utf-8')
+            self.parts.append(self._header(name, None, content_type))
+            self.parts.append(value)
+            self.parts.append(b'\r\n')
+        for name, filename, fileobj, content_type in files:
+            self.parts.append(self._header(name, filename, content_type))
+            self.parts.append((fileobj, _file_size(fileobj)))
+            self.parts.append(b'\r\n')
+        self.parts.append(('--%s--\r\n' % self.boundary).encode('utf-8'))
+        self.length = sum(p[1] if isinstance(p, tuple) else len(p)
+                          for p in self.parts)
+        self.current = 0
+        self.left = None
+
+    def _header(self, name, filename, content_type):
+        disposition = 'form-data; name="%s"' % _quote(name)
+        if filename is not None:
+            disposition += '; filename="%s"' % _quote(filename)
+        header = '--%s\r\nContent-Disposition: %s\r\n' % (
+            self.boundary, disposition)
+        if content_type:
+            header += 'Content-Type: %s\r\n' % content_type
+        return (header + '\r\n').encode('utf-8')
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        """ Return up to size bytes (a chunk_size chunk when size < 0). """
+        if size is None or size < 0:
+            size = self.chunk_size
+        chunks = []
+        while size > 0 and self.current < len(self.parts):
+            part = self.parts[self.current]
+            if isinstance(part, tuple):
+                fileobj, length = part
+                if self.left is None:
+                    self.left = length
+                data = fileobj.read(min(size, self.left)) if self.left \
+                    else b''
+                if not data:
+                    if self.left:
+                        raise IOError('File shrank while being uploaded')
+                    self.current += 1
+                    self.left = None
+                    continue
+                self.left -= len(data)
+            else:
+                if self.left is None:
+                    self.left = len(part)
+                offset = len(part) - self.left
+                data = part[offset:offset + size]
+                self.left -= len(data)
+                if not self.left:
+                    self.current += 1
+                    self.left = None
+            chunks.append(data)
+            size -= len(data)
+        return b''.join(chunks)
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
@@ -0,0 +1,924 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Local stub of GLPI apirest.php, to test and load the SDK without a real
+# GLPI server. Only the subset of the API used by the SDK is implemented.
+# Run it standalone with:
+#   $ python -m glpi.stub_server --port 8080 --populate Ticket=1000
+
+from __future__ import print_function
+import re
+import sys
+import json
+import time
+import uuid
+import zlib
+import random
+import argparse
+import threading
+
+if sys.version_info[0] > 2:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qsl
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qsl
+
+
+DEFAULT_RANGE = (0, 49)
+
+# Search options (id -> field) known by the stub. GLPI defines them per
+# itemtype, the stub shares a generic map plus a few itemtype specific ones.
+SEARCH_OPTIONS = {
+    1: "name",
+    2: "id",
+    19: "date_mod",
+    80: "entities_id",
+    121: "date_creation",
+}
+ITEMTYPE_SEARCH_OPTIONS = {
+    "ticket": {
+        3: "priority",
+        7: "itilcategories_id",
+        10: "urgency",
+        11: "impact",
+        12: "status",
+        14: "type",
+        21: "content",
+    },
+    "computer": {
+        3: "locations_id",
+        4: "computertypes_id",
+        5: "serial",
+        23: "manufacturers_id",
+        31: "states_id",
+        40: "computermodels_id",
+    },
+    "knowbaseitem": {
+        6: "answer",
+        4: "knowbaseitemcategories_id",
+    },
+}
+
+# Foreign key fields (I.E: entities_id, users_id_recipient) linked by HATEOAS.
+FOREIGN_KEY = re.compile(r'^([a-z_]+?)(ies|s)_id(_[a-z_]+)?$')
+
+# with_* flags of getItem: flag -> (linked itemtype, itemtype it points to)
+WITH_FLAGS = {
+    "with_documents": ("Document_Item", "Document"),
+    "with_contracts": ("Contract_Item", "Contract"),
+    "with_notes": ("Notepad", None),
+    "with_logs": ("Log", None),
+    "with_infocoms": ("Infocom", None),
+    "with_networkports": ("NetworkPort", None),
+}
+
+
+def _now():
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _parse_php_query(query):
+    """
+    Parse a query string with PHP array syntax (criteria[0][field]=1,
+    forcedisplay[]=2) into nested dicts.
+    """
+    result = {}
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        parts = key.replace(']', '').split('[')
+        node = result
+        for i, part in enumerate(parts):
+            if not isinstance(node, dict):
+                break
+            if part == '':
+                part = str(len(node))
+            if i == len(parts) - 1:
+                node[part] = value
+            else:
+                node = node.setdefault(part, {})
+    return result
+
+
+def _parse_multipart(body, content_type):
+    """
+    Parse a multipart/form-data body into ({name: value},
+    {name: (filename, content)}).
+    """
+    boundary = content_type.split('boundary=', 1)[1].strip('"')
+    fields, files = {}, {}
+    for part in body.split(('--%s' % boundary).encode('utf-8'))[1:]:
+        if part.startswith(b'--'):
+            break
+        head, _, content = part.partition(b'\r\n\r\n')
+        if content.endswith(b'\r\n'):
+            content = content[:-2]
+        disposition = dict(
+            (k.strip(), v.strip('"')) for k, _, v in
+            (p.partition('=') for p in re.search(
+                r'Content-Disposition:([^\r\n]*)',
+                head.decode('utf-8'), re.I).group(1).split(';')))
+        if 'filename' in disposition:
+            files[disposition['name']] = (disposition['filename'], content)
+        else:
+            fields[disposition['name']] = content.decode('utf-8')
+    return fields, files
+
+
+def _as_list(value):
+    """ Return PHP-like arrays ({'0': a, '1': b}) as lists. """
+    if isinstance(value, dict):
+        keys = sorted(value, key=lambda k: int(k) if k.isdigit() else k)
+        return [value[k] for k in keys]
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _parse_range(value, default=DEFAULT_RANGE):
+    if not value:
+        return default
+    try:
+        start, end = value.split('-')
+        return int(start), int(end)
+    except ValueError:
+        return None
+
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _encode(content, accept_encoding):
+    """ Compress content with gzip or deflate when accept_encoding allows. """
+    accepted = [e.split(';')[0].strip().lower()
+                for e in (accept_encoding or '').split(',')]
+    if 'gzip' in accepted:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(content) + compressor.flush(), 'gzip'
+    if 'deflate' in accepted:
+        return zlib.compress(content, 6), 'deflate'
+    return content, None
+
+
+def _in_entities(rows, entities):
+    """ Rows of the active entities (every row when entities is None). """
+    if entities is None:
+        return rows
+    return [r for r in rows if int(r.get('entities_id') or 0) in entities]
+
+
+def _match(row_value, searchtype, value):
+    """ Evaluate a single GLPI search criterion against a value. """
+    if searchtype in ('equals', 'notequals'):
+        found = '%s' % row_value == '%s' % value
+        return found if searchtype == 'equals' else not found
+    if searchtype in ('lessthan', 'morethan'):
+        left, right = _to_number(row_value), _to_number(value)
+        if left is None or right is None:
+            left, right = '%s' % row_value, '%s' % value
+        return left < right if searchtype == 'lessthan' else left > right
+    # contains (default), with ^ and $ anchors
+    if value is None or value == '':
+        return True
+    if row_value is None:
+        return False
+    value, row_value = ('%s' % value).lower(), ('%s' % row_value).lower()
+    if len(value) > 1 and value.startswith('^') and value.endswith('$'):
+        return row_value == value[1:-1]
+    if value.startswith('^'):
+        return row_value.startswith(value[1:])
+    if value.endswith('$'):
+        return row_value.endswith(value[:-1])
+    return value in row_value
+
+
+# Massive actions of every itemtype.
+MASSIVE_ACTIONS = [
+    {"key": "MassiveAction:update", "label": "Update"},
+    {"key": "MassiveAction:delete", "label": "Put in trashbin"},
+    {"key": "MassiveAction:purge", "label": "Delete permanently"},
+]
+
+
+def _error(status, code, message=''):
+    return status, {}, [code, message]
+
+
+class StubGlpi(object):
+    """
+    In-memory implementation of a subset of GLPI apirest.php.
+
+    handle() takes a request and returns (status, headers, body), where body
+    is decoded JSON, so the stub can be served over HTTP (StubServer) or
+    called directly.
+    """
+
+    def __init__(self, app_token=None, user_token=None, latency=0,
+                 error_rate=0, error_status=500, seed=None):
+        """
+        app_token and user_token, when set, must match the ones sent by
+        clients. latency is a delay in seconds (or a (min, max) tuple) added
+        to every request and error_rate the fraction of requests answered
+        with error_status instead of being processed.
+        """
+        self.app_token = app_token
+        self.user_token = user_token
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+
+        self.sessions = set()
+        self.active_entities = {}  # session -> entity ids, None for all
+        self.items = {}
+        self.itemtypes = {}
+        self.next_ids = {}
+        self.search_options = {}
+        self.documents = {}
+        self.url_base_api = 'http://localhost/apirest.php'
+        self.request_count = 0
+        self.lock = threading.RLock()
+
+    """ Data setup """
+    def _store(self, itemtype):
+        key = itemtype.lower()
+        if key not in self.items:
+            self.items[key] = {}
+            self.itemtypes[key] = itemtype
+            self.next_ids[key] = 1
+        return self.items[key]
+
+    def add_item(self, itemtype, data):
+        """ Store a copy of data as a new item and return its id. """
+        with self.lock:
+            store = self._store(itemtype)
+            key = itemtype.lower()
+            row = dict(data)
+            if row.get('id'):
+                item_id = int(row['id'])
+            else:
+                item_id = self.next_ids[key]
+            self.next_ids[key] = max(self.next_ids[key], item_id + 1)
+            now = _now()
+            row['id'] = item_id
+            row.setdefault('name', '')
+            row.setdefault('entities_id', 0)
+            row.setdefault('date_creation', now)
+            row.setdefault('date_mod', now)
+            store[item_id] = row
+            return item_id
+
+    def populate(self, itemtype, count, **fields):
+        """ Add count generated items of itemtype. """
+        ids = []
+        for i in range(count):
+            data = {"name": "%s %d" % (itemtype, i + 1),
+                    "serial": "SN%08d" % (i + 1),
+                    "status": 1 + i % 6}
+            data.update(fields)
+            ids.append(self.add_item(itemtype, data))
+        return ids
+
+    def get_items(self, itemtype):
+        """ Return stored items of itemtype ordered by id. """
+        with self.lock:
+            store = self.items.get(itemtype.lower(), {})
+            return [store[k] for k in sorted(store)]
+
+    def get_search_options(self, itemtype):
+        """ Return the search option id -> field map of itemtype. """
+        key = itemtype.lower()
+        if key in self.search_options:
+            return self.search_options[key]
+        options = dict(SEARCH_OPTIONS)
+        options.update(ITEMTYPE_SEARCH_OPTIONS.get(key, {}))
+        return options
+
+    def set_search_options(self, itemtype, options):
+        self.search_options[itemtype.lower()] = options
+
+    """ Request handling """
+    def handle(self, method, path, query='', headers=None, body=None):
+        """
+        Handle an API call. path is relative to apirest.php
+        (I.E: '/Ticket/1'), query the raw query string and body the raw
+        request payload.
+        """
+        headers = dict((k.lower(), v) for k, v in (headers or {}).items())
+        params = _parse_php_query(query or '')
+        parts = [p for p in path.split('/') if p]
+        if parts and parts[0] == 'apirest.php':
+            parts = parts[1:]
+
+        with self.lock:
+            self.request_count += 1
+
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self.random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+        if not parts:
+            return _error(400, 'ERROR_BAD_ARRAY')
+
+        if parts[0] == 'initSession':
+            return self.init_session(headers, params)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            return _error(self.error_status, 'ERROR_INJECTED',
+                          'Error injected by the stub server')
+
+        if headers.get('session-token') not in self.sessions:
+            return _error(401, 'ERROR_SESSION_TOKEN_INVALID',
+                          'session_token seems invalid')
+
+        payload = None
+        if body and headers.get('content-type', '').startswith(
+                'multipart/form-data'):
+            try:
+                fields, files = _parse_multipart(body,
+                                                 headers['content-type'])
+                payload = json.loads(fields['uploadManifest'])
+                payload['_uploads'] = files
+            except (KeyError, ValueError, AttributeError):
+                return _error(400, 'ERROR_JSON_PAYLOAD_INVALID',
+                              'uploadManifest seems not valid')
+        elif body:
+            try:
+                if isinstance(body, bytes):
+                    body = body.decode('utf-8')
+                payload = json.loads(body)
+            except ValueError:
+                return _error(400, 'ERROR_JSON_PAYLOAD_INVALID',
+                              'JSON payload seems not valid')
+
+        try:
+            return self.route(method.upper(), parts, params, payload,
+                              headers)
+        except (KeyError, TypeError, ValueError) as e:
+            return _error(400, 'ERROR_BAD_ARRAY', '%s' % e)
+
+    def route(self, method, parts, params, payload, headers):
+        endpoint = parts[0]
+        session = headers.get('session-token')
+        if endpoint == 'killSession':
+            with self.lock:
+                self.sessions.discard(session)
+                self.active_entities.pop(session, None)
+            return 200, {}, []
+        if endpoint == 'getMyEntities':
+            return 200, {}, {"myentities": self.get_entities()}
+        if endpoint == 'changeActiveEntities' and method == 'POST':
+            return self.change_active_entities(session, payload or {})
+        if endpoint == 'search' and len(parts) == 2:
+            return self.search(parts[1], params,
+                               self.active_entities.get(session))
+        if endpoint == 'listSearchOptions' and len(parts) == 2:
+            return self.list_search_options(parts[1])
+        if endpoint == 'getMultipleItems':
+            return self.get_multiple_items(params)
+        if endpoint == 'getMassiveActions' and len(parts) in (2, 3):
+            return 200, {}, MASSIVE_ACTIONS
+        if endpoint == 'getMassiveActionParameters' and len(parts) == 3:
+            return self.massive_action_parameters(parts[1], parts[2])
+        if endpoint == 'applyMassiveAction' and len(parts) == 3 and \
+                method == 'POST':
+            return self.apply_massive_action(parts[1], parts[2],
+                                             payload or {})
+
+        itemtype = endpoint
+        item_id = int(parts[1]) if len(parts) > 1 else None
+
+        if len(parts) == 3 and method == 'GET':
+            return self.get_sub_items(itemtype, item_id, parts[2], params)
+        if method == 'GET' and item_id is None:
+            return self.get_all(itemtype, params,
+                                self.active_entities.get(session))
+        if method == 'GET':
+            if itemtype.lower() == 'document' and 'application/octet-stream' \
+                    in headers.get('accept', ''):
+                return self.get_document_file(item_id)
+            return self.get_item(itemtype, item_id, params)
+        if method == 'POST':
+            return self.create(itemtype, payload)
+        if method in ('PUT', 'PATCH'):
+            return self.update(itemtype, item_id, payload)
+        if method == 'DELETE':
+            return self.delete(itemtype, item_id, payload, params)
+        return _error(405, 'ERROR_METHOD_NOT_ALLOWED')
+
+    def init_session(self, headers, params):
+        if self.app_token is not None and \
+                headers.get('app-token') != self.app_token:
+            return _error(400, 'ERROR_WRONG_APP_TOKEN_PARAMETER',
+                          'missing parameter app_token')
+        authorization = headers.get('authorization', '')
+        if not authorization:
+            return _error(400, 'ERROR_LOGIN_PARAMETERS_MISSING',
+                          'parameter(s) login, password or user_token are '
+                          'missing')
+        if self.user_token is not None and \
+                authorization.startswith('user_token') and \
+                authorization.split(' ', 1)[-1] != self.user_token:
+            return _error(401, 'ERROR_GLPI_LOGIN_USER_TOKEN',
+                          'parameter user_token seems invalid')
+        session = uuid.uuid4().hex
+        with self.lock:
+            self.sessions.add(session)
+        return 200, {}, {"session_token": session}
+
+    def get_entities(self):
+        """ Root entity (0) and the Entity items, parent in entities_id. """
+        entities = [{"id": 0, "name": "Root entity", "entities_id": None}]
+        for row in self.get_items('Entity'):
+            entities.append({"id": row['id'], "name": row['name'],
+                             "entities_id": row.get('entities_id', 0)})
+        return entities
+
+    def change_active_entities(self, session, payload):
+        entity = payload.get('entities_id', 'all')
+        if entity == 'all':
+            active = None
+        else:
+            entities = self.get_entities()
+            active = set([int(entity)])
+            if payload.get('is_recursive') in (True, 'true', 1, '1'):
+                added = True
+                while added:
+                    children = set(e['id'] for e in entities
+                                   if e['entities_id'] in active)
+                    added = not children <= active
+                    active |= children
+            if int(entity) not in set(e['id'] for e in entities):
+                return _error(400, 'ERROR_ITEM_NOT_FOUND',
+                              'Entity not found')
+        with self.lock:
+            self.active_entities[session] = active
+        return 200, {}, True
+
+    def _page(self, rows, itemtype, params):
+        """ Apply range to rows, return (status, headers, page) or error. """
+        rng = _parse_range(params.get('range'))
+        if rng is None:
+            return _error(400, 'ERROR_RANGE_BAD_FORMAT')
+        start, end = rng
+        total = len(rows)
+        if total and start >= total:
+            return _error(400, 'ERROR_RANGE_EXCEED_TOTAL',
+                          'Provided range exceed total count of data: %d' %
+                          total)
+        page = rows[start:end + 1]
+        last = start + len(page) - 1 if page else start
+        headers = {
+            "Content-Range": "%d-%d/%d" % (start, last, total),
+            "Accept-Range": "%s %d" % (self.itemtypes.get(
+                itemtype.lower(), itemtype), 1000),
+        }
+        status = 206 if len(page) < total else 200
+        return status, headers, page
+
+    def get_all(self, itemtype, params, entities=None):
+        rows = _in_entities(self.get_items(itemtype), entities)
+        search_text = params.get('searchText') or {}
+        for field, value in search_text.items():
+            rows = [r for r in rows if _match(r.get(field), 'contains',
+                                              value)]
+        if params.get('sort'):
+            reverse = params.get('order', 'ASC').upper() == 'DESC'
+            sort = params['sort']
+            rows = sorted(rows, key=lambda r: (r.get(sort) is None,
+                                               r.get(sort)),
+                          reverse=reverse)
+        if params.get('only_id') in ('true', '1'):
+            rows = [{"id": r["id"]} for r in rows]
+        elif params.get('get_hateoas') not in ('false', '0'):
+            rows = [self.with_links(r) for r in rows]
+        return self._page(rows, itemtype, params)
+
+    def with_links(self, row):
+        """ Return a copy of row with the HATEOAS links of its foreign keys. """
+        links = []
+        for field in sorted(row):
+            match = FOREIGN_KEY.match(field)
+            if match is None or not isinstance(row[field], int):
+                continue
+            name = match.group(1) + ('y' if match.group(2) == 'ies' else '')
+            itemtype = self.itemtypes.get(name, name.capitalize())
+            links.append({"rel": itemtype, "href": "%s/%s/%d" % (
+                self.url_base_api, itemtype, row[field])})
+        row = dict(row)
+        row['links'] = links
+        return row
+
+    def get_item(self, itemtype, item_id, params=None):
+        with self.lock:
+            row = self.items.get(itemtype.lower(), {}).get(item_id)
+        if row is None:
+            return _error(404, 'ERROR_ITEM_NOT_FOUND',
+                          'Item not found')
+        row = dict(row)
+        for flag, (link_type, target) in sorted(WITH_FLAGS.items()):
+            if (params or {}).get(flag) not in ('true', '1'):
+                continue
+            rows = self.linked_items(itemtype, item_id, link_type)
+            if target is not None:
+                with self.lock:
+                    store = self.items.get(target.lower(), {})
+                    rows = [dict(store[r.get('%ss_id' % target.lower())])
+                            for r in rows
+                            if r.get('%ss_id' % target.lower()) in store]
+            row['_%s' % flag[5:]] = rows
+        if (params or {}).get('get_hateoas') not in ('false', '0'):
+            row = self.with_links(row)
+        return 200, {}, row
+
+    def linked_items(self, itemtype, item_id, sub_itemtype):
+        """ Items of sub_itemtype linked to itemtype/item_id. """
+        fk = '%ss_id' % itemtype.lower()
+        return [r for r in self.get_items(sub_itemtype)
+                if r.get(fk) == item_id or
+                (r.get('items_id') == item_id and
+                 '%s' % r.get('itemtype', '').lower() == itemtype.lower())]
+
+    def get_sub_items(self, itemtype, item_id, sub_itemtype, params):
+        return self._page(self.linked_items(itemtype, item_id,
+                                            sub_itemtype),
+                          sub_itemtype, params)
+
+    def get_multiple_items(self, params):
+        result = []
+        for wanted in _as_list(params.get('items')):
+            status, _, row = self.get_item(wanted['itemtype'],
+                                           int(wanted['items_id']), params)
+            if status == 200:
+                result.append(row)
+        return 200, {}, result
+
+    def create(self, itemtype, payload):
+        if not payload or 'input' not in payload:
+            return _error(400, 'ERROR_BAD_ARRAY',
+                          'input parameter must be an array of objects')
+        data = payload['input']
+        if '_uploads' in payload:
+            return self.upload_document(data, payload['_uploads'])
+        if isinstance(data, list):
+            result = [{"id": self.add_item(itemtype, d), "message": ""}
+                      for d in data]
+            return 207, {}, result
+        item_id = self.add_item(itemtype, data)
+        return 201, {"Location": "%s/%d" % (itemtype, item_id)}, \
+            {"id": item_id, "message": ""}
+
+    def _inputs(self, item_id, payload):
+        data = (payload or {}).get('input', {})
+        inputs = data if isinstance(data, list) else [data]
+        if item_id is not None and len(inputs) == 1:
+            inputs[0] = dict(inputs[0], id=item_id)
+        return inputs
+
+    def upload_document(self, data, uploads):
+        names = data.pop('_filename', None) or []
+        if not names or 'filename[0]' not in uploads:
+            return _error(400, 'ERROR_BAD_ARRAY', 'No file uploaded')
+        filename, content = uploads['filename[0]']
+        data = dict(data, filename=names[0], filesize=len(content))
+        itemtype = data.pop('itemtype', None)
+        items_id = data.pop('items_id', None)
+        document_id = self.add_item('Document', data)
+        with self.lock:
+            self.documents[document_id] = content
+        if itemtype and items_id:
+            self.add_item('Document_Item', {"documents_id": document_id,
+                                            "itemtype": itemtype,
+                                            "items_id": int(items_id)})
+        return 201, {"Location": "Document/%d" % document_id}, \
+            {"id": document_id, "message": "Document move succeeded.",
+             "upload_result": {"filename": [{"name": filename,
+                                             "size": len(content)}]}}
+
+    def get_document_file(self, document_id):
+        """ Raw file of a Document, answered as bytes. """
+        with self.lock:
+            content = self.documents.get(document_id)
+        if content is None:
+            return _error(404, 'ERROR_ITEM_NOT_FOUND', 'Item not found')
+        return 200, {"Content-Type": "application/octet-stream"}, content
+
+    def update(self, itemtype, item_id, payload):
+        if not payload or 'input' not in payload:
+            return _error(400, 'ERROR_BAD_ARRAY',
+                          'input parameter must be an array of objects')
+        result = []
+        with self.lock:
+            store = self._store(itemtype)
+            for data in self._inputs(item_id, payload):
+                row = store.get(int(data.get('id', 0)))
+                if row is None:
+                    result.append({"%s" % data.get('id'): False,
+                                   "message": "Item not found"})
+                    continue
+                row.update(data)
+                row['id'] = int(data['id'])
+                row['date_mod'] = _now()
+                result.append({"%d" % row['id']: True, "message": ""})
+        return 200, {}, result
+
+    def delete(self, itemtype, item_id, payload, params):
+        if item_id is not None:
+            inputs = [{"id": item_id}]
+        else:
+            inputs = self._inputs(None, payload)
+        result = []
+        with self.lock:
+            store = self._store(itemtype)
+            for data in inputs:
+                deleted = store.pop(int(data.get('id', 0)), None)
+                result.append({"%s" % data.get('id'): deleted is not None,
+                               "message": "" if deleted is not None
+                               else "Item not found"})
+        return 200, {}, result
+
+    def massive_action_parameters(self, itemtype, action_key):
+        if action_key not in [a['key'] for a in MASSIVE_ACTIONS]:
+            return _error(400, 'ERROR_MASSIVEACTION_KEY',
+                          'Wrong massive action key')
+        if action_key == 'MassiveAction:update':
+            return 200, {}, [{"name": "id_field", "type": "dropdown"},
+                             {"name": "field", "type": "hidden"}]
+        return 200, {}, []
+
+    def apply_massive_action(self, itemtype, action_key, payload):
+        if action_key not in [a['key'] for a in MASSIVE_ACTIONS]:
+            return _error(400, 'ERROR_MASSIVEACTION_KEY',
+                          'Wrong massive action key')
+        ids = payload.get('ids')
+        if not ids:
+            return _error(400, 'ERROR_MASSIVEACTION_NO_IDS',
+                          'No ids supplied')
+        data = payload.get('input') or {}
+        field = data.get('field')
+        if action_key == 'MassiveAction:update' and field not in data:
+            return _error(400, 'ERROR_MASSIVEACTION_KEY',
+                          'Missing field to update')
+        result = {"ok": 0, "ko": 0, "noright": 0, "messages": []}
+        with self.lock:
+            store = self._store(itemtype)
+            for item_id in ids:
+                row = store.get(int(item_id))
+                if row is None:
+                    result['ko'] += 1
+                    result['messages'].append(
+                        "Item not found: %s" % item_id)
+                    continue
+                if action_key == 'MassiveAction:purge':
+                    del store[int(item_id)]
+                elif action_key == 'MassiveAction:delete':
+                    row['is_deleted'] = 1
+                    row['date_mod'] = _now()
+                else:
+                    row[field] = data[field]
+                    row['date_mod'] = _now()
+                result['ok'] += 1
+        if not result['ko']:
+            status = 200
+        else:
+            status = 207 if result['ok'] else 422
+        return status, {}, result
+
+    def list_search_options(self, itemtype):
+        table = 'glpi_%ss' % itemtype.lower()
+        result = {"common": "Characteristics"}
+        for option_id, field in sorted(self.get_search_options(
+                itemtype).items()):
+            if field == 'id' or field.endswith('_id') or field == 'status':
+                datatype = 'number'
+            elif field.startswith('date'):
+                datatype = 'datetime'
+            elif field == 'itemtype':
+                datatype = 'itemtypename'
+            else:
+                datatype = 'string'
+            result["%d" % option_id] = {
+                "name": field.replace('_', ' ').capitalize(),
+                "table": table,
+                "field": field,
+                "datatype": datatype,
+                "nosearch": False,
+                "nodisplay": False,
+                "available_searchtypes": ["contains", "equals", "notequals",
+                                          "lessthan", "morethan"],
+                "uid": "%s.%s" % (self.itemtypes.get(itemtype.lower(),
+                                                     itemtype), field),
+            }
+        return 200, {}, result
+
+    def _matches(self, row, criteria, options):
+        """ Whether row matches criteria, groups of criteria included. """
+        found = None
+        for c in criteria:
+            if 'criteria' in c:
+                ok = self._matches(row, _as_list(c['criteria']), options)
+            else:
+                field = options.get(int(c.get('field', 1)))
+                ok = _match(row.get(field), c.get('searchtype', 'contains'),
+                            c.get('value'))
+            link = c.get('link', 'AND').upper()
+            if link.endswith('NOT'):
+                ok = not ok
+            if found is None:
+                found = ok
+            elif link.startswith('OR'):
+                found = found or ok
+            else:
+                found = found and ok
+        return found
+
+    def search(self, itemtype, params, entities=None):
+        options = self.get_search_options(itemtype)
+        criteria = _as_list(params.get('criteria'))
+        rows = _in_entities(self.get_items(itemtype), entities)
+
+        if criteria:
+            rows = [row for row in rows
+                    if self._matches(row, criteria, options)]
+
+        sort = int(params.get('sort', 1))
+        sort_field = options.get(sort, 'name')
+        order = params.get('order', 'ASC').upper()
+        rows = sorted(rows, key=lambda r: (r.get(sort_field) is None,
+                                           r.get(sort_field)),
+                      reverse=order == 'DESC')
+
+        display = [1, 2]
+        for c in criteria:
+            if 'field' in c:
+                display.append(int(c['field']))
+        for f in _as_list(params.get('forcedisplay')):
+            display.append(int(f))
+        display = [d for i, d in enumerate(display)
+                   if d in options and d not in display[:i]]
+
+        status, headers, page = self._page(rows, itemtype, params)
+        if status >= 400:
+            return status, headers, page
+        data = [dict(("%d" % d, row.get(options[d])) for d in display)
+                for row in page]
+        result = {
+            "totalcount": len(rows),
+            "count": len(data),
+            "sort": sort,
+            "order": order,
+            "data": data,
+            "content-range": headers["Content-Range"],
+        }
+        return status, headers, result
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _dispatch(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        status, headers, result = self.server.stub.handle(
+            self.command, url.path, url.query, dict(self.headers.items()),
+            body)
+        if isinstance(result, bytes):
+            content = result
+        else:
+            content = json.dumps(result).encode('utf-8')
+            headers = dict(headers)
+            headers.setdefault('Content-Type',
+                               'application/json; charset=UTF-8')
+            content, encoding = _encode(
+                content, self.headers.get('Accept-Encoding'))
+            if encoding is not None:
+                headers['Content-Encoding'] = encoding
+        self.send_response(status)
+        self.send_header('Content-Length', '%d' % len(content))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class StubServer(object):
+    """
+    Serve a StubGlpi over HTTP in a background thread.
+    Use it as context manager or call start()/stop().
+    """
+
+    def __init__(self, stub=None, host='127.0.0.1', port=0, verbose=False):
+        self.stub = stub if stub is not None else StubGlpi()
+        self.httpd = _ThreadingHTTPServer((host, port), _StubRequestHandler)
+        self.httpd.stub = self.stub
+        self.httpd.verbose = verbose
+        self.thread = None
+        self.stub.url_base_api = self.url
+
+    @property
+    def url(self):
+        """ URL of apirest.php, to be used as SDK url. """
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d/apirest.php' % (host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_populate(values):
+    """ Parse ['Ticket=100', 'Computer=10'] into [('Ticket', 100), ...]. """
+    result = []
+    for value in values or []:
+        for part in value.split(','):
+            itemtype, _, count = part.partition('=')
+            result.append((itemtype, int(count or 0)))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Local stub of GLPI apirest.php.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--app-token', help="Required App-Token")
+    parser.add_argument('--user-token', help="Required user_token")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="Delay added to every request, in seconds")
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help="Fraction of requests answered with an error")
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--populate', action='append', metavar='TYPE=N',
+                        help="Generate N items of TYPE (repeatable)")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    stub = StubGlpi(app_token=args.app_token, user_token=args.user_token,
+                    latency=args.latency, error_rate=args.error_rate,
+                    error_status=args.error_status)
+    for itemtype, count in parse_populate(args.populate):
+        stub.populate(itemtype, count)
+
+    server = StubServer(stub, args.host, args.port, verbose=args.verbose)
+    print("GLPI stub listening on %s" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
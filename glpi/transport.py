@@ -0,0 +1,226 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# HTTP transports used by GlpiService: requests (default), httpx with
+# HTTP/2 and an in-memory transport calling a Python handler directly.
+# A transport has request(method, url, headers, params, data, json, files,
+# auth, verify, stream) returning a requests like response.
+
+import io
+import sys
+import json as json_import
+import logging
+import threading
+
+if sys.version_info[0] > 2:
+    from urllib.parse import urlsplit
+else:
+    from urlparse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class RequestsTransport(object):
+    """
+    Transport using requests, through session when set (a requests.Session
+    keeps connections alive) or a new connection per request.
+    """
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def request(self, method, url, headers=None, params=None, data=None,
+                json=None, files=None, auth=None, verify=True, stream=False,
+                **kwargs):
+        if self.session is not None:
+            sender = self.session
+        else:
+            import requests
+            sender = requests
+        return sender.request(method=method, url=url, headers=headers,
+                              params=params, data=data, json=json,
+                              files=files, auth=auth, verify=verify,
+                              stream=stream, **kwargs)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+class _Headers(object):
+    """ Request stand-in given to requests auth objects. """
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class _HttpxResponse(object):
+    """ requests like view of an httpx response. """
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = '%s' % response.url
+
+    @property
+    def content(self):
+        return self.response.read()
+
+    @property
+    def text(self):
+        self.response.read()
+        return self.response.text
+
+    def json(self, **kwargs):
+        return json_import.loads(self.content, **kwargs)
+
+    @property
+    def num_bytes_downloaded(self):
+        return self.response.num_bytes_downloaded
+
+    def iter_content(self, chunk_size=1):
+        return self.response.iter_bytes(chunk_size)
+
+    def close(self):
+        self.response.close()
+
+
+class HttpxTransport(object):
+    """
+    Transport using httpx (pip install httpx[http2]). With http2, the
+    concurrent requests of every thread are multiplexed over one
+    connection per server. verify is set per client, so one client is
+    kept per verify value. client_options are passed to httpx.Client.
+    Without the h2 package, HTTP/1.1 is used.
+    """
+
+    def __init__(self, http2=True, timeout=60.0, **client_options):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError('HttpxTransport needs httpx: '
+                              'pip install httpx[http2]')
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning('h2 is not installed, HttpxTransport uses '
+                               'HTTP/1.1: pip install httpx[http2]')
+                http2 = False
+        self.httpx = httpx
+        self.http2 = http2
+        self.timeout = timeout
+        self.client_options = client_options
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def _client(self, verify):
+        with self.lock:
+            client = self.clients.get(verify)
+            if client is None:
+                client = self.clients[verify] = self.httpx.Client(
+                    http2=self.http2, verify=verify, timeout=self.timeout,
+                    **self.client_options)
+            return client
+
+    def request(self, method, url, headers=None, params=None, data=None,
+                json=None, files=None, auth=None, verify=True, stream=False,
+                **kwargs):
+        headers = dict(headers or {})
+        if auth is not None and not isinstance(auth, tuple):
+            auth(_Headers(headers))
+            auth = None
+        content = None
+        if isinstance(data, (str, bytes)) or hasattr(data, 'read'):
+            content, data = data, None
+            if hasattr(content, 'read'):
+                if hasattr(content, '__len__'):
+                    headers['Content-Length'] = '%d' % len(content)
+                content = iter(content)
+        url = self.httpx.URL(url)
+        if params:
+            # Merged like requests does: some URIs carry their own query.
+            url = url.copy_merge_params(params)
+        client = self._client(verify)
+        request = client.build_request(method, url, headers=headers,
+                                       content=content,
+                                       data=data, json=json, files=files)
+        response = client.send(request, auth=auth, stream=stream)
+        return _HttpxResponse(response)
+
+    def close(self):
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+
+
+class InMemoryTransport(object):
+    """
+    Transport calling handler(method, path, query, headers, body) in
+    process, path being relative to the API URL (I.E: '/Ticket/1'). The
+    handler returns (status, headers, result), result being bytes or a
+    JSON value, like glpi.stub_server.StubGlpi.handle. Requests are
+    encoded and responses decoded as over HTTP, without a network, so
+    tests and benchmarks measure the cost of the SDK alone.
+    """
+
+    def __init__(self, handler, base_path='/apirest.php'):
+        self.handler = handler
+        self.base_path = base_path.rstrip('/')
+
+    def request(self, method, url, headers=None, params=None, data=None,
+                json=None, files=None, auth=None, verify=True, stream=False,
+                **kwargs):
+        import requests
+        from requests.structures import CaseInsensitiveDict
+
+        prepared = requests.Request(method, url, headers=headers,
+                                    params=params, data=data, json=json,
+                                    files=files, auth=auth).prepare()
+        body = prepared.body
+        if hasattr(body, 'read'):
+            stream = body
+            body = b''.join(iter(lambda: stream.read(65536), b''))
+        elif body is not None and not isinstance(body, (str, bytes)):
+            body = b''.join(body)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        parts = urlsplit(prepared.url)
+        path = parts.path
+        if self.base_path and path.startswith(self.base_path):
+            path = path[len(self.base_path):]
+        status, response_headers, result = self.handler(
+            method.upper(), path, parts.query, dict(prepared.headers), body)
+
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(response_headers or {})
+        if isinstance(result, bytes):
+            response._content = result
+        else:
+            response._content = json_import.dumps(result).encode('utf-8')
+            response.headers.setdefault('Content-Type',
+                                        'application/json; charset=UTF-8')
+        response.headers['Content-Length'] = '%d' % len(response._content)
+        response._content_consumed = True
+        response.raw = io.BytesIO(response._content)
+        response.encoding = 'utf-8'
+        response.url = prepared.url
+        response.request = prepared
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,239 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Change watcher: polls the items modified since a date_mod watermark,
+# diffs them against the last seen values and emits field level events.
+
+import time
+import logging
+import threading
+
+from .dedup import DATE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+
+class Watcher(object):
+    """
+    Watch the items of item_name matching criteria for changes of fields
+    (default: every field). Each poll() searches the items whose date_mod
+    is past the watermark, so an idle poll is one request, and returns a
+    list of events:
+
+        {"id": item id, "action": 'added', 'changed' or 'removed',
+         "changes": {field: (old value, new value)}, "item": item dict}
+
+    'added' is an item seen for the first time (created, or first modified
+    since the watch started unless prime() loaded it), 'removed' an item
+    which no longer matches criteria (item is None). Items last modified
+    before the watch started give no event.
+
+    Iterating the watcher polls forever and yields events; the delay
+    between polls is divided by backoff (down to min_interval) after a
+    poll with events and multiplied by backoff (up to max_interval) after
+    an idle one. stop() ends the iteration and run().
+    """
+
+    def __init__(self, glpi, item_name, criteria=None, fields=None,
+                 min_interval=1.0, max_interval=60.0, backoff=2.0,
+                 page_size=500, prime=False):
+        self.glpi = glpi
+        self.item_name = item_name
+        self.criteria = criteria
+        self.fields = list(fields) if fields is not None else None
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.page_size = page_size
+
+        self.interval = min_interval
+        self.snapshot = {}  # item id -> {field: value}
+        self.watermark = None
+        self.start_mark = None
+        self.seen = {}  # item id -> (date_mod, time read)
+        self.first_seen = {}  # date_mod -> time first seen
+        self.polls = 0
+        self.stopping = threading.Event()
+        self.date_field = None
+        if prime:
+            self.prime()
+
+    def _date_field(self):
+        if self.date_field is None:
+            schema = self.glpi.get_field_schema(self.item_name)
+            self.date_field = schema.get('date_mod', {}).get('id', 19)
+        return self.date_field
+
+    def _search(self, criteria, extra=()):
+        """ Pages of search rows of criteria plus the extra criteria. """
+        query = dict(criteria or {})
+        query['criteria'] = list(extra) + list(query.get('criteria', []))
+        query['forcedisplay'] = [2, self._date_field()]
+        for _, rows in self.glpi.get_pages(self.item_name, query,
+                                           self.page_size):
+            yield rows
+
+    def _fetch(self, ids):
+        """ Current items with ids, read from the server (not a cache). """
+        itemtype = self.glpi.get_itemtype(self.item_name)
+        ids = sorted(ids)
+        for start in range(0, len(ids), 100):
+            for item in self.glpi.api_rest.get_multiple(
+                    [(itemtype, item_id) for item_id in ids[start:start + 100]]):
+                if isinstance(item, dict) and 'id' in item:
+                    yield item
+
+    def _values(self, item):
+        if self.fields is None:
+            return dict(item)
+        return dict((f, item.get(f)) for f in self.fields)
+
+    def _start(self):
+        """ Start the watermark at the newest date_mod of the server. """
+        if not self.glpi.api_has_session():
+            self.glpi.init_api()
+        date_field = self._date_field()
+        query = {"forcedisplay": [2, date_field], "sort": date_field,
+                 "order": 'DESC'}
+        rows, _ = self.glpi.api_rest.get_range('search/%s' % (
+            self.glpi.search_query(self.item_name, query, start=None)), 0, 0)
+        self.watermark = '1970-01-01 00:00:00'
+        if rows and rows[0].get('%d' % date_field):
+            self.watermark = rows[0]['%d' % date_field]
+        self.start_mark = self.watermark
+        # Items modified in the same second as the newest are the baseline,
+        # items modified later in that second are still seen as new.
+        for rows in self._search(self.criteria, self._changed()):
+            for item in self._fetch(int(row['2']) for row in rows):
+                self.snapshot[int(item['id'])] = self._values(item)
+
+    def _changed(self):
+        """ Criteria of the items modified since the watermark. """
+        # One second back: GLPI dates have no sub-second precision, items
+        # seen again without changes give no event.
+        since = time.strftime(DATE_FORMAT, time.localtime(time.mktime(
+            time.strptime(self.watermark, DATE_FORMAT)) - 1))
+        return [{"field": self._date_field(), "searchtype": "morethan",
+                 "value": since, "link": "AND"}]
+
+    def prime(self):
+        """
+        Load the current values of the matching items, so their first
+        change is reported as 'changed' with the previous values.
+        """
+        if self.watermark is None:
+            self._start()
+        for rows in self._search(self.criteria):
+            for item in self._fetch(int(row['2']) for row in rows):
+                self.snapshot[int(item['id'])] = self._values(item)
+
+    def poll(self):
+        """ Return the events since the previous poll. """
+        if self.watermark is None:
+            self._start()
+        self.polls += 1
+        date_field = self._date_field()
+        changed = self._changed()
+
+        # The rows of the last second are returned again by every poll:
+        # they are read again until a read happened once their second was
+        # over, that is one second after the date was first seen.
+        now = time.time()
+        watermark = self.watermark
+        modified, seen = set(), {}
+        for rows in self._search(None, changed):
+            for row in rows:
+                item_id = int(row['2'])
+                date = row.get('%d' % date_field)
+                first_seen = self.first_seen.setdefault(date, now)
+                last = self.seen.get(item_id)
+                if last is None or last[0] != date or \
+                        last[1] < first_seen + 1:
+                    modified.add(item_id)
+                    seen[item_id] = (date, now)
+                if date and date > watermark:
+                    watermark = date
+        if not modified:
+            return []
+
+        matching = modified
+        if self.criteria and self.criteria.get('criteria'):
+            matching = set()
+            for rows in self._search(self.criteria, changed):
+                matching.update(int(row['2']) for row in rows)
+            matching &= modified
+
+        events = []
+        for item_id in sorted(modified - matching):
+            if self.snapshot.pop(item_id, None) is not None:
+                events.append({"id": item_id, "action": 'removed',
+                               "changes": {}, "item": None})
+        for item in self._fetch(matching):
+            event = self._diff(item)
+            if event is not None:
+                events.append(event)
+        self.seen.update(seen)
+        self.watermark = watermark
+        since = changed[0]['value']
+        for date in [d for d in self.first_seen if not d or d < since]:
+            del self.first_seen[date]
+        return events
+
+    def _diff(self, item):
+        item_id = int(item['id'])
+        values = self._values(item)
+        previous = self.snapshot.get(item_id)
+        self.snapshot[item_id] = values
+        if previous is None:
+            date = item.get('date_mod')
+            if date and date < self.start_mark:
+                return None
+            return {"id": item_id, "action": 'added', "item": item,
+                    "changes": dict((f, (None, v))
+                                    for f, v in values.items())}
+        changes = dict((f, (previous.get(f), v)) for f, v in values.items()
+                       if previous.get(f) != v)
+        if not changes:
+            return None
+        return {"id": item_id, "action": 'changed', "item": item,
+                "changes": changes}
+
+    def _adapt(self, events):
+        if events:
+            self.interval = max(self.min_interval,
+                                self.interval / self.backoff)
+        else:
+            self.interval = min(self.max_interval,
+                                self.interval * self.backoff)
+
+    def __iter__(self):
+        self.stopping.clear()
+        while not self.stopping.is_set():
+            try:
+                events = self.poll()
+            except Exception:
+                logger.exception('Watch poll failed')
+                events = []
+            self._adapt(events)
+            for event in events:
+                yield event
+            self.stopping.wait(self.interval)
+
+    def run(self, callback):
+        """ Call callback(event) for every event until stop(). """
+        for event in self:
+            callback(event)
+
+    def stop(self):
+        self.stopping.set()
@@ -0,0 +1,276 @@
+# Copyright 2017 Predict & Truly Systems All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Durable write-behind queue: creates and updates are stored in a local
+# SQLite database and sent to GLPI by a background flusher, in batches,
+# with retries. Pending writes survive process restarts.
+
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+from .glpi import GlpiInvalidArgument, _bounded_imap, _chunks, _written
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_name TEXT NOT NULL,
+    action TEXT NOT NULL,
+    item_id INTEGER,
+    data TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+)
+"""
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                 check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute(SCHEMA)
+    return connection
+
+
+class WriteQueue(object):
+    """
+    Write-behind queue of GLPI creates and updates stored in the SQLite
+    database path (WAL mode, so an enqueue is one small append).
+
+    A flusher thread (start()) sends pending operations with up to workers
+    concurrent array input requests of batch_size items. Failed operations
+    are retried after retry_delay seconds, doubled on every attempt, and
+    kept as failed after max_attempts (see failed() and retry_failed()).
+    Updates of the same item are sent in the order they were enqueued.
+    Delivery is at least once: operations in flight when the process dies
+    are sent again on restart.
+
+    on_done(operation, result) is called after each successful operation,
+    operation being a dict with its 'id', 'item_name', 'action' and 'data'.
+    """
+
+    def __init__(self, glpi, path, batch_size=100, workers=4,
+                 flush_interval=1.0, max_attempts=5, retry_delay=1.0,
+                 on_done=None):
+        self.glpi = glpi
+        self.path = path
+        self.batch_size = batch_size
+        self.workers = workers
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.on_done = on_done
+
+        self.connection = _connect(path)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Producer side
+    def enqueue(self, item_name, data, action='create'):
+        """ Store a create or update (data with its 'id') of item_name. """
+        if action not in ('create', 'update'):
+            raise GlpiInvalidArgument('Unknown write action: %s' % action)
+        if action == 'update' and not data.get('id'):
+            raise GlpiInvalidArgument('update needs an id')
+        payload = json.dumps(data)
+        with self.lock:
+            cursor = self.connection.execute(
+                'INSERT INTO operations (item_name, action, item_id, data) '
+                'VALUES (?, ?, ?, ?)', (item_name, action, data.get('id'),
+                                        payload))
+        self.wakeup.set()
+        return cursor.lastrowid
+
+    def create(self, item_name, data):
+        return self.enqueue(item_name, data, 'create')
+
+    def update(self, item_name, data):
+        return self.enqueue(item_name, data, 'update')
+
+    def pending(self):
+        """ Number of operations waiting to be sent. """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM operations WHERE failed = 0'
+            ).fetchone()[0]
+
+    def failed(self):
+        """ Operations that failed max_attempts times, with their error. """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT id, item_name, action, data, attempts, error '
+                'FROM operations WHERE failed = 1 ORDER BY id').fetchall()
+        return [{"id": r[0], "item_name": r[1], "action": r[2],
+                 "data": json.loads(r[3]), "attempts": r[4], "error": r[5]}
+                for r in rows]
+
+    def retry_failed(self):
+        """ Queue the failed operations again. """
+        with self.lock:
+            self.connection.execute(
+                'UPDATE operations SET failed = 0, attempts = 0, '
+                'next_try = 0 WHERE failed = 1')
+        self.wakeup.set()
+
+    # Flusher side
+    def _ready(self, limit):
+        """
+        Pending operations that can be sent now, in enqueue order. An
+        update waits while an earlier operation of the same item does.
+        """
+        now = time.time()
+        ready, busy = [], set()
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT id, item_name, action, item_id, data, attempts, '
+                'next_try FROM operations WHERE failed = 0 ORDER BY id')
+            for op_id, item_name, action, item_id, data, attempts, \
+                    next_try in rows:
+                if item_id is not None:
+                    if (item_name, item_id) in busy:
+                        continue
+                    busy.add((item_name, item_id))
+                if next_try > now:
+                    continue
+                ready.append({"id": op_id, "item_name": item_name,
+                              "action": action, "data": json.loads(data),
+                              "attempts": attempts})
+                if len(ready) >= limit:
+                    break
+        return ready
+
+    def _send(self, batch):
+        item_name, action, operations = batch
+        write = getattr(self.glpi.api_rest, '%s_many' % action)
+        try:
+            return batch, write([op['data'] for op in operations],
+                                self.glpi.get_itemtype(item_name))
+        except Exception as e:
+            return batch, [{"id": None, "ok": False, "message": '%s' % e}
+                           for _ in operations]
+
+    def _record(self, operations, results):
+        done, retries = [], []
+        for op, result in zip(operations, results):
+            if result['ok']:
+                done.append((op['id'],))
+                continue
+            attempts = op['attempts'] + 1
+            retries.append((attempts,
+                            time.time() + self.retry_delay *
+                            2 ** (attempts - 1),
+                            1 if attempts >= self.max_attempts else 0,
+                            result['message'] or 'failed', op['id']))
+        with self.lock:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'DELETE FROM operations WHERE id = ?', done)
+            self.connection.executemany(
+                'UPDATE operations SET attempts = ?, next_try = ?, '
+                'failed = ?, error = ? WHERE id = ?', retries)
+            self.connection.execute('COMMIT')
+        if operations:
+            self.glpi.notify_write(
+                operations[0]['item_name'], operations[0]['action'],
+                _written([op['data'] for op in operations], results,
+                         operations[0]['action']))
+        for op, result in zip(operations, results):
+            if result['ok'] and self.on_done is not None:
+                try:
+                    self.on_done(op, result)
+                except Exception:
+                    logger.exception('on_done callback failed')
+
+    def flush_once(self):
+        """ Send one round of ready operations, return how many were. """
+        with self.flush_lock:
+            operations = self._ready(self.batch_size * max(self.workers, 1))
+            if not operations:
+                return 0
+            if not self.glpi.api_has_session():
+                self.glpi.init_api()
+
+            batches = []
+            groups = {}
+            for op in operations:
+                groups.setdefault((op['item_name'], op['action']),
+                                  []).append(op)
+            for (item_name, action), ops in groups.items():
+                for chunk in _chunks(ops, self.batch_size):
+                    batches.append((item_name, action, chunk))
+
+            for (_, _, ops), results in _bounded_imap(self._send, batches,
+                                                      self.workers):
+                self._record(ops, results)
+            return len(operations)
+
+    def flush(self, timeout=None):
+        """
+        Send operations until none is ready (failed ones waiting for a
+        retry are left) or timeout seconds passed.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while self.flush_once():
+            if deadline is not None and time.time() >= deadline:
+                break
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wakeup.clear()
+            try:
+                sent = self.flush_once()
+            except Exception:
+                logger.exception('Write queue flush failed')
+                sent = 0
+            if not sent:
+                self.wakeup.wait(self.flush_interval)
+
+    def start(self):
+        """ Start the background flusher. """
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+        return self
+
+    def stop(self, flush=True, timeout=None):
+        """ Stop the flusher, after sending ready operations if flush. """
+        if self.thread is not None:
+            self.stopping.set()
+            self.wakeup.set()
+            self.thread.join()
+            self.thread = None
+        if flush:
+            self.flush(timeout)
+
+    def close(self):
+        self.stop()
+        self.connection.close()
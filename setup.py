@@ -28,5 +28,13 @@ setup(
     keywords=['GLPI', 'SDK'],
     install_requires=[
         'requests',
-    ]
+    ],
+    entry_points={
+        'console_scripts': [
+            'glpi-stub-server=glpi.stub_server:main',
+            'glpi-loadgen=glpi.loadgen:main',
+            'glpi-export=glpi.export:main',
+            'glpi-import=glpi.importer:main',
+        ],
+    },
 )
@@ -0,0 +1,26 @@
+# Offline smoke tests for the hot path benchmark suite.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'benchmarks'))
+
+import bench_hot_paths  # noqa: E402
+
+
+def test_run_benchmarks_smallest_sizes():
+    results = bench_hot_paths.run_benchmarks([10], [5], repeat=1)
+    assert len(results) == len(bench_hot_paths.CASES)
+    assert all(seconds >= 0 for seconds in results.values())
+
+
+def test_compare_flags_regressions(tmpdir):
+    path = str(tmpdir.join('baseline.json'))
+    bench_hot_paths.save_baseline(path, {"a/10/5": 1.0, "b/10/5": 1.0,
+                                         "c/10/5": 0.0001})
+    baseline = bench_hot_paths.load_baseline(path)
+    regressions = bench_hot_paths.compare(
+        {"a/10/5": 1.1, "b/10/5": 2.0, "c/10/5": 1.0}, baseline,
+        threshold=0.25)
+    assert [r[0] for r in regressions] == ["b/10/5"]
@@ -0,0 +1,109 @@
+# Offline tests of the item cache against the local GLPI stub server.
+
+import time
+import pytest
+from glpi import GLPI
+from glpi.cache import MemoryCache, SQLiteCache
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Ticket', 5)
+    return stub
+
+
+@pytest.fixture()
+def server(stub):
+    with StubServer(stub) as server:
+        yield server
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryCache(ttl=60)
+    else:
+        cache = SQLiteCache(str(tmp_path / 'cache.db'), ttl=60)
+        yield cache
+        cache.close()
+
+
+def _client(server, cache):
+    glpi = GLPI(server.url, 'app-token', 'user-token', cache=cache)
+    glpi.init_api()
+    return glpi
+
+
+def test_reads_are_cached(server, stub, cache):
+    glpi = _client(server, cache)
+    before = stub.request_count
+    first = glpi.get('Ticket', 2)
+    second = glpi.get('Ticket', 2)
+    item = glpi.get_item('Ticket', 2)
+    assert stub.request_count - before == 1
+    assert first == second and item.get_attribute('id') == 2
+    assert first is not second
+
+
+def test_update_is_written_through(server, stub, cache):
+    glpi = _client(server, cache)
+    glpi.get('Ticket', 2)
+    glpi.update('Ticket', {"id": 2, "name": "renamed"})
+    before = stub.request_count
+    assert glpi.get('Ticket', 2)['name'] == 'renamed'
+    assert stub.request_count == before
+    assert stub.items['ticket'][2]['name'] == 'renamed'
+
+
+def test_delete_invalidates(server, stub, cache):
+    glpi = _client(server, cache)
+    glpi.get('Ticket', 3)
+    glpi.delete('Ticket', 3)
+    before = stub.request_count
+    assert 'id' not in glpi.get('Ticket', 3)
+    assert stub.request_count - before == 1
+
+
+def test_get_multiple_fetches_only_misses(server, stub, cache):
+    glpi = _client(server, cache)
+    glpi.get('Ticket', 2)
+    glpi.get('Ticket', 4)
+    before = stub.request_count
+    items = glpi.get_multiple('Ticket', [1, 2, 3, 4])
+    assert [item['id'] for item in items] == [1, 2, 3, 4]
+    assert stub.request_count - before == 1
+    glpi.get_multiple('Ticket', [1, 2, 3, 4])
+    assert stub.request_count - before == 1
+
+
+def test_shared_sqlite_cache(server, stub, tmp_path):
+    path = str(tmp_path / 'shared.db')
+    writer = _client(server, SQLiteCache(path))
+    reader = _client(server, SQLiteCache(path))
+    writer.get('Ticket', 1)
+    writer.update('Ticket', {"id": 1, "name": "shared"})
+    before = stub.request_count
+    assert reader.get('Ticket', 1)['name'] == 'shared'
+    assert stub.request_count == before
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_bounds_and_ttl(backend, tmp_path):
+    if backend == 'memory':
+        cache = MemoryCache(max_entries=3, max_bytes=60, ttl=0.05)
+    else:
+        cache = SQLiteCache(str(tmp_path / 'bounds.db'), max_entries=3,
+                            max_bytes=60, ttl=0.05)
+    for i in range(5):
+        cache.set('k%d' % i, {"id": i})
+    assert len(cache) == 3
+    assert cache.get('k0') is None and cache.get('k4') == {"id": 4}
+    cache.set('big', {"data": 'x' * 100})
+    assert cache.get('big') is None
+    cache.set('k5', {"id": 5, "data": 'x' * 30})
+    cache.set('k6', {"id": 6, "data": 'x' * 30})
+    assert cache.get('k5') is None and cache.get('k6') is not None
+    time.sleep(0.1)
+    assert cache.get('k6') is None
@@ -0,0 +1,113 @@
+# Offline tests of the columnar result sets, with and without NumPy.
+
+import pytest
+from glpi import GLPI
+from glpi import columnar
+from glpi.columnar import ColumnarResult
+from glpi.stub_server import StubGlpi, StubServer
+
+ROWS = [{"id": i, "status": i % 3 + 1,
+         "category": ["network", "printer", None][i % 3],
+         "duration": float(i) if i % 4 else None} for i in range(12)]
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(columnar, 'numpy', None)
+    elif columnar.numpy is None:
+        pytest.skip('NumPy is not installed')
+    return request.param
+
+
+def test_fill_from_pages(backend):
+    result = ColumnarResult.from_pages([(0, ROWS[:5]), (5, ROWS[5:])])
+    assert len(result) == 12
+    assert result.to_rows() == ROWS
+    assert result.columns['status'].kind == 'int'
+    assert result.columns['category'].kind == 'str'
+    assert result.columns['duration'].kind == 'float'
+
+
+def test_promote_mixed_columns(backend):
+    result = ColumnarResult.from_rows([{"a": 1, "b": "x"},
+                                       {"a": 2.5, "b": 3},
+                                       {"c": True}])
+    assert result.columns['a'].kind == 'float'
+    assert result.columns['b'].kind == 'object'
+    assert result.to_rows() == [{"a": 1, "b": "x", "c": None},
+                                {"a": 2.5, "b": 3, "c": None},
+                                {"a": None, "b": None, "c": 1}]
+
+
+def test_filter(backend):
+    result = ColumnarResult.from_rows(ROWS)
+    selected = result.filter(('status', 'in', [1, 2]),
+                             ('category', '!=', 'printer'))
+    assert [r['id'] for r in selected.iter_rows()] == [0, 3, 6, 9]
+    assert len(result.filter(('duration', '>', 5))) == 5
+    assert len(result.filter(('category', '==', 'unknown'))) == 0
+
+
+def test_group_count(backend):
+    result = ColumnarResult.from_rows(ROWS)
+    assert result.group_count('category') == {"network": 4, "printer": 4,
+                                              None: 4}
+    assert result.group_count('status') == {1: 4, 2: 4, 3: 4}
+
+
+def test_aggregate(backend):
+    result = ColumnarResult.from_rows(ROWS)
+    assert result.aggregate('duration', 'sum') == 54.0
+    assert result.aggregate('duration', 'count') == 9
+    assert result.aggregate('id', 'max') == 11
+    assert result.aggregate('duration', 'mean', by='status') == {
+        1: 6.0, 2: 6.0, 3: 6.0}
+    assert result.aggregate('id', 'min', by='category') == {
+        "network": 0, "printer": 1, None: 2}
+    with pytest.raises(ValueError):
+        result.aggregate('id', 'median')
+
+
+def test_column(backend):
+    result = ColumnarResult.from_rows(ROWS)
+    durations = list(result.column('duration'))
+    assert durations[0] is None
+    assert durations[1] == 1.0
+    assert list(result.column('category'))[:3] == ["network", "printer",
+                                                   None]
+    assert list(result.column('id'))[:3] == [0, 1, 2]
+
+
+def test_ordered_mask_on_strings_with_nulls(backend):
+    result = ColumnarResult.from_rows([{"d": '2020-01-01'}, {"d": None},
+                                       {"d": '2021-01-01'}])
+    assert list(result.mask('d', '>', '2019-01-01')) == [True, False, True]
+    assert list(result.mask('d', '<=', '2020-01-01')) == \
+        [True, False, False]
+    assert len(result.filter(('d', '>=', '2021-01-01'))) == 1
+
+
+def test_grouped_aggregate_of_large_ints(backend):
+    big = 2 ** 53
+    result = ColumnarResult.from_rows([
+        {"g": "a", "n": big}, {"g": "a", "n": 1}, {"g": "b", "n": big + 1},
+        {"g": "b", "n": None}])
+    sums = result.aggregate('n', 'sum', by='g')
+    assert sums == {"a": big + 1, "b": big + 1}
+    assert all(isinstance(v, int) for v in sums.values())
+    assert result.aggregate('n', 'max', by='g') == {"a": big, "b": big + 1}
+    assert result.aggregate('n', 'min', by='g') == {"a": 1, "b": big + 1}
+    assert result.aggregate('n', 'mean', by='g')['a'] == (big + 1) / 2.0
+
+
+def test_get_columnar():
+    stub = StubGlpi()
+    stub.populate('Ticket', 95)
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token')
+        result = glpi.get_columnar('Ticket', fields=['id', 'status'],
+                                   page_size=10)
+    assert len(result) == 95
+    assert result.fields == ['id', 'status']
+    assert sum(result.group_count('status').values()) == 95
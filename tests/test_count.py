@@ -0,0 +1,60 @@
+# Offline tests of server side counts against the local GLPI stub server.
+
+import pytest
+from glpi import GLPI
+from glpi.glpi import GlpiInvalidArgument
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Ticket', 60)
+    stub.populate('Computer', 7, locations_id=2)
+    stub.populate('Computer', 3, locations_id=5)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_count_all(glpi):
+    assert glpi.count('Ticket') == 60
+    assert glpi.count('Computer') == 10
+    assert glpi.count('Printer') == 0
+
+
+def test_count_search(glpi):
+    criteria = {"criteria": [{"field": 12, "searchtype": "equals",
+                              "value": 1, "link": "AND"}]}
+    assert glpi.count('Ticket', criteria) == 10
+
+
+def test_count_is_one_request(glpi, stub):
+    glpi.count('Ticket')
+    before = stub.request_count
+    glpi.count('Ticket')
+    assert stub.request_count - before == 1
+
+
+def test_count_by(glpi):
+    assert glpi.count_by('Ticket', 'status', [1, 2, 7]) == {1: 10, 2: 10,
+                                                            7: 0}
+    assert glpi.count_by('Computer', 'locations_id', [2, 5],
+                         workers=2) == {2: 7, 5: 3}
+    assert glpi.count_by('Computer', 'serial', ['SN00000001']) == {
+        'SN00000001': 2}
+
+
+def test_count_by_with_criteria(glpi):
+    criteria = {"criteria": [{"field": 3, "searchtype": "equals",
+                              "value": 5, "link": "AND"}]}
+    assert glpi.count_by('Computer', 3, [2, 5], criteria) == {2: 0, 5: 3}
+
+
+def test_count_by_unknown_field(glpi):
+    with pytest.raises(GlpiInvalidArgument):
+        glpi.count_by('Ticket', 'unknown', [1])
@@ -0,0 +1,140 @@
+# Offline tests of the alert fingerprint index against the stub server.
+
+import time
+import pytest
+from multiprocessing.pool import ThreadPool
+from glpi import GLPI
+from glpi.dedup import FingerprintIndex
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.add_item('Ticket', {"name": "Disk full on DB1", "status": 2})
+    stub.add_item('Ticket', {"name": "CPU high on web1", "status": 6})
+    stub.add_item('Ticket', {"name": "Old alert", "status": 1,
+                             "date_mod": "2000-01-01 00:00:00"})
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_refresh(glpi):
+    index = FingerprintIndex(glpi)
+    assert index.refresh() == 2
+    assert len(index) == 1
+    assert index.match({"name": "disk  full on db1"}) == 1
+    assert index.match({"name": "CPU high on web1"}) is None
+    assert index.match({"name": "Old alert"}) is None
+
+
+def test_incremental_refresh(glpi, stub):
+    index = FingerprintIndex(glpi)
+    index.refresh()
+    stub.add_item('Ticket', {"name": "Fan failure", "status": 1})
+    with stub.lock:
+        stub.items['ticket'][1].update(status=5,
+                                       date_mod='2999-01-01 00:00:00')
+    index.refresh()
+    assert index.match({"name": "Fan failure"}) == 4
+    assert index.match({"name": "Disk full on DB1"}) is None
+
+
+def test_follows_sdk_writes(glpi):
+    index = FingerprintIndex(glpi, key=('name', 'itilcategories_id'))
+    glpi.create('Ticket', {"name": "Link down", "content": "...",
+                           "itilcategories_id": 3})
+    assert index.match({"name": "Link down", "itilcategories_id": 3}) == 4
+    glpi.update('Ticket', {"id": 4, "itilcategories_id": 7})
+    assert index.match({"name": "Link down", "itilcategories_id": 3}) is None
+    assert index.match({"name": "Link down", "itilcategories_id": 7}) == 4
+    glpi.update('Ticket', {"id": 4, "status": 6})
+    assert index.match({"name": "Link down", "itilcategories_id": 7}) is None
+
+
+def test_failed_update_is_not_followed(glpi):
+    events = []
+    glpi.add_write_listener(lambda *event: events.append(event))
+    glpi.update('Ticket', {"id": 999, "name": "y"})
+    assert events == []
+    glpi.update('Ticket', {"id": 1, "name": "y"})
+    assert events == [('Ticket', 'update', [{"id": 1, "name": "y"}])]
+
+
+def test_create_or_followup(glpi, stub):
+    index = FingerprintIndex(glpi)
+    index.refresh()
+    result = index.create_or_followup({"name": "Disk full on db1",
+                                       "content": "95%"})
+    assert result['action'] == 'followup' and result['id'] == 1
+    followup = stub.get_items('ITILFollowup')[0]
+    assert (followup['items_id'], followup['content']) == (1, '95%')
+
+    result = index.create_or_followup({"name": "New alert",
+                                       "content": "..."})
+    assert result['action'] == 'created' and result['id'] == 4
+
+
+def test_concurrent_duplicates_create_one_ticket(glpi, stub):
+    index = FingerprintIndex(glpi)
+    glpi.init_api()
+    stub.latency = 0.01
+    pool = ThreadPool(8)
+    results = pool.map(index.create_or_followup,
+                       [{"name": "Storm", "content": "%d" % i}
+                        for i in range(16)])
+    pool.terminate()
+    assert [r['action'] for r in results].count('created') == 1
+    assert len(stub.get_items('ITILFollowup')) == 15
+
+
+def test_concurrent_fingerprints(glpi, stub, monkeypatch):
+    # Followups on the existing alerts run along the creates of new ones.
+    stub.add_item('Ticket', {"name": "Alert 0", "status": 1})
+    stub.add_item('Ticket', {"name": "Alert 1", "status": 1})
+    index = FingerprintIndex(glpi)
+    index.refresh()
+    glpi.init_api()
+    stub.latency = 0.01
+    update_uri = glpi.update_uri
+
+    def slow_update_uri(item_name):
+        # Widen the window where a shared endpoint could be swapped.
+        update_uri(item_name)
+        time.sleep(0.005)
+
+    monkeypatch.setattr(glpi, 'update_uri', slow_update_uri)
+    pool = ThreadPool(16)
+    results = pool.map(index.create_or_followup,
+                       [{"name": "Alert %d" % (i % 4), "content": "%d" % i}
+                        for i in range(32)])
+    pool.terminate()
+    assert [r['action'] for r in results].count('created') == 2
+    names = dict((t['id'], t['name']) for t in stub.get_items('Ticket'))
+    for result in results:
+        assert result['id'] in names
+    for i in range(4):
+        ticket_id = index.match({"name": "Alert %d" % i})
+        assert names[ticket_id] == "Alert %d" % i
+    followups = stub.get_items('ITILFollowup')
+    assert len(followups) == 30
+    assert all(f['itemtype'] == 'Ticket' and f['items_id'] in names and
+               not f['name'] for f in followups)
+
+
+def test_ttl_and_size_bound(glpi):
+    index = FingerprintIndex(glpi, ttl=0.05, max_size=2)
+    for i in range(3):
+        index.add({"id": i + 10, "name": "alert %d" % i})
+    assert len(index) == 2
+    assert index.match({"name": "alert 0"}) is None
+    assert index.match({"name": "alert 2"}) == 12
+    time.sleep(0.06)
+    assert index.match({"name": "alert 2"}) is None
+    index.close()
+    assert glpi.write_listeners == []
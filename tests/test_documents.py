@@ -0,0 +1,78 @@
+# Offline tests of streamed document upload and download.
+
+import io
+import os
+import hashlib
+import pytest
+from glpi import GLPI
+from glpi.glpi import GlpiException
+from glpi.multipart import MultipartStream
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Ticket', 3)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_multipart_stream():
+    content = os.urandom(100000)
+    body = MultipartStream([('uploadManifest', '{"input": {}}',
+                             'application/json')],
+                           [('filename[0]', 'a.bin', io.BytesIO(content),
+                             'application/octet-stream')],
+                           boundary='xyz', chunk_size=4096)
+    chunks = list(body)
+    assert max(len(c) for c in chunks) == 4096
+    data = b''.join(chunks)
+    assert len(data) == len(body)
+    assert data.startswith(b'--xyz\r\nContent-Disposition: form-data; '
+                           b'name="uploadManifest"\r\n')
+    assert content in data
+    assert data.endswith(b'\r\n--xyz--\r\n')
+
+
+def test_upload_and_download(glpi, stub, tmpdir):
+    content = os.urandom(300000)
+    source = tmpdir.join('crash.log')
+    source.write_binary(content)
+
+    document_id = glpi.upload_document(str(source), name='Crash log',
+                                       item=('Ticket', 2))
+    document = stub.get_items('Document')[0]
+    assert document['id'] == document_id
+    assert document['name'] == 'Crash log'
+    assert document['filename'] == 'crash.log'
+    assert stub.documents[document_id] == content
+    links = stub.get_items('Document_Item')
+    assert [(link['documents_id'], link['itemtype'], link['items_id'])
+            for link in links] == [(document_id, 'Ticket', 2)]
+
+    out = tmpdir.join('downloaded.log')
+    result = glpi.download_document(document_id, str(out), chunk_size=8192,
+                                    hash_name='sha256')
+    assert out.read_binary() == content
+    assert result == {"bytes": len(content),
+                      "hash": hashlib.sha256(content).hexdigest()}
+
+
+def test_upload_file_object(glpi, stub):
+    document_id = glpi.upload_document(io.BytesIO(b'hello'),
+                                       filename='hello.txt')
+    assert stub.documents[document_id] == b'hello'
+    writer = io.BytesIO()
+    assert glpi.download_document(document_id, writer)['bytes'] == 5
+    assert writer.getvalue() == b'hello'
+
+
+def test_download_missing_document(glpi):
+    with pytest.raises(GlpiException):
+        glpi.download_document(42, io.BytesIO())
@@ -0,0 +1,47 @@
+# Offline tests of the entity by entity crawl against the local stub server.
+
+import pytest
+from glpi import GLPI
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.add_item('Entity', {"name": "Paris"})
+    stub.add_item('Entity', {"name": "Lyon"})
+    stub.add_item('Entity', {"name": "Lyon 2", "entities_id": 2})
+    for entity in (0, 1, 2, 3):
+        stub.populate('Ticket', 7, entities_id=entity)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token')
+        glpi.init_api()
+        yield glpi
+
+
+def test_my_entities(glpi):
+    assert [e['id'] for e in glpi.get_my_entities()] == [0, 1, 2, 3]
+
+
+def test_crawl_every_entity(glpi, stub):
+    rows = list(glpi.iter_entities('Ticket', page_size=3, workers=3))
+    assert len(rows) == 28
+    assert sorted(r['id'] for r in rows) == list(range(1, 29))
+    assert all(r['entities_id'] == r['_entity'] for r in rows)
+    # The worker sessions are closed, the main one is left.
+    assert stub.sessions == set([glpi.api_session])
+
+
+def test_crawl_search_recursive(glpi):
+    criteria = {"criteria": [{"field": 12, "searchtype": "equals",
+                              "value": 1, "link": "AND"}],
+                "forcedisplay": [80]}
+    rows = list(glpi.iter_entities('Ticket', criteria, entities=[2],
+                                   is_recursive=True))
+    assert sorted(r['80'] for r in rows) == [2, 2, 3, 3]
+    assert set(r['_entity'] for r in rows) == set([2])
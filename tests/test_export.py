@@ -0,0 +1,102 @@
+# Offline tests of the streaming export against the local GLPI stub server.
+
+import io
+import csv
+import gzip
+import json
+import pytest
+from glpi import GLPI
+from glpi.export import export
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def server():
+    stub = StubGlpi()
+    stub.populate('Ticket', 125)
+    with StubServer(stub) as server:
+        yield server
+
+
+@pytest.fixture()
+def glpi(server):
+    return GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_get_pages_parallel(glpi):
+    pages = list(glpi.get_pages('Ticket', page_size=10, workers=4))
+    assert [offset for offset, _ in pages] == list(range(0, 125, 10))
+    ids = [row['id'] for _, rows in pages for row in rows]
+    assert ids == list(range(1, 126))
+
+
+def test_export_ndjson(glpi, tmpdir):
+    out = str(tmpdir.join('tickets.ndjson'))
+    result = export(glpi, 'Ticket', out, page_size=20, workers=3)
+    assert result['rows'] == 125
+    with open(out) as f:
+        rows = [json.loads(line) for line in f]
+    assert [r['id'] for r in rows] == list(range(1, 126))
+
+
+def test_export_search_csv_gzip(glpi, tmpdir):
+    out = str(tmpdir.join('tickets.csv.gz'))
+    criteria = {"criteria": [{"field": "name", "value": "Ticket 1",
+                              "searchtype": "contains", "link": "AND"}]}
+    result = export(glpi, 'Ticket', out, criteria=criteria, page_size=5)
+    with gzip.open(out, 'rt') as f:
+        rows = list(csv.DictReader(f))
+    assert result['rows'] == len(rows) == 37
+    assert rows[0]['1'] == 'Ticket 1'
+
+
+def test_export_gzip_to_writer(glpi):
+    out = io.BytesIO()
+    result = export(glpi, 'Ticket', out, fmt='ndjson', compress='gzip',
+                    page_size=50)
+    assert not out.closed
+    lines = gzip.GzipFile(fileobj=io.BytesIO(out.getvalue())).readlines()
+    assert result['rows'] == len(lines) == 125
+    assert json.loads(lines[-1].decode('utf-8'))['id'] == 125
+
+
+def test_export_csv_columns(glpi, server, tmpdir):
+    with server.stub.lock:
+        server.stub.items['ticket'][3]['extra'] = 'x'
+    out = str(tmpdir.join('tickets.csv'))
+    export(glpi, 'Ticket', out, page_size=10)
+    with open(out) as f:
+        rows = list(csv.DictReader(f))
+    assert rows[2]['extra'] == 'x' and rows[0]['extra'] == ''
+
+    out = str(tmpdir.join('names.csv'))
+    export(glpi, 'Ticket', out, page_size=10, fields=['id', 'name'])
+    with open(out) as f:
+        assert f.readline().strip() == 'id,name'
+
+
+def test_export_resumes_from_checkpoint(glpi, tmpdir):
+    out = str(tmpdir.join('tickets.ndjson.gz'))
+    checkpoint = str(tmpdir.join('tickets.ckpt'))
+    get_pages = glpi.get_pages
+
+    def interrupted(*args, **kwargs):
+        for i, page in enumerate(get_pages(*args, **kwargs)):
+            if i == 5:
+                raise RuntimeError('interrupted')
+            yield page
+
+    glpi.get_pages = interrupted
+    with pytest.raises(RuntimeError):
+        export(glpi, 'Ticket', out, page_size=10, workers=2,
+               checkpoint=checkpoint, checkpoint_every=2)
+    glpi.get_pages = get_pages
+
+    result = export(glpi, 'Ticket', out, page_size=10, workers=2,
+                    checkpoint=checkpoint, checkpoint_every=2)
+    assert result['offset'] == 40
+    assert result['rows'] == 125
+    with gzip.open(out, 'rt') as f:
+        ids = [json.loads(line)['id'] for line in f]
+    assert ids == list(range(1, 126))
+    assert not tmpdir.join('tickets.ckpt').exists()
@@ -0,0 +1,72 @@
+# Offline tests of federated queries against two local GLPI stub servers.
+
+import time
+import pytest
+from glpi import GLPI
+from glpi.glpi import GlpiException
+from glpi.federation import FederatedGLPI
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def servers():
+    eu, us = StubGlpi(latency=0.2), StubGlpi(latency=0.2)
+    eu.populate('Ticket', 5)
+    us.populate('Ticket', 8)
+    with StubServer(eu) as eu_server, StubServer(us) as us_server:
+        yield {"eu": eu_server, "us": us_server}
+
+
+@pytest.fixture()
+def federation(servers):
+    federation = FederatedGLPI.connect(
+        dict((name, (server.url, 'app-token', 'user-token'))
+             for name, server in sorted(servers.items())))
+    federation.init_api()
+    yield federation
+    federation.close()
+
+
+def test_get_all_is_tagged_and_sorted(federation):
+    rows = federation.get_all('Ticket', key='id', reverse=True)
+    assert len(rows) == 13
+    assert [(r['id'], r['_source']) for r in rows[:3]] == [
+        (8, 'us'), (7, 'us'), (6, 'us')]
+    assert sorted(r['_source'] for r in rows if r['id'] == 5) == ['eu', 'us']
+
+
+def test_calls_are_concurrent(federation):
+    start = time.time()
+    assert federation.count('Ticket') == {"eu": 5, "us": 8}
+    # Bound by the slowest instance, not the sum of both.
+    assert time.time() - start < 0.38
+
+
+def test_search_engine(federation):
+    criteria = {"criteria": [{"field": 1, "searchtype": "contains",
+                              "value": "Ticket", "link": "AND"}]}
+    result = federation.search_engine('Ticket', criteria, key='2')
+    assert result['totalcount'] == 13
+    assert result['sources'] == {"eu": 5, "us": 8}
+    assert [r['2'] for r in result['data'][:4]] == [1, 1, 2, 2]
+
+
+def test_streamed_sorted_merge(federation):
+    criteria = {"criteria": [], "sort": 2, "order": 'ASC'}
+    rows = list(federation.iter_all('Ticket', criteria, page_size=3,
+                                    key='2'))
+    assert [r['2'] for r in rows] == sorted([1, 2, 3, 4, 5] +
+                                            list(range(1, 9)))
+    unsorted = list(federation.iter_all('Ticket', page_size=3))
+    assert sorted((r['id'], r['_source']) for r in unsorted) == \
+        sorted((r['2'], r['_source']) for r in rows)
+
+
+def test_errors_name_the_instance(servers):
+    federation = FederatedGLPI([
+        ("eu", GLPI(servers['eu'].url, 'app-token', 'user-token')),
+        ("down", GLPI('http://127.0.0.1:9/apirest.php', 'app-token',
+                      'user-token'))])
+    with pytest.raises(GlpiException) as error:
+        federation.count('Ticket')
+    assert 'down' in '%s' % error.value
@@ -0,0 +1,105 @@
+# Offline tests of GlpiItem change tracking.
+
+import pytest
+from glpi import GLPI, GlpiItem, Ticket
+from glpi.glpi_item import make_item_class
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.add_item('Ticket', {"name": "ticket", "content": "<p>big</p>",
+                             "status": 1})
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_changes_tracking():
+    item = GlpiItem.from_data({"id": 1, "name": "a", "status": 1})
+    assert not item.has_changes()
+
+    item.set_attribute('name', 'a')
+    assert not item.has_changes()
+
+    item.set_attributes({"name": "b", "status": 2})
+    assert item.get_changes() == {"name": "b", "status": 2}
+
+    item.mark_clean()
+    assert item.get_changes() == {}
+
+
+def test_new_ticket_is_dirty():
+    ticket = Ticket(name="name", content="content")
+    changes = ticket.get_changes()
+    assert changes['name'] == "name"
+    assert changes['closedate'] is None
+
+
+def test_update_sends_only_changes(glpi, stub):
+    ticket = glpi.get_item('Ticket', 1, Ticket)
+    assert isinstance(ticket, Ticket)
+
+    before = stub.request_count
+    glpi.update('Ticket', ticket)
+    assert stub.request_count == before
+
+    ticket.set_attribute('status', 2)
+    stored = stub.items['ticket'][1]
+    stored['content'] = 'changed on the server'
+    glpi.update('Ticket', ticket)
+    assert stub.request_count == before + 1
+    assert stored['status'] == 2
+    assert stored['content'] == 'changed on the server'
+    assert not ticket.has_changes()
+
+
+def test_failed_update_keeps_changes(glpi, stub):
+    ticket = glpi.get_item('Ticket', 1, Ticket)
+    ticket.set_attribute('status', 2)
+    with stub.lock:
+        del stub.items['ticket'][1]
+    result = glpi.update('Ticket', ticket)
+    assert result == [{"1": False, "message": "Item not found"}]
+    assert ticket.get_changes() == {"status": 2}
+
+
+def test_update_many_skips_clean_items(glpi, stub):
+    items = [glpi.get_item('Ticket', 1)]
+    stub.add_item('Ticket', {"name": "other"})
+    items.append(glpi.get_item('Ticket', 2))
+    items[1].set_attribute('name', 'renamed')
+
+    results = glpi.update_many('Ticket', items)
+    assert [r['ok'] for r in results] == [True, True]
+    assert results[0]['message'] == "No changes to update"
+    assert stub.items['ticket'][2]['name'] == 'renamed'
+
+
+def test_shared_defaults_copy_on_write():
+    first = Ticket(name="first", content="a", attributes={"status": 2})
+    second = Ticket(name="second", content="b")
+    assert not hasattr(first, '__dict__')
+    assert first.get_attribute('status') == 2
+    assert second.get_attribute('status') == 1
+    assert Ticket.defaults['status'] == 1
+
+    data = second.get_data()
+    data['urgency'] = 5
+    assert Ticket.defaults['urgency'] == 3
+    assert list(data)[:2] == ['name', 'content']
+
+
+def test_get_stream_and_to_dict():
+    item = make_item_class('Computer', {"serial": None, "name": ""})()
+    item.set_attribute('name', 'pc')
+    item.set_attribute('states_id', GlpiItem.null_str)
+    assert item.to_dict() == {"serial": None, "name": "pc",
+                              "states_id": GlpiItem.null_str}
+    assert item.get_stream() == \
+        ' "serial": None, "name": "pc", "states_id": null'
@@ -0,0 +1,74 @@
+# Import cost of the package: heavy modules are only loaded when used.
+# Each check runs in a new interpreter, so nothing is already imported.
+
+import os
+import sys
+import json
+import subprocess
+
+import glpi
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ['requests', 'numpy', 'multiprocessing.pool', 'html.parser',
+         'glpi.watcher', 'glpi.columnar', 'glpi.item_ticket']
+
+# A transport answering from the stub in process, without requests.
+FIRST_REQUEST = """
+import json
+from glpi import GLPI
+from glpi.stub_server import StubGlpi
+
+class Response(object):
+    def __init__(self, status, headers, result):
+        self.status_code, self.headers = status, headers
+        self.text = json.dumps(result)
+    def json(self):
+        return json.loads(self.text)
+
+class Transport(object):
+    def __init__(self):
+        self.stub = StubGlpi()
+        self.stub.populate('Ticket', 3)
+    def request(self, method, url, headers=None, params=None, **kwargs):
+        path, _, query = url.split('apirest.php', 1)[1].partition('?')
+        return Response(*self.stub.handle(method, path, query, headers))
+
+glpi = GLPI('http://glpi/apirest.php', 'app-token', 'user-token',
+            transport=Transport())
+assert glpi.get('Ticket', 2)['id'] == 2
+"""
+
+
+def loaded(code):
+    """ Run code in a new interpreter, return (seconds, heavy modules). """
+    script = ("import sys, time, json\n"
+              "start = time.time()\n%s\n"
+              "print(json.dumps([time.time() - start, [m for m in %r "
+              "if m in sys.modules]]))" % (code, HEAVY))
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     cwd=ROOT)
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def test_import_is_lazy():
+    assert min(loaded('import glpi')[0] for _ in range(3)) < 0.05
+    assert loaded('import glpi')[1] == []
+    duration, modules = loaded('from glpi import GLPI')
+    assert modules == []
+    assert duration < 0.25
+
+
+def test_first_request_without_requests():
+    assert loaded(FIRST_REQUEST)[1] == []
+
+
+def test_lazy_names():
+    assert glpi.Ticket.__module__ == 'glpi.item_ticket'
+    assert 'GlpiKnowBase' in dir(glpi)
+    assert set(glpi.__all__) <= set(dir(glpi))
+    try:
+        glpi.Nothing
+    except AttributeError:
+        pass
+    else:
+        assert False, 'glpi.Nothing should not exist'
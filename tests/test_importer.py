@@ -0,0 +1,106 @@
+# Offline tests of the bulk import pipeline against the local GLPI stub.
+
+import io
+import json
+import pytest
+from glpi import GLPI
+from glpi.importer import import_items
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Computer', 3)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_create_many_and_update_many(glpi, stub):
+    results = glpi.create_many('Computer', [{"name": "pc%d" % i}
+                                            for i in range(25)],
+                               batch_size=10, workers=3)
+    assert sorted(r['id'] for r in results) == list(range(4, 29))
+    assert all(r['ok'] for r in results)
+
+    results = glpi.update_many('Computer', [{"id": 4, "serial": "A"},
+                                            {"id": 999, "serial": "B"}])
+    assert [r['ok'] for r in results] == [True, False]
+    assert stub.get_items('Computer')[3]['serial'] == 'A'
+
+
+def test_import_csv(glpi, stub, tmpdir):
+    source = tmpdir.join('computers.csv')
+    source.write("name,serial,states_id\n"
+                 "pc-a,S1,1\n"
+                 "pc-b,S2,not-a-number\n"
+                 "pc-c,S3,\n")
+    rejects = str(tmpdir.join('rejects.ndjson'))
+    result = import_items(glpi, 'Computer', str(source), rejects=rejects,
+                          batch_size=2)
+    assert result == {"rows": 3, "created": 2, "updated": 0, "rejected": 1,
+                      "resumed_from": 0}
+    with open(rejects) as f:
+        rejected = [json.loads(line) for line in f]
+    assert rejected[0]['line'] == 2
+    assert 'states_id' in rejected[0]['reason']
+    assert [c['name'] for c in stub.get_items('Computer')][-2:] == \
+        ['pc-a', 'pc-c']
+
+
+def test_import_itemtype_field(glpi, stub):
+    stub.set_search_options('Item_Ticket', {2: 'id', 3: 'itemtype',
+                                            4: 'items_id', 5: 'tickets_id'})
+    source = io.StringIO(u'{"itemtype": "Computer", "items_id": 1, '
+                         u'"tickets_id": 1}\n')
+    result = import_items(glpi, 'Item_Ticket', source)
+    assert (result['created'], result['rejected']) == (1, 0)
+    assert stub.get_items('Item_Ticket')[0]['itemtype'] == 'Computer'
+
+
+def test_import_auto_ndjson(glpi, stub):
+    source = io.StringIO(u'{"id": 1, "name": "renamed"}\n'
+                         u'{"name": "new", "unknown": 1}\n'
+                         u'not json\n'
+                         u'{"name": "new"}\n')
+    result = import_items(glpi, 'Computer', source, fmt='ndjson',
+                          action='auto')
+    assert (result['updated'], result['created'], result['rejected']) == \
+        (1, 1, 2)
+    assert stub.get_items('Computer')[0]['name'] == 'renamed'
+
+
+class InterruptedSource(object):
+    """ File-like source failing after some lines. """
+    def __init__(self, lines, fail_at):
+        self.lines = lines
+        self.fail_at = fail_at
+
+    def read(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        for number, line in enumerate(self.lines, 1):
+            if number == self.fail_at:
+                raise IOError('interrupted')
+            yield line
+
+
+def test_import_resumes(glpi, stub, tmpdir):
+    lines = [u'{"name": "pc%d"}\n' % i for i in range(30)]
+    checkpoint = str(tmpdir.join('import.ckpt'))
+    with pytest.raises(IOError):
+        import_items(glpi, 'Computer', InterruptedSource(lines, 25),
+                     fmt='ndjson', batch_size=5, workers=2,
+                     checkpoint=checkpoint)
+    result = import_items(glpi, 'Computer', io.StringIO(u''.join(lines)),
+                          fmt='ndjson', batch_size=5, workers=2,
+                          checkpoint=checkpoint)
+    assert result['resumed_from'] == 20
+    names = [c['name'] for c in stub.get_items('Computer')[3:]]
+    assert sorted(names) == sorted('pc%d' % i for i in range(30))
@@ -0,0 +1,94 @@
+# Offline tests of the local Knowledge Base index against the stub server.
+
+import time
+import pytest
+from glpi import GLPI
+from glpi.kb_index import KnowBaseIndex, tokenize
+from glpi.stub_server import StubGlpi, StubServer
+
+ARTICLES = [
+    ("Reset your password",
+     "&lt;p&gt;Open the &lt;b&gt;self-service&lt;/b&gt; portal and click "
+     "&lt;i&gt;Forgot password&lt;/i&gt;.&lt;/p&gt;"),
+    ("VPN connection fails",
+     "<p>Check the VPN client version, then restart the VPN service.</p>"),
+    ("Printer offline",
+     "<p>Power cycle the printer. If the password prompt appears, call "
+     "support.</p>"),
+    ("Créer un accès réseau", "<p>Demander l'accès au réseau Wi-Fi.</p>"),
+]
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    for name, answer in ARTICLES:
+        stub.add_item('KnowbaseItem', {"name": name, "answer": answer,
+                                       "date_mod": "2020-01-01 10:00:00"})
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token')
+        glpi.init_api()
+        yield glpi
+
+
+def test_tokenize():
+    assert tokenize("&lt;p&gt;Réseau&amp;nbsp;<b>VPN</b>&lt;/p&gt;") == \
+        ['reseau', 'vpn']
+
+
+def test_search_ranking(glpi):
+    index = KnowBaseIndex(glpi)
+    assert index.sync() == 4
+    results = index.search('forgot my password')
+    assert [r['id'] for r in results] == [1, 3]
+    assert results[0]['name'] == 'Reset your password'
+    assert results[0]['score'] > results[1]['score']
+    assert [r['id'] for r in index.search('reseau acces')] == [4]
+    assert index.search('nothing matches') == []
+
+
+def test_incremental_sync(glpi, stub):
+    index = KnowBaseIndex(glpi)
+    index.sync()
+    # Articles of the last second are read once more after it is over.
+    time.sleep(1.1)
+    assert index.sync() == 4
+    assert index.sync() == 0
+    with stub.lock:
+        stub.items['knowbaseitem'][2].update(
+            answer="<p>Use the new tunnel gateway.</p>",
+            date_mod="2020-01-02 10:00:00")
+    assert index.sync() == 1
+    assert [r['id'] for r in index.search('tunnel')] == [2]
+    assert [r['id'] for r in index.search('restart')] == []
+
+    glpi.update('KnowbaseItem', {"id": 3, "name": "Scanner offline"})
+    glpi.delete('KnowbaseItem', 1)
+    assert index.search('password') == [
+        {"id": 3, "name": "Printer offline",
+         "score": index.search('password')[0]['score']}]
+    index.sync()
+    assert [r['name'] for r in index.search('scanner')] == \
+        ['Scanner offline']
+
+
+def test_full_sync_and_warm_start(glpi, stub, tmp_path):
+    path = str(tmp_path / 'kb.json')
+    index = KnowBaseIndex(glpi, path=path)
+    index.sync()
+    with stub.lock:
+        del stub.items['knowbaseitem'][2]
+    index.sync(full=True)
+    assert len(index) == 3
+    index.close()
+
+    before = stub.request_count
+    warm = KnowBaseIndex(glpi, path=path)
+    assert len(warm) == 3
+    assert warm.search('printer') == index.search('printer')
+    assert stub.request_count == before
@@ -0,0 +1,84 @@
+# Offline tests of the keyset (id) crawl against the local GLPI stub server.
+
+import pytest
+from glpi import GLPI
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Computer', 250)
+    # Holes in the id space.
+    for item_id in range(100, 130):
+        del stub.items['computer'][item_id]
+    stub.queries = []
+    handle = stub.handle
+
+    def recording(method, path, query='', headers=None, body=None):
+        stub.queries.append(query)
+        return handle(method, path, query, headers, body)
+
+    stub.handle = recording
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token')
+        glpi.init_api()
+        yield glpi
+
+
+def _ids(rows):
+    return [int(row['2']) for row in rows]
+
+
+def test_keyset_crawl(glpi, stub):
+    del stub.queries[:]
+    pages = list(glpi.get_keyset_pages('Computer', page_size=50))
+    ids = [i for page in pages for i in _ids(page)]
+    assert ids == sorted(stub.items['computer'])
+    assert len(pages) == 5
+    # Every page is read at offset 0, from the last id read.
+    assert all('range=0-49' in q for q in stub.queries)
+    assert 'criteria%5B0%5D%5Bvalue%5D=50&' in stub.queries[1]
+
+
+def test_keyset_criteria_and_range(glpi, stub):
+    criteria = {"criteria": [{"field": 1, "searchtype": "contains",
+                              "value": "Computer 1", "link": "AND"}]}
+    ids = _ids(glpi.iter_keyset('Computer', criteria, page_size=7,
+                                id_range=(10, 160)))
+    assert ids == [i for i in sorted(stub.items['computer'])
+                   if 10 <= i <= 160 and ('%d' % i).startswith('1')]
+
+
+def test_keyset_or_criteria_stay_in_range(glpi, stub):
+    criteria = {"criteria": [
+        {"field": 1, "searchtype": "contains", "value": "Computer 2",
+         "link": "AND"},
+        {"field": 1, "searchtype": "contains", "value": "Computer 5",
+         "link": "OR"}]}
+    ids = _ids(glpi.iter_keyset('Computer', criteria, page_size=7,
+                                id_range=(10, 60)))
+    assert ids == [i for i in sorted(stub.items['computer'])
+                   if 10 <= i <= 60 and ('%d' % i)[0] in '25']
+
+
+def test_sharded_crawl(glpi, stub):
+    assert glpi.id_bounds('Computer') == (1, 250)
+    shards = glpi.keyset_shards('Computer', 4)
+    assert shards == [(1, 63), (64, 126), (127, 189), (190, 250)]
+    ids = _ids(glpi.iter_keyset('Computer', page_size=20, shards=4))
+    assert sorted(ids) == sorted(stub.items['computer'])
+    assert len(ids) == len(set(ids))
+
+
+def test_empty_crawl(glpi):
+    criteria = {"criteria": [{"field": 1, "searchtype": "equals",
+                              "value": "nothing", "link": "AND"}]}
+    assert glpi.id_bounds('Computer', criteria) is None
+    assert list(glpi.iter_keyset('Computer', criteria, shards=3)) == []
+    assert list(glpi.iter_keyset('Computer', criteria)) == []
@@ -0,0 +1,68 @@
+# Offline tests of massive actions against the local stub server.
+
+import pytest
+from glpi import GLPI
+from glpi.glpi import GlpiException
+from glpi.cache import MemoryCache
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Ticket', 25)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token',
+                    cache=MemoryCache())
+        glpi.init_api()
+        yield glpi
+
+
+def test_list_actions(glpi):
+    keys = [a['key'] for a in glpi.massive_actions('Ticket')]
+    assert 'MassiveAction:update' in keys
+    assert glpi.massive_actions('Ticket', 1) == \
+        glpi.massive_actions('Ticket')
+    names = [p['name'] for p in glpi.massive_action_parameters(
+        'Ticket', 'MassiveAction:update')]
+    assert names == ['id_field', 'field']
+    with pytest.raises(GlpiException):
+        glpi.massive_action_parameters('Ticket', 'Nothing:here')
+
+
+def test_update_in_chunks(glpi, stub):
+    assert glpi.get_item('Ticket', 3).get_attribute('status') == 3
+    before = stub.request_count
+    result = glpi.apply_massive_action(
+        'Ticket', 'MassiveAction:update', range(1, 26),
+        {"id_field": 12, "field": "status", "status": 6}, chunk_size=10,
+        workers=2)
+    assert result == {"ok": 25, "ko": 0, "noright": 0, "messages": []}
+    assert stub.request_count - before == 3
+    assert set(t['status'] for t in stub.get_items('Ticket')) == set([6])
+    # The cache follows the update.
+    assert glpi.get_item('Ticket', 3).get_attribute('status') == 6
+
+
+def test_aggregated_failures(glpi, stub):
+    events = []
+    glpi.add_write_listener(lambda *event: events.append(event))
+    result = glpi.apply_massive_action('Ticket', 'MassiveAction:purge',
+                                       [24, 25, 26, 27, 1], chunk_size=3)
+    assert (result['ok'], result['ko']) == (3, 2)
+    assert result['messages'] == ["Item not found: 26",
+                                  "Item not found: 27"]
+    assert len(stub.get_items('Ticket')) == 22
+    # Chunks with failures do not tell which ids were purged.
+    assert [(action, [i['id'] for i in items])
+            for _, action, items in events] == [
+        ('massive', [24, 25, 26]), ('massive', [27, 1])]
+
+    result = glpi.apply_massive_action('Ticket', 'Nothing:here', [2])
+    assert (result['ok'], result['ko']) == (0, 1)
+    assert 'ERROR_MASSIVEACTION_KEY' in result['messages'][0]
@@ -0,0 +1,82 @@
+# Offline tests of the composite ticket creation against the stub server.
+
+import io
+import pytest
+from glpi import GLPI
+from glpi.item_ticket import Ticket
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Computer', 2)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_open_ticket(glpi, stub):
+    glpi.init_api()
+    before = stub.request_count
+    result = glpi.open_ticket(
+        {"name": "Mail down", "content": "No mail since 9:00"},
+        actors=[{"users_id": 5, "type": 1}, {"users_id": 7, "type": 2}],
+        groups=[{"groups_id": 3, "type": 2}],
+        followups=["Looking at it", {"content": "Restarted", "is_private": 1}],
+        tasks=["Check the queue"],
+        items=[('Computer', 1), ('Computer', 2)],
+        workers=8)
+    assert result['ok'] and not result['rolled_back']
+    # One ticket request, then one array request per sub-item type.
+    assert stub.request_count - before == 6
+
+    ticket_id = result['id']
+    assert stub.get_items('Ticket')[0]['name'] == 'Mail down'
+    assert [u['users_id'] for u in stub.get_items('Ticket_User')] == [5, 7]
+    assert all(u['tickets_id'] == ticket_id
+               for u in stub.get_items('Ticket_User'))
+    assert [(f['items_id'], f['content'])
+            for f in stub.get_items('ITILFollowup')] == [
+        (ticket_id, 'Looking at it'), (ticket_id, 'Restarted')]
+    assert stub.get_items('TicketTask')[0]['tickets_id'] == ticket_id
+    assert [i['items_id'] for i in stub.get_items('Item_Ticket')] == [1, 2]
+    assert len(result['parts']['Ticket_User']) == 2
+    assert len(result['parts']['Item_Ticket']) == 2
+
+
+def test_open_ticket_item_and_documents(glpi, stub):
+    ticket = Ticket('Printer jam', 'Third floor')
+    result = glpi.open_ticket(ticket, documents=[io.BytesIO(b'scan')])
+    assert result['ok']
+    assert ticket.get_attribute('id') == result['id']
+    assert not ticket.has_changes()
+    document_id = result['parts']['Document'][0]['id']
+    assert stub.documents[document_id] == b'scan'
+    link = stub.get_items('Document_Item')[0]
+    assert (link['documents_id'], link['items_id']) == (document_id,
+                                                        result['id'])
+
+
+def test_open_ticket_rollback(glpi, stub):
+    result = glpi.open_ticket({"name": "Broken", "content": "..."},
+                              followups=["first"],
+                              documents=['/nonexistent/file.log'],
+                              rollback=True)
+    assert not result['ok']
+    assert not result['parts']['Document'][0]['ok']
+    assert result['parts']['ITILFollowup'][0]['ok']
+    assert result['rolled_back']
+    assert stub.get_items('Ticket') == []
+    assert stub.get_items('ITILFollowup') == []
+
+
+def test_open_ticket_partial_failure_without_rollback(glpi, stub):
+    result = glpi.open_ticket({"name": "Broken", "content": "..."},
+                              documents=['/nonexistent/file.log'])
+    assert not result['ok'] and not result['rolled_back']
+    assert len(stub.get_items('Ticket')) == 1
@@ -0,0 +1,70 @@
+# Offline tests of batched sub-item traversal against the local stub server.
+
+import pytest
+from glpi import GLPI
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Ticket', 20)
+    for ticket_id in range(1, 21):
+        for i in range(ticket_id % 3):
+            stub.add_item('ITILFollowup', {
+                "itemtype": "Ticket", "items_id": ticket_id,
+                "content": "followup %d of %d" % (i, ticket_id)})
+        stub.add_item('Ticket_User', {"tickets_id": ticket_id,
+                                      "users_id": ticket_id, "type": 1})
+    document_id = stub.add_item('Document', {"name": "screenshot.png"})
+    stub.add_item('Document_Item', {"documents_id": document_id,
+                                    "itemtype": "Ticket", "items_id": 2})
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_get_related(glpi):
+    related = glpi.get_related('Ticket', range(1, 21),
+                               ['ITILFollowup', 'Ticket_User', 'Document'],
+                               workers=4)
+    assert sorted(related) == list(range(1, 21))
+    for ticket_id, context in related.items():
+        assert context['item']['id'] == ticket_id
+        assert '_documents' not in context['item']
+        assert len(context['ITILFollowup']) == ticket_id % 3
+        assert [u['users_id'] for u in context['Ticket_User']] == \
+            [ticket_id]
+    assert [d['name'] for d in related[2]['Document']] == ['screenshot.png']
+    assert related[3]['Document'] == []
+
+
+def test_get_related_request_count(glpi, stub):
+    glpi.get_related('Ticket', [1], ['Document'])
+    before = stub.request_count
+    glpi.get_related('Ticket', range(1, 11), ['ITILFollowup', 'Document'])
+    # One item request (with_documents) and one sub-item request per id.
+    assert stub.request_count - before == 20
+
+
+def test_get_related_without_flags(glpi):
+    related = glpi.get_related('Ticket', [2], ['Document_Item'],
+                               use_flags=False)
+    assert [d['documents_id'] for d in related[2]['Document_Item']] == [1]
+
+
+def test_get_related_paging(glpi):
+    related = glpi.get_related('Ticket', [2, 5], ['ITILFollowup'],
+                               page_size=1)
+    assert len(related[2]['ITILFollowup']) == 2
+
+
+def test_get_related_missing_item(glpi):
+    related = glpi.get_related('Ticket', [1, 99], ['Ticket_User'])
+    assert related[1]['item']['id'] == 1
+    assert 'item' in related[99]['errors']
+    assert related[99]['Ticket_User'] == []
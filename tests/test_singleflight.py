@@ -0,0 +1,123 @@
+# Offline tests of read coalescing against the local GLPI stub server.
+
+import threading
+import pytest
+import requests
+from multiprocessing.pool import ThreadPool
+from glpi import GLPI
+from glpi.glpi import SingleFlight
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi(latency=0.2)
+    stub.populate('Ticket', 3)
+    return stub
+
+
+@pytest.fixture()
+def server(stub):
+    with StubServer(stub) as server:
+        yield server
+
+
+def _burst(glpi, call, count=8):
+    glpi.init_api()
+    start = threading.Event()
+
+    def run(_):
+        start.wait()
+        return call()
+
+    pool = ThreadPool(count)
+    results = pool.map_async(run, range(count))
+    start.set()
+    results = results.get()
+    pool.terminate()
+    return results
+
+
+def test_coalesce_identical_reads(server, stub):
+    glpi = GLPI(server.url, 'app-token', 'user-token', coalesce_reads=True)
+    before = stub.request_count + 1  # initSession
+    results = _burst(glpi, lambda: glpi.get('Ticket', 2))
+    assert stub.request_count - before == 1
+    assert all(r['id'] == 2 for r in results)
+    assert glpi.api_rest.coalescer.shared == 7
+
+
+def test_coalesced_body_is_decoded_once(server, stub, monkeypatch):
+    glpi = GLPI(server.url, 'app-token', 'user-token', coalesce_reads=True)
+    decoded = []
+    decode = requests.Response.json
+
+    def json(self, **kwargs):
+        decoded.append(self)
+        return decode(self, **kwargs)
+
+    monkeypatch.setattr(requests.Response, 'json', json)
+    results = _burst(glpi, lambda: glpi.get('Ticket', 2))
+    assert glpi.api_rest.coalescer.shared == 7
+    # One decode for initSession, one for the shared read.
+    assert len(decoded) == 2
+    assert all(r is results[0] for r in results)
+
+
+def test_different_reads_are_not_coalesced(server, stub):
+    glpi = GLPI(server.url, 'app-token', 'user-token', coalesce_reads=True)
+    before = stub.request_count + 1
+    ids = iter([1, 2, 3] * 3)
+    lock = threading.Lock()
+
+    def get():
+        with lock:
+            item_id = next(ids)
+        return glpi.get('Ticket', item_id)
+
+    _burst(glpi, get, 9)
+    assert stub.request_count - before == 3
+
+
+def test_disabled_by_default(server, stub):
+    glpi = GLPI(server.url, 'app-token', 'user-token')
+    before = stub.request_count + 1
+    _burst(glpi, lambda: glpi.get('Ticket', 2), 4)
+    assert stub.request_count - before == 4
+
+
+def test_writes_are_not_coalesced(server, stub):
+    glpi = GLPI(server.url, 'app-token', 'user-token', coalesce_reads=True)
+    _burst(glpi, lambda: glpi.update('Ticket', {"id": 1, "name": "x"}), 4)
+    assert glpi.api_rest.coalescer.shared == 0
+
+
+def test_singleflight_shares_errors():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait()
+        raise ValueError('boom')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    while not flight.shared:
+        pass
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.calls == {}
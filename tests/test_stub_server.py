@@ -0,0 +1,106 @@
+# Offline tests of the SDK against the local GLPI stub server.
+
+import pytest
+from glpi import GLPI
+from glpi.stub_server import StubGlpi, StubServer
+from glpi.loadgen import run_load
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi(app_token='app-token', user_token='user-token')
+    stub.populate('Ticket', 120)
+    return stub
+
+
+@pytest.fixture()
+def server(stub):
+    with StubServer(stub) as server:
+        yield server
+
+
+@pytest.fixture()
+def glpi(server):
+    return GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_session_and_crud(glpi, stub):
+    assert 'session_token' in glpi.init_api()
+
+    created = glpi.create('Ticket', {"name": "New ticket", "content": "x"})
+    assert created['id'] == 121
+
+    item = glpi.get('Ticket', created['id'])
+    assert item['name'] == "New ticket"
+
+    glpi.update('Ticket', {"id": created['id'], "name": "Renamed"})
+    assert glpi.get('Ticket', created['id'])['name'] == "Renamed"
+
+    glpi.delete('Ticket', created['id'])
+    assert glpi.get('Ticket', created['id'])[0] == 'ERROR_ITEM_NOT_FOUND'
+
+
+def test_wrong_user_token(server):
+    glpi = GLPI(server.url, 'app-token', 'wrong-token')
+    result = glpi.get('Ticket', 1)
+    assert 'ERROR' in list(result)[0]
+
+
+def test_range_and_content_range(glpi):
+    glpi.init_api()
+    response = glpi.api_rest.request('GET', 'Ticket',
+                                     params={'range': '100-149'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == '100-119/120'
+    assert len(response.json()) == 20
+
+
+def test_array_input(stub):
+    status, _, body = stub.handle('POST', '/Ticket',
+                                  body='{"input": [{"name": "a"}, '
+                                  '{"name": "b"}]}',
+                                  headers={'Session-Token': 'unknown'})
+    assert status == 401
+
+    _, _, session = stub.handle('GET', '/initSession',
+                                headers={'App-Token': 'app-token',
+                                         'Authorization':
+                                         'user_token user-token'})
+    headers = {'Session-Token': session['session_token']}
+    status, _, body = stub.handle('POST', '/Ticket',
+                                  body='{"input": [{"name": "a"}, '
+                                  '{"name": "b"}]}', headers=headers)
+    assert status == 207
+    assert [r['id'] for r in body] == [121, 122]
+
+    status, _, body = stub.handle('GET', '/getMultipleItems',
+                                  'items[0][itemtype]=Ticket'
+                                  '&items[0][items_id]=121'
+                                  '&items[1][itemtype]=Ticket'
+                                  '&items[1][items_id]=122',
+                                  headers=headers)
+    assert [r['name'] for r in body] == ['a', 'b']
+
+
+def test_search_engine(glpi):
+    criteria = {"criteria": [{"field": "name", "value": "Ticket 12",
+                              "searchtype": "contains", "link": "AND"}]}
+    result = glpi.search_engine('Ticket', criteria)
+    assert result['totalcount'] == 2
+    assert sorted(r['1'] for r in result['data']) == ['Ticket 12',
+                                                      'Ticket 120']
+
+
+def test_error_injection(server, stub):
+    stub.error_rate = 1
+    glpi = GLPI(server.url, 'app-token', 'user-token')
+    assert glpi.get('Ticket', 1)[0] == 'ERROR_INJECTED'
+
+
+def test_run_load(server):
+    report = run_load(server.url, 'app-token', 'user-token', clients=3,
+                      requests_per_client=10, id_range=(1, 120), seed=1)
+    summary = report.summary()
+    assert summary['total']['count'] == 30
+    assert summary['total']['errors'] == 0
+    assert summary['get']['p50'] <= summary['get']['p99']
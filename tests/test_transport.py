@@ -0,0 +1,97 @@
+# Offline tests of the transports: in memory, requests and httpx.
+
+import io
+import sys
+import pytest
+import requests
+from glpi import GLPI
+from glpi.glpi import GlpiException
+from glpi.transport import InMemoryTransport, RequestsTransport
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Ticket', 30)
+    return stub
+
+
+def _exercise(glpi, stub):
+    glpi.init_api()
+    assert glpi.get('Ticket', 3)['name'] == 'Ticket 3'
+    created = glpi.create('Ticket', {"name": "From transport"})
+    assert created['id'] == 31
+    glpi.update('Ticket', {"id": 31, "status": 4})
+    assert stub.items['ticket'][31]['status'] == 4
+
+    criteria = {"criteria": [{"field": 1, "searchtype": "contains",
+                              "value": "Ticket 1", "link": "AND"}]}
+    rows = list(glpi.iter_all('Ticket', criteria, page_size=4))
+    assert len(rows) == 11
+
+    document_id = glpi.upload_document(io.BytesIO(b'x' * 100000),
+                                       filename='data.bin')
+    out = io.BytesIO()
+    result = glpi.download_document(document_id, out, hash_name='md5')
+    assert result['bytes'] == 100000 and out.getvalue() == b'x' * 100000
+
+
+def test_in_memory_transport(stub):
+    transport = InMemoryTransport(stub.handle)
+    glpi = GLPI('http://glpi.invalid/apirest.php', 'app-token',
+                'user-token', transport=transport)
+    _exercise(glpi, stub)
+
+
+def test_in_memory_errors():
+    stub = StubGlpi(app_token='app-token', user_token='user-token')
+    glpi = GLPI('http://glpi.invalid/apirest.php', 'app-token', 'bad',
+                transport=InMemoryTransport(stub.handle))
+    with pytest.raises(GlpiException):
+        glpi.init_api()
+
+
+def test_requests_session_transport(stub):
+    with StubServer(stub) as server, requests.Session() as session:
+        glpi = GLPI(server.url, 'app-token', 'user-token',
+                    transport=RequestsTransport(session))
+        _exercise(glpi, stub)
+
+
+def test_httpx_transport(stub):
+    pytest.importorskip('httpx')
+    from glpi.transport import HttpxTransport
+    transport = HttpxTransport(http2=False)
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token',
+                    transport=transport)
+        _exercise(glpi, stub)
+    transport.close()
+
+
+def test_httpx_transport_http2(stub):
+    pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    from glpi.transport import HttpxTransport
+    transport = HttpxTransport()
+    assert transport.http2
+    # The stub is plain HTTP: the HTTP/2 client falls back to HTTP/1.1.
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token',
+                    transport=transport)
+        _exercise(glpi, stub)
+    transport.close()
+
+
+def test_httpx_transport_without_h2(stub, monkeypatch):
+    pytest.importorskip('httpx')
+    from glpi.transport import HttpxTransport
+    monkeypatch.setitem(sys.modules, 'h2', None)
+    transport = HttpxTransport()
+    assert not transport.http2
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token',
+                    transport=transport)
+        _exercise(glpi, stub)
+    transport.close()
@@ -0,0 +1,51 @@
+# Offline tests of upsert_many() against the local GLPI stub server.
+
+import pytest
+from glpi import GLPI
+from glpi.glpi import GlpiInvalidArgument
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Computer', 20)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_upsert_many(glpi, stub):
+    glpi.get_field_schema('Computer')
+    items = [
+        {"serial": "SN00000001", "name": "Computer 1"},
+        {"serial": "SN00000002", "name": "renamed"},
+        {"serial": "NEW-1", "name": "new"},
+        {"serial": "NEW-1", "states_id": 2},
+        {"name": "no serial"},
+        {"serial": "a&b c", "name": "escaped"},
+    ]
+    before = stub.request_count
+    results = glpi.upsert_many('Computer', items)
+    assert [r['action'] for r in results] == [
+        'unchanged', 'updated', 'created', 'created', 'error', 'created']
+    assert results[2]['id'] == results[3]['id']
+    # one search, one getMultipleItems, one create and one update
+    assert stub.request_count - before == 4
+
+    computers = dict((c['serial'], c) for c in stub.get_items('Computer'))
+    assert computers['SN00000002']['name'] == 'renamed'
+    assert computers['NEW-1']['states_id'] == 2
+    assert 'a&b c' in computers
+
+    results = glpi.upsert_many('Computer', items[:4])
+    assert [r['action'] for r in results] == ['unchanged'] * 4
+
+
+def test_upsert_unknown_key(glpi):
+    with pytest.raises(GlpiInvalidArgument):
+        glpi.upsert_many('Computer', [{"name": "x"}], key='nope')
@@ -0,0 +1,96 @@
+# Offline tests of the change watcher against the local GLPI stub server.
+
+import time
+import threading
+import pytest
+from glpi import GLPI
+from glpi.watcher import Watcher
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Ticket', 6)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token')
+        glpi.init_api()
+        yield glpi
+
+
+def test_field_diffs(glpi, stub):
+    watcher = glpi.watch('Ticket', fields=['name', 'status'], prime=True)
+    assert watcher.poll() == []
+    glpi.update('Ticket', {"id": 2, "status": 5})
+    glpi.update('Ticket', {"id": 3, "content": "not watched"})
+    events = watcher.poll()
+    assert [(e['id'], e['action'], e['changes']) for e in events] == [
+        (2, 'changed', {"status": (2, 5)})]
+    # Items seen again without changes give no event.
+    assert watcher.poll() == []
+
+    stub.add_item('Ticket', {"name": "New one", "status": 1})
+    events = watcher.poll()
+    assert [(e['id'], e['action']) for e in events] == [(7, 'added')]
+    assert events[0]['changes'] == {"name": (None, "New one"),
+                                    "status": (None, 1)}
+
+
+def test_items_leaving_criteria(glpi):
+    criteria = {"criteria": [{"field": 12, "searchtype": "equals",
+                              "value": 1, "link": "AND"}]}
+    watcher = Watcher(glpi, 'Ticket', criteria, fields=['status'],
+                      prime=True)
+    assert sorted(watcher.snapshot) == [1]
+    glpi.update('Ticket', {"id": 1, "status": 6})
+    glpi.update('Ticket', {"id": 4, "status": 1})
+    events = watcher.poll()
+    assert [(e['id'], e['action']) for e in events] == [
+        (1, 'removed'), (4, 'added')]
+
+
+def test_idle_polls_are_one_request(glpi, stub):
+    with stub.lock:
+        for item in stub.items['ticket'].values():
+            item['date_mod'] = '2000-01-01 00:00:00'
+    watcher = glpi.watch('Ticket')
+    watcher.poll()
+    # Items of the last second are read again until the second is over.
+    time.sleep(1.1)
+    watcher.poll()
+    before = stub.request_count
+    assert watcher.poll() == []
+    assert stub.request_count - before == 1
+
+
+def test_adaptive_interval_and_iteration(glpi):
+    watcher = glpi.watch('Ticket', fields=['status'], min_interval=0.01,
+                         max_interval=0.08, backoff=2)
+    watcher._adapt([])
+    watcher._adapt([])
+    watcher._adapt([])
+    watcher._adapt([])
+    assert watcher.interval == 0.08
+    watcher._adapt([{}])
+    assert watcher.interval == 0.04
+
+    received = []
+
+    def callback(event):
+        received.append(event)
+        watcher.stop()
+
+    thread = threading.Thread(target=watcher.run, args=(callback,))
+    thread.start()
+    while watcher.polls < 2 and thread.is_alive():
+        time.sleep(0.01)
+    glpi.update('Ticket', {"id": 5, "status": 1})
+    thread.join(5)
+    assert not thread.is_alive()
+    assert received[0]['id'] == 5
+    assert received[0]['changes'] == {"status": (5, 1)}
@@ -0,0 +1,70 @@
+# Offline tests of the read options that shrink responses: projection,
+# only_id, get_hateoas, compression and byte accounting.
+
+import pytest
+from glpi import GLPI
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    stub = StubGlpi()
+    stub.populate('Ticket', 200, content="<p>%s</p>" % ("text " * 50),
+                  locations_id=3, users_id_recipient=2)
+    return stub
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        glpi = GLPI(server.url, 'app-token', 'user-token')
+        glpi.init_api()
+        yield glpi
+
+
+def test_hateoas_and_projection(glpi, stub):
+    item = glpi.get('Ticket', 1)
+    assert [link['rel'] for link in item['links']] == [
+        'Entity', 'Location', 'User']
+    assert item['links'][1]['href'].endswith('/apirest.php/Location/3')
+    assert 'links' not in glpi.get('Ticket', 1, get_hateoas=False)
+
+    glpi.traffic.reset()
+    glpi.get('Ticket', 1)
+    full = glpi.traffic.bytes
+    glpi.traffic.reset()
+    assert glpi.get('Ticket', 1, fields=['name']) == {
+        "id": 1, "name": "Ticket 1"}
+    # Links are not asked for when they are not kept.
+    assert glpi.traffic.bytes < full - len('%s' % item['links'])
+
+
+def test_listings(glpi):
+    rows = glpi.get_all('Ticket', fields=['id'])
+    assert rows == [{"id": i} for i in range(1, 201)]
+    rows = list(glpi.iter_all('Ticket', page_size=50,
+                              fields=['name', 'status']))
+    assert len(rows) == 200
+    assert rows[0] == {"id": 1, "name": "Ticket 1", "status": 1}
+    items = glpi.get_multiple('Ticket', [1, 2], fields=['status'])
+    assert items == [{"id": 1, "status": 1}, {"id": 2, "status": 2}]
+
+
+def test_compression_and_accounting(glpi):
+    glpi.traffic.reset()
+    rows = glpi.get_all('Ticket')
+    assert len(rows) == 200
+    traffic = glpi.traffic.as_dict()
+    assert traffic['responses'] == 1
+    assert traffic['wire_bytes'] * 10 < traffic['bytes']
+
+    for encoding in ('deflate', 'identity'):
+        glpi.api_rest.accept_encoding = encoding
+        glpi.update_uri('Ticket')
+        response = glpi.api_rest.request('GET', 'Ticket/1')
+        assert response.json()['id'] == 1
+        assert response.body_bytes == len(response.content)
+        if encoding == 'identity':
+            assert response.wire_bytes == response.body_bytes
+        else:
+            assert response.wire_bytes < response.body_bytes
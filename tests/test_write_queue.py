@@ -0,0 +1,101 @@
+# Offline tests of the durable write-behind queue against the stub server.
+
+import time
+import pytest
+from glpi import GLPI
+from glpi.glpi import GlpiInvalidArgument
+from glpi.write_queue import WriteQueue
+from glpi.stub_server import StubGlpi, StubServer
+
+
+@pytest.fixture()
+def stub():
+    return StubGlpi(seed=1)
+
+
+@pytest.fixture()
+def glpi(stub):
+    with StubServer(stub) as server:
+        yield GLPI(server.url, 'app-token', 'user-token')
+
+
+def test_flush(glpi, stub, tmpdir):
+    done = []
+    queue = WriteQueue(glpi, str(tmpdir.join('q.db')), batch_size=7,
+                       on_done=lambda op, result: done.append(result['id']))
+    for i in range(30):
+        queue.create('Ticket', {"name": "alert %d" % i, "content": "..."})
+    assert queue.pending() == 30
+    queue.flush()
+    assert queue.pending() == 0
+    assert sorted(t['name'] for t in stub.get_items('Ticket')) == \
+        sorted("alert %d" % i for i in range(30))
+    assert sorted(done) == list(range(1, 31))
+    queue.close()
+
+
+def test_survives_restart(glpi, stub, tmpdir):
+    path = str(tmpdir.join('q.db'))
+    queue = WriteQueue(glpi, path)
+    queue.create('Ticket', {"name": "before restart", "content": "..."})
+    queue.stop(flush=False)
+    queue.connection.close()
+    assert stub.get_items('Ticket') == []
+
+    queue = WriteQueue(glpi, path)
+    assert queue.pending() == 1
+    queue.flush()
+    assert [t['name'] for t in stub.get_items('Ticket')] == ['before restart']
+    queue.close()
+
+
+def test_updates_keep_order(glpi, stub, tmpdir):
+    stub.populate('Computer', 1)
+    queue = WriteQueue(glpi, str(tmpdir.join('q.db')), batch_size=1,
+                       workers=4)
+    for i in range(10):
+        queue.update('Computer', {"id": 1, "name": "rename %d" % i})
+    queue.flush()
+    assert stub.get_items('Computer')[0]['name'] == 'rename 9'
+    queue.close()
+
+
+def test_retries_and_failed(glpi, stub, tmpdir):
+    queue = WriteQueue(glpi, str(tmpdir.join('q.db')), max_attempts=2,
+                       retry_delay=0.01)
+    glpi.init_api()
+    stub.error_rate = 1
+    queue.create('Ticket', {"name": "x", "content": "..."})
+    queue.flush()
+    time.sleep(0.02)
+    queue.flush()
+    assert queue.pending() == 0
+    [failed] = queue.failed()
+    assert failed['attempts'] == 2 and 'ERROR_INJECTED' in failed['error']
+
+    stub.error_rate = 0
+    queue.retry_failed()
+    queue.flush()
+    assert queue.failed() == [] and len(stub.get_items('Ticket')) == 1
+    queue.close()
+
+
+def test_background_flusher(glpi, stub, tmpdir):
+    with WriteQueue(glpi, str(tmpdir.join('q.db')),
+                    flush_interval=0.01) as queue:
+        for i in range(5):
+            queue.create('Ticket', {"name": "bg %d" % i, "content": "..."})
+        deadline = time.time() + 5
+        while queue.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        assert queue.pending() == 0
+    assert len(stub.get_items('Ticket')) == 5
+
+
+def test_invalid_operations(glpi, tmpdir):
+    queue = WriteQueue(glpi, str(tmpdir.join('q.db')))
+    with pytest.raises(GlpiInvalidArgument):
+        queue.update('Ticket', {"name": "no id"})
+    with pytest.raises(GlpiInvalidArgument):
+        queue.enqueue('Ticket', {}, 'delete')
+    queue.close()